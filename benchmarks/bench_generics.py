@@ -0,0 +1,82 @@
+"""Benchmark of GenericMetaclass subscriptions: create 100k typed vars with and without the subscription cache.
+
+Run from the repository root with `python -m benchmarks.bench_generics`.
+"""
+
+import gc
+import time
+import tracemalloc
+
+from mcutils_reborn.all import *
+
+N = 100_000
+
+
+def uncached_getitem(self, item):
+    """GenericMetaclass.__getitem__ before subscriptions were cached."""
+
+    if not isinstance(item, tuple):
+        item = item,
+
+    return self._subscribe(item)
+
+
+def generate(n: int) -> list[Expression]:
+    out = []
+
+    for i in range(n):
+        out += [
+            NbtVar[IntType]("storage", "bench:storage", f"var{i}"),
+            NbtVar[DoubleType]("storage", "bench:storage", f"var{i}"),
+            ObjectAttributeVar[IntType](ScoreboardVar("@s", "id"), f"attr{i}"),
+            ConstExpr[WholeNumberType](str(i)),
+        ]
+
+        # what conversion.nbt_to_nbt does for every copy
+        out[-4].is_data_type(NumberType)
+        out[-3].is_data_type(ConcreteDataType, AnyDataType)
+
+    return out
+
+
+def run(n: int) -> tuple[float, int, int]:
+    generics._subscriptions.clear()
+    gc.collect()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    out = generate(n)
+
+    duration = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    classes = len({type(expr) for expr in out})
+
+    del out
+    gc.collect()
+
+    return duration, memory, classes
+
+
+def main():
+    cached = run(N)
+
+    original_getitem = generics.GenericMetaclass.__getitem__
+    generics.GenericMetaclass.__getitem__ = uncached_getitem
+    try:
+        uncached = run(N)
+    finally:
+        generics.GenericMetaclass.__getitem__ = original_getitem
+
+    print(f"Creating {N} typed vars of each of 4 kinds:")
+    print(f"{'': <10} {'time': >10} {'memory': >12} {'classes': >10}")
+    for name, (duration, memory, classes) in (("uncached", uncached), ("cached", cached)):
+        print(f"{name: <10} {duration: >9.3f}s {memory / 1024 ** 2: >10.1f}MB {classes: >10}")
+
+    print(f"speedup: {uncached[0] / cached[0]:.1f}x, memory saved: {(uncached[1] - cached[1]) / 1024 ** 2:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
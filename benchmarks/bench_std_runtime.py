@@ -0,0 +1,199 @@
+"""Runtime benchmark of the std library on the offline interpreter.
+
+Every workload is built for several sizes N and run in mcutils_reborn.interpreter. The commands executed and the
+entities scanned by @e selectors are recorded as functions of N. The exponent of each curve is estimated from the two
+largest sizes and compared to the expected complexity. The benchmark fails if a curve grows faster than expected,
+e.g. if the cost of an operation goes from O(1) to O(N).
+
+Run from the repository root with `python -m benchmarks.bench_std_runtime`. Pass --output to save the results as
+JSON. Set MCUTILS_REBORN_OBJECT_BACKEND=storage to benchmark the storage-backed object heap, which scans no entities.
+"""
+
+import argparse
+import json
+import math
+import sys
+import typing
+
+from mcutils_reborn.all import *
+from mcutils_reborn.interpreter import Interpreter
+
+SIZES = (4, 8, 16, 32, 64)
+
+# number of reads of the fetch and attribute workloads, independent of N
+READS = 10
+
+# STD_ARGSTACK is storage-backed, this stack uses the default entity backend
+ENTITY_STACK = 3
+
+# an exponent may exceed the expected one by this much before it counts as a regression
+TOLERANCE = 0.5
+
+
+class Workload:
+    def __init__(self, name: str, description: str,
+                 build: typing.Callable[[Function, Function, int], None],
+                 commands: int, scans: int):
+        """build(setup, measure, n) adds the commands of the workload of size n to the two functions. Only measure is
+        benchmarked. commands and scans are the expected exponents of the curves, e.g. 1 for O(N)."""
+
+        self.name = name
+        self.description = description
+        self.build = build
+        self.expected = {"commands": commands, "scans": scans}
+
+
+def push_items(function: Function, n: int, stack_nr: int = std.STD_ARGSTACK):
+    for i in range(n):
+        function.add_command(*tools.call_function(std.std_stack_push(stack_nr=stack_nr), arg=ConstInt(i)))
+
+
+def create_objects(function: Function, n: int):
+    for i in range(n):
+        function.add_command(*tools.call_function(std.std_object_object.get("__new__")))
+
+
+def push(setup: Function, measure: Function, n: int, stack_nr: int = std.STD_ARGSTACK):
+    push_items(measure, n, stack_nr)
+
+
+def pop(setup: Function, measure: Function, n: int, stack_nr: int = std.STD_ARGSTACK):
+    push_items(setup, n, stack_nr)
+
+    for i in range(n):
+        measure.add_command(*tools.call_function(std.std_stack_pop(stack_nr=stack_nr)))
+
+
+def new_objects(setup: Function, measure: Function, n: int):
+    create_objects(measure, n)
+
+
+def fetch_object(setup: Function, measure: Function, n: int):
+    create_objects(setup, n)
+
+    for i in range(READS):
+        measure.add_command(*tools.call_function(std.std_object_fetch_object, arg=ConstInt(n // 2 + 1)))
+
+
+def read_attribute(setup: Function, measure: Function, n: int):
+    create_objects(setup, n)
+
+    obj = setup.get_unique_scoreboard_var("obj")
+    value = setup.get_unique_scoreboard_var("value")
+
+    setup.add_command(
+        *conv.var_to_var(ConstInt(n // 2 + 1), obj),
+        *conv.var_to_var(ConstInt(42), value),
+        *conv.var_to_var(value, ObjectAttributeVar[IntType](obj, "x")),
+    )
+
+    for i in range(READS):
+        measure.add_command(*conv.var_to_var(ObjectAttributeVar[IntType](obj, "x"), value))
+
+
+def objdump(setup: Function, measure: Function, n: int):
+    create_objects(setup, n)
+
+    measure.add_command(FunctionCall(std.std_debug_objdump.entry_point))
+
+
+WORKLOADS = [
+    Workload("push", "push N items onto a storage-backed stack", push, commands=1, scans=0),
+    Workload("pop", "pop N items from a storage-backed stack of N items", pop, commands=1, scans=0),
+    Workload("push_entity", "push N items onto an entity-backed stack",
+             lambda setup, measure, n: push(setup, measure, n, ENTITY_STACK), commands=1, scans=2),
+    Workload("pop_entity", "pop N items from an entity-backed stack of N items",
+             lambda setup, measure, n: pop(setup, measure, n, ENTITY_STACK), commands=1, scans=2),
+    Workload("new", "create N objects", new_objects, commands=1, scans=2),
+    Workload("fetch", f"fetch an object {READS} times with N objects", fetch_object, commands=0, scans=1),
+    Workload("attribute", f"read an attribute {READS} times with N objects", read_attribute, commands=0, scans=1),
+    Workload("objdump", "dump N objects", objdump, commands=1, scans=2),
+]
+
+
+def run(workload: Workload, n: int, optimize: int) -> dict[str, int]:
+    with Namespace("bench") as namespace:
+        setup = namespace.create_function("setup")
+        measure = namespace.create_function("measure")
+
+        workload.build(setup, measure, n)
+
+        setup.end()
+        measure.end()
+
+    datapack = Datapack("bench_std_runtime")
+    datapack.add(namespace, std.std_namespace)
+
+    interpreter = Interpreter.from_datapack(datapack, optimize=optimize)
+    interpreter.load()
+    interpreter.run("bench:setup/setup")
+    stats = interpreter.run("bench:measure/measure")
+
+    return {"commands": stats.commands, "scans": stats.entities_scanned}
+
+
+def exponent(curve: dict[int, int]) -> float:
+    """Estimate k in cost ~ N^k from the two largest sizes, where constant overheads matter least."""
+
+    (n1, cost1), (n2, cost2) = sorted(curve.items())[-2:]
+
+    if cost1 <= 0 or cost2 <= 0:
+        return 0. if cost1 == cost2 else math.inf
+
+    return math.log(cost2 / cost1) / math.log(n2 / n1)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--optimize", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("workloads", nargs="*", help="the workloads to run, all by default")
+    args = parser.parse_args(argv)
+
+    assert len(args.sizes) >= 2, "At least two sizes are needed to estimate a scaling curve."
+
+    workloads = [workload for workload in WORKLOADS if not args.workloads or workload.name in args.workloads]
+    results = {}
+    regressions = []
+
+    for workload in workloads:
+        curves = {metric: {} for metric in ("commands", "scans")}
+
+        print(f"{workload.name}: {workload.description}")
+        print(f"{'N': >6} {'commands': >10} {'scans': >10}")
+
+        for n in args.sizes:
+            result = run(workload, n, args.optimize)
+            print(f"{n: >6} {result['commands']: >10} {result['scans']: >10}")
+
+            for metric in curves:
+                curves[metric][n] = result[metric]
+
+        results[workload.name] = {}
+        for metric, curve in curves.items():
+            k, expected = exponent(curve), workload.expected[metric]
+            results[workload.name][metric] = {"curve": curve, "exponent": k, "expected": expected}
+
+            status = "ok"
+            if k > expected + TOLERANCE:
+                status = "REGRESSION"
+                regressions.append(f"{workload.name} {metric}: expected O(N^{expected}), measured O(N^{k:.2f})")
+
+            print(f"  {metric}: O(N^{k:.2f}), expected O(N^{expected}) {status}")
+
+        print()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if regressions:
+        print("Scaling regressions:", *regressions, sep="\n * ", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ from . import conversion as conv
 from . import tools
 from . import tellraw
 from . import generics
+from . import arithmetic
 
 from .paths import *
 from .exception import *
@@ -14,4 +15,6 @@ from .condition import *
 from .derived_var import *
 from .export import *
 
+# must be imported before the std library is built, so that MCUTILS_REBORN_PROFILE covers it
+from . import profiling
 from .lib import std
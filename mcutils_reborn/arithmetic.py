@@ -0,0 +1,269 @@
+"""Compiler for ArithmeticExpressions.
+
+Combining expressions with +, -, *, // and % (or minimum and maximum) builds an ArithmeticExpression tree. Nothing is
+computed until the tree is assigned with conv.var_to_var, which compiles it:
+
+ 1. Constants are folded and identities like x + 0 or x * 1 are removed, following the 32-bit integer semantics of
+    the scoreboard.
+ 2. Subexpressions that occur more than once are computed once, into a temp.
+ 3. The tree is lowered to in-place scoreboard operations. The left operand of every operation is computed directly
+    into the target, so a chain like a * b + c - d needs no temp at all. Commutative operations are reordered to
+    keep it that way.
+
+Several assignments compiled with assign_all share their common subexpressions.
+"""
+
+import typing
+
+from .expression import Expression, ArithmeticExpression, ConstExpr, ConstInt, ScoreboardVar, NbtVar, Variable
+from .command import Command, TempScoreboardPlayer
+from .exception import CompilationError
+
+COMMUTATIVE = {"+", "*", "min", "max"}
+
+SCOREBOARD_OPERATIONS = {"+": "+=", "-": "-=", "*": "*=", "//": "/=", "%": "%=", "min": "<", "max": ">"}
+
+ExpressionKey = tuple
+
+
+def minimum(a: Expression | int, b: Expression | int) -> ArithmeticExpression:
+    return ArithmeticExpression.create("min", a, b)
+
+
+def maximum(a: Expression | int, b: Expression | int) -> ArithmeticExpression:
+    return ArithmeticExpression.create("max", a, b)
+
+
+def to_int32(value: int) -> int:
+    return (value + 2 ** 31) % 2 ** 32 - 2 ** 31
+
+
+def get_constant(expr: Expression) -> int | None:
+    if isinstance(expr, ConstExpr):
+        try:
+            return int(expr.value)
+        except ValueError:
+            return None
+
+    return None
+
+
+def get_key(expr: Expression) -> ExpressionKey:
+    """A key that is equal for expressions that always have the same value."""
+
+    if isinstance(expr, ConstExpr):
+        return "const", expr.value
+
+    if isinstance(expr, ScoreboardVar):
+        return "score", *expr
+
+    if isinstance(expr, NbtVar):
+        return "nbt", *expr
+
+    if isinstance(expr, ArithmeticExpression):
+        operands = get_key(expr.left), get_key(expr.right)
+
+        if expr.operator in COMMUTATIVE:
+            operands = tuple(sorted(operands, key=repr))
+
+        return expr.operator, *operands
+
+    # e.g. derived vars, whose reads may have side effects
+    return "other", id(expr)
+
+
+def fold(expr: Expression) -> Expression:
+    """Fold constants and remove identities."""
+
+    if not isinstance(expr, ArithmeticExpression):
+        return expr
+
+    operator, left, right = expr.operator, fold(expr.left), fold(expr.right)
+    a, b = get_constant(left), get_constant(right)
+
+    if a is not None and b is not None:
+        if operator in ("//", "%") and b == 0:
+            # the scoreboard leaves the score unchanged, keep it for the runtime
+            return ArithmeticExpression(operator, left, right)
+
+        return ConstInt(to_int32({
+            "+": lambda: a + b,
+            "-": lambda: a - b,
+            "*": lambda: a * b,
+            "//": lambda: a // b,
+            "%": lambda: a % b,
+            "min": lambda: min(a, b),
+            "max": lambda: max(a, b),
+        }[operator]()))
+
+    # constants go to the right of commutative operations
+    if a is not None and operator in COMMUTATIVE:
+        left, right, a, b = right, left, b, a
+
+    # x - c = x + (-c)
+    if operator == "-" and b is not None:
+        operator, right, b = "+", ConstInt(to_int32(-b)), to_int32(-b)
+
+    if (operator, b) in (("+", 0), ("*", 1), ("//", 1)):
+        return left
+
+    if (operator, b) in (("*", 0), ("%", 1), ("%", -1)):
+        return ConstInt(0)
+
+    if operator == "-" and get_key(left) == get_key(right) and get_key(left)[0] != "other":
+        return ConstInt(0)
+
+    # (x + c1) + c2 = x + (c1 + c2), (x * c1) * c2 = x * (c1 * c2)
+    if (b is not None and operator in ("+", "*") and isinstance(left, ArithmeticExpression)
+            and left.operator == operator and get_constant(left.right) is not None):
+        return fold(ArithmeticExpression(operator, left.left, ConstInt(to_int32(
+            get_constant(left.right) + b if operator == "+" else get_constant(left.right) * b
+        ))))
+
+    return ArithmeticExpression(operator, left, right)
+
+
+def get_leaf_keys(expr: Expression) -> list[ExpressionKey]:
+    if isinstance(expr, ArithmeticExpression):
+        return get_leaf_keys(expr.left) + get_leaf_keys(expr.right)
+
+    return [get_key(expr)]
+
+
+class ExpressionCompiler:
+    def __init__(self):
+        self.commands: list[Command] = []
+        # the number of occurrences of the subexpressions of the expressions to compile
+        self.counts: dict[ExpressionKey, int] = {}
+        # temps holding the value of common subexpressions
+        self.values: dict[ExpressionKey, ScoreboardVar] = {}
+
+    def count(self, expr: Expression):
+        if isinstance(expr, ArithmeticExpression):
+            key = get_key(expr)
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+            # the operands of a common subexpression are only computed once
+            if self.counts[key] == 1:
+                self.count(expr.left)
+                self.count(expr.right)
+
+    @staticmethod
+    def new_temp() -> ScoreboardVar:
+        from .lib.std import STD_TEMP_OBJECTIVE
+
+        return ScoreboardVar(TempScoreboardPlayer("arithmetic_temp"), STD_TEMP_OBJECTIVE)
+
+    def compute_into(self, expr: Expression, target: ScoreboardVar, keep_order: bool = False):
+        """Add the commands that set target to the value of expr. With keep_order, the leftmost operand is
+        guaranteed to be read before target is written."""
+
+        if not isinstance(expr, ArithmeticExpression):
+            self.commands += conv.var_to_var(expr, target)
+            return
+
+        key = get_key(expr)
+
+        if self.counts.get(key, 0) > 1 and key not in self.values:
+            value = self.new_temp()
+            self.compute_operation(expr, value, keep_order)
+            self.values[key] = value
+
+        if key in self.values:
+            self.commands += conv.var_to_var(self.values[key], target)
+            return
+
+        self.compute_operation(expr, target, keep_order)
+
+    def compute_operation(self, expr: ArithmeticExpression, target: ScoreboardVar, keep_order: bool):
+        left, right = expr.left, expr.right
+
+        # compute the more complex operand in place, so the other one needs no temp
+        if (not keep_order and expr.operator in COMMUTATIVE and isinstance(right, ArithmeticExpression)
+                and not isinstance(left, ArithmeticExpression)):
+            left, right = right, left
+
+        self.compute_into(left, target, keep_order)
+        self.apply(target, expr.operator, right)
+
+    def apply(self, target: ScoreboardVar, operator: str, operand: Expression):
+        constant = get_constant(operand)
+
+        if constant is not None and operator in ("+", "-"):
+            self.commands += conv.add_const_to_score(target, ConstInt(constant if operator == "+" else -constant))
+            return
+
+        if isinstance(operand, ArithmeticExpression):
+            key = get_key(operand)
+
+            if key in self.values:
+                operand = self.values[key]
+            else:
+                temp = self.new_temp()
+                self.compute_into(operand, temp)
+                operand = temp
+
+        if isinstance(operand, ScoreboardVar):
+            self.commands += conv.score_score_op_in_place(target, SCOREBOARD_OPERATIONS[operator], operand)
+        else:
+            self.commands += conv.score_expr_op_in_place(target, SCOREBOARD_OPERATIONS[operator], operand)
+
+    def assign(self, expr: Expression, dst: Variable):
+        if isinstance(dst, ScoreboardVar):
+            dst_key = get_key(dst)
+            leaf_keys = get_leaf_keys(expr)
+
+            if dst_key not in leaf_keys:
+                self.compute_into(expr, dst)
+            elif leaf_keys.count(dst_key) == 1 and leaf_keys[0] == dst_key:
+                # e.g. x = x * 2 + 1, dst is read first and only once
+                self.compute_into(expr, dst, keep_order=True)
+            else:
+                temp = self.new_temp()
+                self.compute_into(expr, temp)
+                self.commands += conv.var_to_var(temp, dst)
+
+            # common subexpressions that read dst are outdated now
+            self.values = {key: value for key, value in self.values.items()
+                           if dst_key not in get_leaf_keys_of_key(key)}
+        else:
+            temp = self.new_temp()
+            self.compute_into(expr, temp)
+            self.commands += conv.var_to_var(temp, dst)
+
+            # dst may be any NBT or derived var, only the values of scores are known to be unchanged
+            self.values = {key: value for key, value in self.values.items()
+                           if all(leaf_key[0] in ("score", "const") for leaf_key in get_leaf_keys_of_key(key))}
+
+
+def get_leaf_keys_of_key(key: ExpressionKey) -> list[ExpressionKey]:
+    if key[0] in ArithmeticExpression.operators:
+        return get_leaf_keys_of_key(key[1]) + get_leaf_keys_of_key(key[2])
+
+    return [key]
+
+
+def assign_all(assignments: typing.Sequence[tuple[Expression, Variable]]) -> list[Command]:
+    """Compile the assignments (expr, dst), in order. Common subexpressions are computed once for all of them, as
+    long as the variables they read aren't assigned in between."""
+
+    compiler = ExpressionCompiler()
+    assignments = [(fold(expr), dst) for expr, dst in assignments]
+
+    for expr, dst in assignments:
+        compiler.count(expr)
+
+    for expr, dst in assignments:
+        compiler.assign(expr, dst)
+
+    return compiler.commands
+
+
+def compile_expression(expr: Expression, dst: Variable) -> list[Command]:
+    if not isinstance(dst, Variable):
+        raise CompilationError(f"Cannot assign {expr!r} to {dst!r}.")
+
+    return assign_all([(expr, dst)])
+
+
+from . import conversion as conv
@@ -33,15 +33,39 @@ class UniqueString:
     def add_path(self, value: str) -> str:
         return f"{self.path_func(self.namespace.path())}.{value}"
 
-    def get(self, existing_strings: set[str], resolve: "resolve_callable",
+    def get(self, allocator: "UniqueStringAllocator", resolve: "resolve_callable",
             path_of_func: "path_of_func_callable") -> str:
-        i = 2
-        out = self.add_path(self.value)
+        return allocator.allocate(self.add_path(self.value))
 
-        while out in existing_strings:
-            out = self.add_path(f"{self.value}.{i}")
-            i += 1
 
+class UniqueStringAllocator:
+    """Hands out unique strings. Strings that share a base get the suffixes .2, .3, ... in allocation order."""
+
+    def __init__(self):
+        self.existing_strings: set[str] = set()
+        self.next_suffixes: dict[str, int] = {}
+
+    def __contains__(self, string: str) -> bool:
+        return string in self.existing_strings
+
+    def add(self, string: str):
+        self.existing_strings.add(string)
+
+    def allocate(self, base: str) -> str:
+        out = base
+
+        if out in self.existing_strings:
+            # all suffixes below next_suffixes[base] are known to be taken, so this is amortized O(1)
+            i = self.next_suffixes.get(base, 2)
+            out = f"{base}.{i}"
+
+            while out in self.existing_strings:
+                i += 1
+                out = f"{base}.{i}"
+
+            self.next_suffixes[base] = i + 1
+
+        self.existing_strings.add(out)
         return out
 
 
@@ -54,7 +78,7 @@ class CompositeString(NonUniqueString):
         super().__init__(value, None)
         self.args = args
 
-    def get(self, existing_strings: set[str], resolve: "resolve_callable",
+    def get(self, allocator: "UniqueStringAllocator", resolve: "resolve_callable",
             path_of_func: "path_of_func_callable") -> str:
         return self.value % tuple([resolve(arg) for arg in self.args])
 
@@ -63,7 +87,7 @@ class PathString(NonUniqueString):
     def __init__(self, namespace: "Pathable | None" = None):
         super().__init__("", namespace)
 
-    def get(self, existing_strings: set[str], resolve: "resolve_callable",
+    def get(self, allocator: "UniqueStringAllocator", resolve: "resolve_callable",
             path_of_func: "path_of_func_callable") -> str:
         return path_of_func(self.namespace)
 
@@ -82,10 +106,19 @@ class UniqueScoreboardObjective(UniqueRestrictedString): pass
 class UniqueScoreboardPlayer(UniqueRestrictedString): pass
 
 
+class TempScoreboardPlayer(UniqueScoreboardPlayer):
+    """A player that is only used within the commands of one mcfunction. Temps that are never live at the same time
+    share a player, see regalloc.py."""
+
+
 class Command(abc.ABC):
     def get_str(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
         ...
 
+    def get_fingerprint(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
+        """Return a string that changes whenever the output of get_str changes. Used by incremental exports."""
+        return self.get_str(path_of_func, strings)
+
     # noinspection PyMethodMayBeStatic
     def get_unique_strings(self) -> typing.Sequence[UniqueString]:
         return ()
@@ -107,6 +140,9 @@ class LiteralCommand(Command):
         except TypeError as e:
             raise CompilationError(f"Command {self.literal!r} has {len(self.args)} args.") from e
 
+    def get_fingerprint(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
+        return repr((self.literal, *(strings[arg] if isinstance(arg, UniqueString) else arg for arg in self.args)))
+
     def get_unique_strings(self) -> typing.Iterable[UniqueString]:
         return [arg for arg in self.args if isinstance(arg, UniqueString)]
 
@@ -125,19 +161,100 @@ class FunctionCall(Command):
         return f"function {path_of_func(self.function)}"
 
 
+class FetchObject(FunctionCall):
+    """Calls std_object_fetch_object. obj is the score the object id was copied to STD_ARG from, if it is a score.
+
+    The optimizer removes the call if the same object is still fetched.
+    """
+
+    def __init__(self, function: "Pathable", obj: tuple[UniqueString | str, UniqueString | str] | None = None):
+        super().__init__(function)
+
+        self.obj = obj
+
+
+class ScheduleFunction(FunctionCall):
+    """Schedules function to run time later, by the server and at the world spawn, instead of calling it.
+
+    The optimizer treats it like a call of function, which is safe, as it only runs later than a call would.
+    """
+
+    def __init__(self, function: "Pathable", time: str = "1t", mode: typing.Literal["append", "replace"] = "append"):
+        super().__init__(function)
+
+        self.time = time
+        self.mode = mode
+
+    def get_str(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
+        return f"schedule function {path_of_func(self.function)} {self.time} {self.mode}"
+
+
+class StoreObject(FunctionCall):
+    """Calls std_object_store_object. Doesn't change which object is fetched."""
+
+
 class Comment(LiteralCommand):
     def __init__(self, comment: str, *args):
         super().__init__(f"\n# {comment}", *args)
 
 
+class NoOpCommand(Comment):
+    """A comment that stands in for a command that turned out to be unnecessary, e.g. copying a score to itself."""
+
+
+class ScoreAssignment(LiteralCommand):
+    """A command that unconditionally overwrites the score dst.
+
+    If src is given, the command copies the score src to dst. Apart from that, the command must not read any score
+    other than the ones in its args. This lets the optimizer reason about the command.
+    """
+
+    def __init__(self, literal: str, *args: UniqueString | str,
+                 dst: tuple[UniqueString | str, UniqueString | str],
+                 src: tuple[UniqueString | str, UniqueString | str] | None = None):
+        super().__init__(literal, *args)
+
+        self.dst = dst
+        self.src = src
+
+
+class ConditionStore(ScoreAssignment):
+    """Stores whether condition holds in the score dst, see Function.c_if.
+
+    inputs are the players whose scores are the only thing the condition depends on, or None if it depends on
+    anything else, e.g. entities.
+    """
+
+    def __init__(self, dst: tuple[UniqueString | str, UniqueString | str], condition: str,
+                 condition_args: tuple[UniqueString, ...], inputs: set[UniqueString] | None):
+        super().__init__(f"execute store success score %s %s if {condition}", *dst, *condition_args, dst=dst)
+
+        self.condition = condition
+        self.condition_args = condition_args
+        self.inputs = inputs
+
+
+class TagRemoveAll(LiteralCommand):
+    """Removes a tag from all entities."""
+
+    def __init__(self, tag: UniqueString | str):
+        super().__init__("\n# remove the temp tag from all entities\ntag @e remove %s", tag)
+
+        self.tag = tag
+
+
 class SayCommand(LiteralCommand):
     def __init__(self, message: str):
         super().__init__(f"say {message}")
 
 
 class DynamicCommand(Command):
-    def __init__(self, func: typing.Callable[["path_of_func_callable", "resolve_callable"], str]):
+    def __init__(self, func: typing.Callable[["path_of_func_callable", "resolve_callable"], str],
+                 *unique_strings: UniqueString):
+        """unique_strings are the strings func resolves. They are resolved at export like the ones of other commands."""
+
         self.func = func
+        self.unique_strings = unique_strings
 
     def get_str(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
         def resolve(arg: UniqueString | str) -> str:
@@ -148,6 +265,9 @@ class DynamicCommand(Command):
 
         return self.func(path_of_func, resolve)
 
+    def get_unique_strings(self) -> typing.Sequence[UniqueString]:
+        return self.unique_strings
+
 
 class ComposedCommand(Command):
     def __init__(self, *commands: Command):
@@ -159,6 +279,12 @@ class ComposedCommand(Command):
             for command in self.commands
         )
 
+    def get_fingerprint(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
+        return repr(tuple(command.get_fingerprint(path_of_func, strings) for command in self.commands))
+
+    def get_unique_strings(self) -> typing.Sequence[UniqueString]:
+        return [unique_string for command in self.commands for unique_string in command.get_unique_strings()]
+
 
 from .namespace import Pathable
 from .export import path_of_func_callable, resolve_callable
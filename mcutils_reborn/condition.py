@@ -1,6 +1,6 @@
 import typing
 
-from .command import UniqueString
+from .command import UniqueString, NonUniqueString
 from .expression import ScoreboardVar
 
 
@@ -15,12 +15,38 @@ class Condition:
             tuple(arg for arg in self.args if isinstance(arg, UniqueString))
         )
 
+    def get_score_inputs(self) -> set[UniqueString] | None:
+        """The fake players whose scores are the only thing the condition depends on, or None if it may depend on
+        anything else."""
+
+        return None
+
+
+def _get_score_inputs(*exprs: ScoreboardVar) -> set[UniqueString] | None:
+    players = {expr.player for expr in exprs}
+
+    # selectors and plain strings may refer to entities, whose scores can change in ways that can't be tracked
+    if all(isinstance(player, UniqueString) and not isinstance(player, NonUniqueString) for player in players):
+        return players
+
+    return None
+
 
 class ScoreCondition(Condition):
     def __init__(self, expr1: ScoreboardVar, cmp: typing.Literal["=", "<", ">", "<=", ">="], expr2: ScoreboardVar):
         super().__init__("score", *expr1, cmp, *expr2)
 
+        self.exprs = expr1, expr2
+
+    def get_score_inputs(self) -> set[UniqueString] | None:
+        return _get_score_inputs(*self.exprs)
+
 
 class ScoreConditionMatches(Condition):
     def __init__(self, expr1: ScoreboardVar, value: str | UniqueString):
-        super().__init__("score", *expr1, "matches", value)
\ No newline at end of file
+        super().__init__("score", *expr1, "matches", value)
+
+        self.expr = expr1
+
+    def get_score_inputs(self) -> set[UniqueString] | None:
+        return _get_score_inputs(self.expr)
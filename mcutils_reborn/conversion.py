@@ -1,3 +1,6 @@
+import re
+import typing
+
 from .exception import issue_warning, CompilationWarning
 from .expression import *
 from .command import *
@@ -51,10 +54,11 @@ NbtVar[list[str]] -> NbtVar[str]:
 
 def score_to_score(src: ScoreboardVar, dst: ScoreboardVar) -> Command:
     if src == dst:
-        return Comment("scores are equal")
+        return NoOpCommand("scores are equal")
 
-    return LiteralCommand(f"scoreboard players operation %s %s = %s %s",
-                          dst.player, dst.objective, src.player, src.objective)
+    return ScoreAssignment(f"scoreboard players operation %s %s = %s %s",
+                           dst.player, dst.objective, src.player, src.objective,
+                           dst=tuple(dst), src=tuple(src))
 
 
 def score_to_nbt(src: ScoreboardVar, dst: NbtVar[NumberType], scale: float = 1) -> Command:
@@ -68,23 +72,38 @@ def score_to_nbt(src: ScoreboardVar, dst: NbtVar[NumberType], scale: float = 1)
 
 
 def const_to_score(src: ConstExpr[WholeNumberType], dst: ScoreboardVar) -> Command:
-    return LiteralCommand(f"scoreboard players set %s %s {src.value}", dst.player, dst.objective)
+    return ScoreAssignment(f"scoreboard players set %s %s {src.value}", dst.player, dst.objective, dst=tuple(dst))
+
+
+_SNBT_SUFFIXES = {"byte": "b", "short": "s", "long": "L", "float": "f", "double": "d"}
+
+
+def const_to_snbt(src: ConstExpr, dtype: typing.Type[DataType]) -> str:
+    """The SNBT of src, with the number suffix of dtype if src is a plain number."""
+
+    suffix = _SNBT_SUFFIXES.get(getattr(dtype, "dtype", None), "")
+
+    if suffix and re.fullmatch(r"-?\d+(\.\d*)?", src.value):
+        return src.value + suffix
+
+    return src.value
 
 
 def const_to_nbt(src: ConstExpr[T_concrete], dst: NbtVar[T_concrete]) -> Command:
     return LiteralCommand(
-        f"data modify {dst.nbt_container_type} %s {dst.path} set value {src.value}",
+        f"data modify {dst.nbt_container_type} %s {dst.path} set value {const_to_snbt(src, dst.dtype_obj)}",
         dst.nbt_container_argument
     )
 
 
 def nbt_to_score(src: NbtVar, dst: ScoreboardVar, scale: float = 1) -> Command:
-    return LiteralCommand(
+    return ScoreAssignment(
         f"execute store result score %s %s run data get {src.nbt_container_type} "
         f"%s {src.path} {scale}",
 
         dst.player, dst.objective,
-        src.nbt_container_argument
+        src.nbt_container_argument,
+        dst=tuple(dst)
     )
 
 
@@ -97,6 +116,42 @@ def nbt_to_same_nbt(src: NbtVar[T_concrete], dst: NbtVar[T_concrete]) -> Command
     )
 
 
+def nbt_merge_into_nbt(src: NbtVar[CompoundType], dst: NbtVar[CompoundType]) -> Command:
+    return LiteralCommand(
+        f"data modify {dst.nbt_container_type} %s {dst.path} "
+        f"merge from {src.nbt_container_type} %s {src.path}",
+        dst.nbt_container_argument,
+        src.nbt_container_argument
+    )
+
+
+def is_compound_key(key: str) -> bool:
+    """Whether key can be a key of an SNBT compound as it is. Unlike in an NBT path, a dot doesn't nest."""
+
+    return re.fullmatch(r"[A-Za-z0-9_+-]+", key) is not None
+
+
+def consts_merge_into_nbt(src: dict[str, ConstExpr], dst: NbtVar[CompoundType],
+                          dtypes: dict[str, typing.Type[DataType]] | None = None) -> Command:
+    """Merge the constants src into dst with one command. dtypes are the types of the keys, by default the ones of
+    the constants."""
+
+    dtypes = dtypes or {}
+
+    for key in src:
+        if not is_compound_key(key):
+            raise CompilationError(f"Cannot merge a constant into {key!r}, it must be a single compound key.")
+
+    compound = ", ".join(
+        f"{key}: {const_to_snbt(value, dtypes.get(key, value.dtype_obj))}" for key, value in src.items()
+    )
+
+    return LiteralCommand(
+        f"data modify {dst.nbt_container_type} %s {dst.path} merge value {{{compound}}}",
+        dst.nbt_container_argument
+    )
+
+
 def nbt_number_to_nbt_number(src: NbtVar[NumberType],
                              dst: NbtVar[NumberType]) -> Command:
     return nbt_to_nbt_execute_store(src, dst, scale=10e10, scale2=10e-10)
@@ -195,6 +250,32 @@ def expr_to_nbt(src: Expression, dst: NbtVar, scale: float = 1) -> list[Command]
 
 
 def var_to_var(src: Expression, dst: Variable, scale: float = 1) -> list[Command]:
+    if isinstance(dst, (ScoreboardVar, DerivedVar)) and dst.is_data_type(ObjectType):
+        from .lib import std
+
+        # dst holds a reference, the reference counts of the old and the new object change
+        return std.std_object_assign(src, dst)
+
+    if isinstance(src, ArithmeticExpression):
+        if scale == 1:
+            return arithmetic.compile_expression(src, dst)
+
+        temp_var = arithmetic.ExpressionCompiler.new_temp()
+        return [
+            *arithmetic.compile_expression(src, temp_var),
+            *var_to_var(temp_var, dst, scale),
+        ]
+
+    if isinstance(src, DerivedVar) and isinstance(dst, DerivedVar):
+        from .lib.std import STD_TEMP_STORAGE
+
+        # e.g. copying an object, only one object can be fetched at a time
+        temp_var = NbtVar[src.dtype_obj]("storage", STD_TEMP_STORAGE, "derived_var_temp")
+        return [
+            *src.to_primitive_var(temp_var),
+            *dst.from_primitive_var(temp_var),
+        ]
+
     if isinstance(src, DerivedVar):
         if isinstance(dst, (NbtVar, ScoreboardVar)):
             return [
@@ -202,7 +283,7 @@ def var_to_var(src: Expression, dst: Variable, scale: float = 1) -> list[Command
             ]
 
     if isinstance(dst, DerivedVar):
-        if isinstance(src, (NbtVar, ScoreboardVar)):
+        if isinstance(src, (NbtVar, ScoreboardVar, ConstExpr)):
             return [
                 *dst.from_primitive_var(src)
             ]
@@ -216,6 +297,110 @@ def var_to_var(src: Expression, dst: Variable, scale: float = 1) -> list[Command
     raise CompilationError(f"Cannot set {src!r} to {dst!r}.")
 
 
+def _get_batched_obj(src: Expression, dst: Variable) -> Expression | None:
+    """The object whose attribute is read or written by the assignment, if vars_to_vars can batch it."""
+
+    if isinstance(src, DerivedVar) == isinstance(dst, DerivedVar):
+        return None
+
+    if dst.is_data_type(ObjectType):
+        # reference counted, see var_to_var
+        return None
+
+    if isinstance(dst, ObjectAttributeVar):
+        # evaluating src would fetch another object in the middle of the batch
+        if _reads_derived_var(src) or _reads_derived_var(dst.obj):
+            return None
+
+        return dst.obj
+
+    if (isinstance(src, ObjectAttributeVar) and not _is_same_expression(src.obj, dst)
+            and not _reads_derived_var(src.obj)):
+        return src.obj
+
+    return None
+
+
+def _reads_derived_var(expr: Expression) -> bool:
+    if isinstance(expr, ArithmeticExpression):
+        return _reads_derived_var(expr.left) or _reads_derived_var(expr.right)
+
+    return isinstance(expr, DerivedVar)
+
+
+def _is_same_expression(a: Expression, b: Expression) -> bool:
+    if isinstance(a, ScoreboardVar) and isinstance(b, ScoreboardVar):
+        return a == b
+
+    if isinstance(a, ConstExpr) and isinstance(b, ConstExpr):
+        return a.value == b.value
+
+    return a is b
+
+
+def vars_to_vars(assignments: typing.Iterable[tuple[Expression, Variable]]) -> list[Command]:
+    """var_to_var(src, dst) for each (src, dst), in order. Consecutive reads and writes of attributes of the same
+    object are batched: the object is fetched and written back once, and constants are merged in with one command."""
+
+    from .lib import std
+
+    groups: list[tuple[Expression | None, list[tuple[Expression, Variable]]]] = []
+
+    for src, dst in assignments:
+        obj = _get_batched_obj(src, dst)
+
+        if obj is not None and groups and groups[-1][0] is not None and _is_same_expression(groups[-1][0], obj):
+            groups[-1][1].append((src, dst))
+        else:
+            groups.append((obj, [(src, dst)]))
+
+    out = []
+    for obj, group in groups:
+        if obj is None or len(group) == 1:
+            out += [command for src, dst in group for command in var_to_var(src, dst)]
+            continue
+
+        out += std.std_object_fetch(obj)
+
+        written = False
+        constants: dict[str, ConstExpr] = {}
+        dtypes: dict[str, typing.Type[DataType]] = {}
+
+        def merge_constants():
+            if len(constants) == 1:
+                (attribute, value), = constants.items()
+                out.extend(var_to_var(value, std.std_object_data(dtypes[attribute], attribute)))
+            elif constants:
+                out.append(consts_merge_into_nbt(constants, std.std_object_data(), dtypes))
+
+            constants.clear()
+            dtypes.clear()
+
+        for src, dst in group:
+            if isinstance(dst, ObjectAttributeVar):
+                written = True
+
+                if isinstance(src, ConstExpr) and isinstance(dst.attribute, str) and is_compound_key(dst.attribute):
+                    # a later constant for the same attribute wins, like it would with separate commands
+                    constants.pop(dst.attribute, None)
+                    constants[dst.attribute] = src
+                    dtypes[dst.attribute] = dst.dtype_obj
+                    continue
+
+                merge_constants()
+                out += var_to_var(src, std.std_object_data(dst.dtype_obj, dst.attribute))
+            else:
+                merge_constants()
+                out += var_to_var(std.std_object_data(src.dtype_obj, src.attribute), dst)
+
+        merge_constants()
+
+        if written:
+            out += std.std_object_write_back()
+
+    return out
+
+
 def add_const_to_score(src: ScoreboardVar, increment: ConstExpr[NumberType], scale: float = 1) -> list[Command]:
     val = int(int(increment.value) * scale)
 
@@ -260,7 +445,7 @@ def add_const(src: Variable[NumberType], increment: ConstExpr[NumberType]) -> li
                 ]
             from .lib.std import STD_TEMP_OBJECTIVE
 
-            temp_var = ScoreboardVar("add_const_to_nbt", STD_TEMP_OBJECTIVE)
+            temp_var = ScoreboardVar(TempScoreboardPlayer("add_const_to_nbt"), STD_TEMP_OBJECTIVE)
             return [
                 *var_to_var(src, temp_var, scale=10e10),
                 *add_const_to_score(temp_var, increment, scale=10e10),
@@ -281,11 +466,46 @@ def score_score_op_in_place(src: ScoreboardVar,
     ]
 
 
+def score_const_op_in_place(src: ScoreboardVar,
+                            operation: typing.Literal["%=", "*=", "+=", "-=", "/=", "<", "=", ">"],
+                            value: int) -> list[Command]:
+    """Apply an operation with a constant, with the cheapest commands for it. Operations that need a score as operand
+    use a score of the constants objective, which is set in the load function of the std library."""
+
+    from .lib.std import std_constant
+
+    if (operation, value) in (("+=", 0), ("-=", 0), ("*=", 1), ("/=", 1)):
+        # not a no-op, these set an unset score to 0
+        return add_const_to_score(src, ConstInt(0))
+
+    if (operation, value) in (("*=", 0), ("%=", 1), ("%=", -1)):
+        return [const_to_score(ConstInt(0), src)]
+
+    if operation in ("+=", "-="):
+        return add_const_to_score(src, ConstInt(value if operation == "+=" else -value))
+
+    if operation == "=":
+        return [const_to_score(ConstInt(value), src)]
+
+    if operation == "*=" and value == 2:
+        return score_score_op_in_place(src, "+=", src)
+
+    return score_score_op_in_place(src, operation, std_constant(value))
+
+
 def score_expr_op_in_place(src: ScoreboardVar,
                            operation: typing.Literal["%=", "*=", "+=", "-=", "/=", "<", "=", ">", "><"],
                            other: Expression[NumberType]) -> list[Command]:
+    if isinstance(other, ConstExpr) and operation != "><":
+        try:
+            value = int(other.value)
+        except ValueError:
+            pass
+        else:
+            return score_const_op_in_place(src, operation, value)
+
     from .lib.std import STD_TEMP_OBJECTIVE
-    temp_var = ScoreboardVar("score_expr_op_in_place_temp", STD_TEMP_OBJECTIVE)
+    temp_var = ScoreboardVar(TempScoreboardPlayer("score_expr_op_in_place_temp"), STD_TEMP_OBJECTIVE)
 
     return [
         *var_to_var(other, temp_var),
@@ -297,6 +517,9 @@ def add_in_place(src: Variable[NumberType], increment: Expression[NumberType]) -
     if isinstance(increment, ConstExpr):
         return add_const(src, increment)
 
+    if isinstance(increment, ArithmeticExpression) and isinstance(src, ScoreboardVar):
+        return arithmetic.compile_expression(src + increment, src)
+
     if isinstance(src, ScoreboardVar):
         if isinstance(increment, ScoreboardVar):
             return score_score_op_in_place(src, "+=", increment)
@@ -307,7 +530,7 @@ def add_in_place(src: Variable[NumberType], increment: Expression[NumberType]) -
 
             from .lib.std import STD_TEMP_OBJECTIVE
 
-            temp_var = ScoreboardVar("add_in_place_temp", STD_TEMP_OBJECTIVE)
+            temp_var = ScoreboardVar(TempScoreboardPlayer("add_in_place_temp"), STD_TEMP_OBJECTIVE)
             return [
                 *var_to_var(increment, temp_var),
                 *score_score_op_in_place(src, "+=", temp_var)
@@ -323,4 +546,5 @@ def add_in_place(src: Variable[NumberType], increment: Expression[NumberType]) -
     raise CompilationError(f"Cannot add {increment!r} to {src!r}.")
 
 
-from .derived_var import DerivedVar
+from .derived_var import DerivedVar, ObjectAttributeVar
+from . import arithmetic
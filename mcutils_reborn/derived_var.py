@@ -10,7 +10,7 @@ class DerivedVar(Variable):
     def to_primitive_var(self, dst: NbtVar | ScoreboardVar) -> list["Command"]:
         raise NotImplementedError
 
-    def from_primitive_var(self, src: NbtVar | ScoreboardVar) -> list["Command"]:
+    def from_primitive_var(self, src: NbtVar | ScoreboardVar | ConstExpr) -> list["Command"]:
         raise NotImplementedError
 
 
@@ -29,16 +29,17 @@ class ObjectAttributeVar(DerivedVar):
         from .lib import std
 
         return [
-            *tools.call_function(std.std_object_fetch_object, arg=self.obj),
-            *conv.var_to_var(NbtVar[self.dtype_obj]("entity", std.STD_OBJ_RET_SEL, path=f"data.{self.attribute}"), dst)
+            *std.std_object_fetch(self.obj),
+            *conv.var_to_var(std.std_object_data(self.dtype_obj, self.attribute), dst)
         ]
 
-    def from_primitive_var(self, src: NbtVar | ScoreboardVar) -> list["Command"]:
+    def from_primitive_var(self, src: NbtVar | ScoreboardVar | ConstExpr) -> list["Command"]:
         from .lib import std
 
         return [
-            *tools.call_function(std.std_object_fetch_object, arg=self.obj),
-            *conv.var_to_var(src, NbtVar[self.dtype_obj]("entity", std.STD_OBJ_RET_SEL, path=f"data.{self.attribute}"))
+            *std.std_object_fetch(self.obj),
+            *conv.var_to_var(src, std.std_object_data(self.dtype_obj, self.attribute)),
+            *std.std_object_write_back(),
         ]
 
     def __iter__(self):
@@ -47,3 +48,66 @@ class ObjectAttributeVar(DerivedVar):
 
     def __repr__(self):
         return f"{self.__class__.__name__}[{self.dtype_name}]({self.obj!r}, {self.attribute!r})"
+
+
+class ObjectDataVar(DerivedVar):
+    """The data compound of an object, i.e. all of its attributes. Copying it from or to NBT fetches the object once
+    and takes a single command, regardless of the number of attributes. Writing it also releases the references held
+    by the old attributes and counts the ones held by the new, see std_object_release_data."""
+
+    def __init__(self, obj: Expression[WholeNumberType]):
+        self.obj = obj
+
+    def to_tellraw(self,
+                   curr_text_kwargs: dict[str, typing.Any],
+                   resolve: typing.Callable[[UniqueString | str], str]
+                   ) -> tuple[list[str], list["tellraw.TextComponent"]]:
+        # the object would have to be fetched, which a tellraw can't do
+        raise CompilationError(f"Cannot print {self!r}, copy it to an NbtVar first, or use std_debug_objdump.")
+
+    def to_primitive_var(self, dst: NbtVar | ScoreboardVar) -> list["Command"]:
+        from .lib import std
+
+        data = std.std_object_data(self.dtype_obj)
+
+        return [
+            *std.std_object_fetch(self.obj),
+            # the compound is copied as a whole, a score gets the number of attributes
+            *([conv.nbt_to_same_nbt(data, dst)] if isinstance(dst, NbtVar) else conv.var_to_var(data, dst))
+        ]
+
+    def from_primitive_var(self, src: NbtVar | ScoreboardVar) -> list["Command"]:
+        from .lib import std
+
+        if not isinstance(src, NbtVar):
+            raise CompilationError(f"Cannot set the data of an object to {src!r}, it must be a compound NbtVar.")
+
+        return [
+            *std.std_object_fetch(self.obj),
+            # the attributes that hold references are overwritten as well
+            *std.std_object_release_data(),
+            conv.nbt_to_same_nbt(src, std.std_object_data(self.dtype_obj)),
+            *std.std_object_retain_data(),
+            *std.std_object_write_back(),
+        ]
+
+    def merge(self, src: NbtVar[CompoundType] | dict[str, ConstExpr]) -> list["Command"]:
+        """Set the attributes of the compound src, or the constant attributes of the dict src, leaving the others."""
+
+        from .lib import std
+
+        data = std.std_object_data(self.dtype_obj)
+
+        return [
+            *std.std_object_fetch(self.obj),
+            *std.std_object_release_data(),
+            conv.nbt_merge_into_nbt(src, data) if isinstance(src, NbtVar) else conv.consts_merge_into_nbt(src, data),
+            *std.std_object_retain_data(),
+            *std.std_object_write_back(),
+        ]
+
+    def __iter__(self):
+        yield self.obj
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}[{self.dtype_name}]({self.obj!r})"
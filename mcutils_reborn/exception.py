@@ -1,5 +1,8 @@
+import os
 import sys
 import traceback
+import types
+import typing
 import warnings
 
 
@@ -7,6 +10,10 @@ class CompilationError(Exception):
     """Exception raised when a compile error occurs."""
 
 
+class InterpreterError(Exception):
+    """Exception raised when the interpreter encounters a command it doesn't support."""
+
+
 class CompilationWarning(Warning):
     def __init__(self, message: str, traceback_cutoff: int = 1):
         super().__init__(f"{message}")
@@ -14,7 +21,107 @@ class CompilationWarning(Warning):
         self.traceback_cutoff = traceback_cutoff
 
 
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class WarningRecord:
+    """All occurrences of one warning at one call site."""
+
+    def __init__(self, warning: CompilationWarning, filename: str, lineno: int):
+        self.message = str(warning)
+        self.category = warning.__class__.__name__
+        self.filename = filename
+        self.lineno = lineno
+        self.count = 0
+        self.stack: list[str] | None = None
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "message": self.message,
+            "category": self.category,
+            "location": f"{self.filename}:{self.lineno}",
+            "count": self.count,
+        }
+
+    def __str__(self):
+        return f"{self.filename}:{self.lineno}: {self.category}: {self.message}"
+
+
+def _get_call_site(frame: types.FrameType) -> types.FrameType:
+    """The first frame outside of this package, i.e. the code that uses mcutils_reborn."""
+
+    call_site = frame
+    while call_site is not None and call_site.f_code.co_filename.startswith(_PACKAGE_DIR):
+        call_site = call_site.f_back
+
+    return frame if call_site is None else call_site
+
+
+class WarningBuffer:
+    """Collects the warnings issued during a build, deduplicated by message and call site.
+
+    Only the call site is recorded for each warning, which is cheap. Set capture_stacks to also keep the full stack
+    of the first occurrence of each warning.
+    """
+
+    def __init__(self, capture_stacks: bool = False):
+        self.capture_stacks = capture_stacks
+        self.records: dict[tuple[str, str, str, int], WarningRecord] = {}
+
+    def add(self, warning: CompilationWarning, frame: types.FrameType):
+        call_site = _get_call_site(frame)
+        filename, lineno = call_site.f_code.co_filename, call_site.f_lineno
+        key = warning.__class__.__name__, str(warning), filename, lineno
+
+        if key not in self.records:
+            self.records[key] = WarningRecord(warning, filename, lineno)
+
+            if self.capture_stacks:
+                self.records[key].stack = traceback.format_stack(frame)
+
+        self.records[key].count += 1
+
+    def merge(self, records: list[WarningRecord]):
+        """Add records that were collected by another buffer, e.g. in a worker process."""
+
+        for record in records:
+            key = record.category, record.message, record.filename, record.lineno
+
+            if key in self.records:
+                self.records[key].count += record.count
+            else:
+                self.records[key] = record
+
+    def drain(self) -> list[WarningRecord]:
+        """Return the warnings collected so far and clear the buffer."""
+
+        out = list(self.records.values())
+        self.records.clear()
+        return out
+
+
+warning_buffer = WarningBuffer()
+
+
+def format_warning_summary(records: list[WarningRecord]) -> str:
+    out = [f"{len(records)} distinct compilation warning(s), {sum(record.count for record in records)} in total:\n"]
+
+    for record in records:
+        out.append(f" [x{record.count}] {record}\n")
+
+        if record.stack is not None:
+            out.append("".join("   " + line for line in "".join(record.stack).splitlines(keepends=True)))
+
+    return "".join(out)
+
+
 def issue_warning(warning: CompilationWarning):
-    sys.stderr.write("".join(traceback.format_stack()[:-warning.traceback_cutoff]))
-    warnings.warn(warning)
-    sys.stderr.write("\n")
+    frame = sys._getframe(warning.traceback_cutoff)
+    call_site = _get_call_site(frame)
+
+    # also issue it through the warnings module, so that filters such as -W error apply
+    warnings.warn_explicit(warning, warning.__class__, call_site.f_code.co_filename, call_site.f_lineno,
+                           module=call_site.f_globals.get("__name__"),
+                           registry=call_site.f_globals.setdefault("__warningregistry__", {}))
+
+    warning_buffer.add(warning, frame)
@@ -1,11 +1,207 @@
+import concurrent.futures
+import collections
+import contextlib
+import hashlib
+import itertools
+import json
+import multiprocessing
 import os
+import shutil
+import sys
+import zipfile
 import beet
 
-from .namespace import Pathable
+from .namespace import Pathable, MCFunction
 from .function import Namespace, FunctionTag
 from .paths import *
-from .command import LiteralCommand, UniqueString, Command, NonUniqueString, FunctionCall, Comment
-from .exception import CompilationError
+from .command import LiteralCommand, UniqueString, Command, FunctionCall, Comment, UniqueStringAllocator, \
+    UniqueScoreboardPlayer
+from .exception import CompilationError, WarningRecord, warning_buffer, format_warning_summary
+from .report import BuildReport, FunctionReport
+from .optimize import optimize as optimize_commands, inline_mcfunctions, lower_conditions
+from .regalloc import allocate_registers
+
+# bump this whenever the format of the fingerprints file or the rendered output of an unchanged MCFunction changes
+FINGERPRINT_VERSION = 4
+
+LinkPass = typing.Callable[[dict[tuple[str, ...], MCFunction]], dict[tuple[str, ...], MCFunction]]
+
+# passes that complete the mcfunctions of a library from the rest of the datapack, e.g. the dispatch of the scheduler.
+# They run on every export, before the optimizer, and return copies of the mcfunctions they change like
+# lower_conditions, so the tree stays the same and other datapacks aren't affected.
+LINK_PASSES: list[LinkPass] = []
+
+
+def register_link_pass(link_pass: LinkPass) -> LinkPass:
+    LINK_PASSES.append(link_pass)
+    return link_pass
+
+
+def path_of_func(pathable: Pathable) -> str:
+    return ("#" if isinstance(pathable, FunctionTag) else "") + path_to_str(pathable.path())
+
+
+def function_file_path(path: Path) -> str:
+    namespace, *rest = path
+    return "/".join(["data", namespace, "functions", *rest]) + ".mcfunction"
+
+
+def function_tag_file_path(tag: str) -> str:
+    namespace, tag_path = tag.split(":", 1)
+    return "/".join(["data", namespace, "tags", "functions", tag_path]) + ".json"
+
+
+def get_mcfunc_tags(mcfunc: MCFunction) -> list[str]:
+    return sorted(path_to_str(tag.path()) if isinstance(tag, FunctionTag) else tag for tag in mcfunc.tags)
+
+
+def get_mcfunc_commands(path: Path, mcfunc: MCFunction, optimize: int = 0) -> list[Command]:
+    """Return the commands of the .mcfunction file of mcfunc, including the header and the continuation. The body is
+    run through the optimizer passes of the given level."""
+
+    tags = get_mcfunc_tags(mcfunc)
+
+    handles_comment = []
+    if tags:
+        handles_comment += [
+            LiteralCommand("#"),
+            LiteralCommand("# @handles"),
+            *[LiteralCommand(f"#   #{handler}") for handler in tags]
+        ]
+
+    description_comment = []
+    if mcfunc.description:
+        description_comment += [
+            LiteralCommand("#"),
+            *[LiteralCommand(f"# {paragraph}") for paragraph in mcfunc.description.splitlines()]
+        ]
+
+    commands = [
+        LiteralCommand(f"#> {path_to_str(path)}"),
+        *description_comment,
+        *handles_comment,
+        *optimize_commands(mcfunc.commands, optimize),
+    ]
+    if mcfunc.continuation:
+        commands += [
+            Comment("Continuation:"),
+            FunctionCall(mcfunc.continuation)
+        ]
+    else:
+        commands += [
+            Comment("No continuation.")
+        ]
+
+    return commands
+
+
+def get_mcfunc_content(path: Path, mcfunc: MCFunction, strings: dict[UniqueString, str],
+                       optimize: int = 0) -> list[str]:
+    try:
+        return [cmd.get_str(path_of_func, strings) for cmd in get_mcfunc_commands(path, mcfunc, optimize)]
+    except CompilationError as e:
+        raise CompilationError(f"Error getting command string in function {path_to_str(mcfunc.path())}.") from e
+
+
+# State of the current parallel render. Worker processes are forked, so they inherit it instead of unpickling the
+# command objects, which may contain lambdas.
+_render_jobs: list[tuple[Path, MCFunction]] = []
+_render_strings: dict[UniqueString, str] = {}
+_render_optimize: int = 0
+
+
+def _render_chunk(chunk: range) -> tuple[list[list[str]], list[WarningRecord]]:
+    contents = [get_mcfunc_content(path, mcfunc, _render_strings, _render_optimize) for path, mcfunc in
+                (_render_jobs[i] for i in chunk)]
+
+    # warnings issued in a worker process would be lost otherwise
+    return contents, warning_buffer.drain()
+
+
+def render_mcfunctions(jobs: list[tuple[Path, MCFunction]],
+                       strings: dict[UniqueString, str],
+                       workers: int | None = None,
+                       optimize: int = 0) -> typing.Iterator[list[str]]:
+    """Lazily render the content of the given mcfunctions, in order. With workers > 1, render them in a process pool.
+
+    Rendering is pure Python, so threads wouldn't run in parallel. Where processes can't be forked, this renders
+    serially.
+    """
+
+    if workers is None or workers <= 1 or len(jobs) <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for path, mcfunc in jobs:
+            yield get_mcfunc_content(path, mcfunc, strings, optimize)
+
+        return
+
+    global _render_jobs, _render_strings, _render_optimize
+    _render_jobs, _render_strings, _render_optimize = jobs, strings, optimize
+
+    # a few chunks per worker balances the load without paying for a round trip per mcfunction
+    chunk_size = max(1, len(jobs) // (workers * 4))
+    chunks = [range(i, min(i + chunk_size, len(jobs))) for i in range(0, len(jobs), chunk_size)]
+
+    executor = concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+
+    try:
+        with executor:
+            # only keep a few chunks per worker in flight, so that rendered chunks don't pile up in memory if they
+            # are consumed slower than they are rendered
+            chunks_left = iter(chunks)
+            pending = collections.deque(executor.submit(_render_chunk, chunk)
+                                        for chunk in itertools.islice(chunks_left, workers * 2))
+
+            while pending:
+                chunk_content, warnings = pending.popleft().result()
+
+                for chunk in itertools.islice(chunks_left, 1):
+                    pending.append(executor.submit(_render_chunk, chunk))
+
+                warning_buffer.merge(warnings)
+                yield from chunk_content
+    finally:
+        _render_jobs, _render_strings, _render_optimize = [], {}, 0
+
+
+def dump_file(origin: str | zipfile.ZipFile, file_path: str, file: beet.File):
+    """Write a single file into a pack directory or a zipped pack."""
+
+    if not isinstance(origin, zipfile.ZipFile):
+        os.makedirs(os.path.dirname(os.path.join(origin, file_path)), exist_ok=True)
+
+    file.dump(origin, file_path)
+
+
+def remove_output(path: str):
+    """Remove a pack directory or a zipped pack, if it exists."""
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.isfile(path):
+        os.remove(path)
+
+
+def get_mcfunc_fingerprint(path: Path, mcfunc: MCFunction, strings: dict[UniqueString, str],
+                           optimize: int = 0) -> str:
+    """Hash everything the content of the .mcfunction file of mcfunc depends on without rendering it."""
+
+    fingerprint = hashlib.sha1(repr((
+        FINGERPRINT_VERSION,
+        optimize,
+        tuple(path),
+        mcfunc.description,
+        get_mcfunc_tags(mcfunc),
+        path_of_func(mcfunc.continuation) if mcfunc.continuation else None,
+    )).encode())
+
+    try:
+        for command in mcfunc.commands:
+            fingerprint.update(command.get_fingerprint(path_of_func, strings).encode())
+            fingerprint.update(b"\0")
+    except CompilationError as e:
+        raise CompilationError(f"Error getting command string in function {path_to_str(mcfunc.path())}.") from e
+
+    return fingerprint.hexdigest()
 
 
 class Datapack(Namespace):
@@ -19,20 +215,20 @@ class Datapack(Namespace):
         self.description = description
         self.pack_format = pack_format
 
+        self.report: BuildReport | None = None
+
     def path(self):
         return []
 
-    def export(self) -> beet.DataPack:
-        all_mcfuncs = self.get_all_mcfunctions()
+    def output_path(self) -> str:
+        return os.path.join(self.path_, self.name)
 
-        out = beet.DataPack(
-            name=self.name,
-            path=os.path.join(self.path_, self.name),
-            zipped=False,
-            description=self.description,
-            pack_format=self.pack_format,
-        )
+    def fingerprints_path(self) -> str:
+        """The fingerprints of incremental builds are stored next to the pack, not inside it."""
+        return os.path.join(self.path_, f"{self.name}.fingerprints.json")
 
+    def resolve_unique_strings(self,
+                               all_mcfuncs: dict[tuple[str, ...], MCFunction]) -> dict[UniqueString, str]:
         # set the namespace of all unique strings
         for mcfunc in all_mcfuncs.values():
             for command in mcfunc.commands:
@@ -40,18 +236,28 @@ class Datapack(Namespace):
                     if unique_string.namespace is None:
                         unique_string.namespace = mcfunc
 
-        # resolve all unique strings
-        def path_of_func(pathable: Pathable) -> str:
-            return ("#" if isinstance(pathable, FunctionTag) else "") + path_to_str(pathable.path())
+        # temps share the players of their registers
+        registers = allocate_registers(all_mcfuncs)
+        register_strings: dict[int, UniqueScoreboardPlayer] = {}
+        register_namespace = Namespace(self.name)
 
+        # resolve all unique strings
         unique_strings: dict[UniqueString, str] = {}
-        existing_strings: set[str] = set()
+        allocator = UniqueStringAllocator()
 
         # noinspection PyShadowingNames
         def resolve(unique_string: UniqueString) -> str:
             if unique_string not in unique_strings:
-                unique_strings[unique_string] = unique_string.get(existing_strings, resolve, path_of_func)
-                existing_strings.add(unique_strings[unique_string])
+                if unique_string in registers:
+                    register = registers[unique_string]
+                    if register not in register_strings:
+                        register_strings[register] = UniqueScoreboardPlayer(f"r{register}", register_namespace)
+
+                    unique_strings[unique_string] = resolve(register_strings[register])
+                    return unique_strings[unique_string]
+
+                unique_strings[unique_string] = unique_string.get(allocator, resolve, path_of_func)
+                allocator.add(unique_strings[unique_string])
 
             return unique_strings[unique_string]
 
@@ -60,71 +266,257 @@ class Datapack(Namespace):
                 for unique_string in command.get_unique_strings():
                     resolve(unique_string)
 
-        _max_name_len = max(len(s.__class__.__name__) for s in unique_strings)
-        _max_args_len = max(len(repr(s.value)) for s in unique_strings)
-
-        for unique_string, string in unique_strings.items():
-            if isinstance(unique_string, NonUniqueString):
-                continue
-
-            print(f" * {unique_string.__class__.__name__: <{_max_name_len}} "
-                  f"{unique_string.value!r: <{_max_args_len}} "
-                  f"-> {string!r}")
-
-        def get_mcfunc_content(commands: list[Command],
-                               strings: dict["UniqueString", str]) -> list[str]:
-            return [cmd.get_str(path_of_func, strings) for cmd in commands]
-
-        for path, mcfunc in all_mcfuncs.items():
-            print(f"-> {path_to_str(path)}")
-
-            tags = [path_to_str(tag.path()) if isinstance(tag, FunctionTag) else tag for tag in mcfunc.tags]
-
-            handles_comment = []
-            if tags:
-                handles_comment += [
-                    LiteralCommand("#"),
-                    LiteralCommand("# @handles"),
-                    *[LiteralCommand(f"#   #{handler}") for handler in tags]
-                ]
-
-            description_comment = []
-            if mcfunc.description:
-                description_comment += [
-                    LiteralCommand("#"),
-                    *[LiteralCommand(f"# {paragraph}") for paragraph in mcfunc.description.splitlines()]
-                ]
-
-            commands = [
-                LiteralCommand(f"#> {path_to_str(path)}"),
-                *description_comment,
-                *handles_comment,
-                *mcfunc.commands,
-            ]
-            if mcfunc.continuation:
-                commands += [
-                    Comment("Continuation:"),
-                    FunctionCall(mcfunc.continuation)
-                ]
-            else:
-                commands += [
-                    Comment("No continuation.")
-                ]
-
-            try:
-                content = get_mcfunc_content(commands, unique_strings)
-            except CompilationError as e:
-                raise CompilationError(f"Error getting command string in function {path_to_str(mcfunc.path())}.") from e
-
-            # noinspection PyTypeChecker
-            out[path_to_str(path)] = beet.Function(content, tags=tags)
-
-        # set replace=false in all function tags
-        for tag in out.function_tags.values():
-            tag.data["replace"] = False
+        return unique_strings
+
+    def export(self, workers: int | None = None, verbose: bool = False, optimize: int = 0) -> beet.DataPack:
+        """Export the datapack to a beet.DataPack. With workers > 1, the mcfunctions are rendered in parallel.
+
+        optimize is the level of the peephole optimizer passes that are run on every mcfunction, see optimize.py.
+        0 disables them. From level 1 on, continuations are inlined and chains of empty mcfunctions are skipped.
+
+        The BuildReport of the export is stored in self.report. With verbose=True, it is also printed.
+        """
+
+        self.report = report = BuildReport(self.name)
+
+        with report.phase("collect"):
+            all_mcfuncs = self.get_all_mcfunctions()
+
+            for link_pass in LINK_PASSES:
+                all_mcfuncs = link_pass(all_mcfuncs)
+
+            if optimize:
+                # before the registers are allocated, so the temps that are no longer needed don't take any
+                all_mcfuncs = lower_conditions(all_mcfuncs)
+
+        with report.phase("resolve"):
+            unique_strings = self.resolve_unique_strings(all_mcfuncs)
+            report.add_names(unique_strings)
+
+        if optimize:
+            with report.phase("collect"):
+                all_mcfuncs = inline_mcfunctions(all_mcfuncs)
+
+        out = beet.DataPack(
+            name=self.name,
+            path=self.output_path(),
+            zipped=False,
+            description=self.description,
+            pack_format=self.pack_format,
+        )
+
+        contents = report.timed("render", render_mcfunctions(list(all_mcfuncs.items()), unique_strings, workers,
+                                                          optimize))
+
+        for (path, mcfunc), content in zip(all_mcfuncs.items(), contents):
+            with report.phase("write"):
+                report.add_function(path_to_str(path), content)
+
+                # noinspection PyTypeChecker
+                out[path_to_str(path)] = beet.Function(content, tags=get_mcfunc_tags(mcfunc))
+
+        with report.phase("write"):
+            # set replace=false in all function tags
+            for tag in out.function_tags.values():
+                tag.data["replace"] = False
+
+        self.finish_report(verbose)
 
         return out
 
+    def write_metadata(self, origin: str | zipfile.ZipFile, function_tags: dict[str, list[str]]):
+        """Write the function tags and the pack.mcmeta."""
+
+        for tag, values in function_tags.items():
+            dump_file(origin, function_tag_file_path(tag), beet.FunctionTag({"values": values, "replace": False}))
+
+        dump_file(origin, "pack.mcmeta", beet.JsonFile({
+            "pack": {"description": self.description, "pack_format": self.pack_format}
+        }))
+
+    def write(self,
+              incremental: bool = False,
+              zipped: bool = False,
+              workers: int | None = None,
+              verbose: bool = False,
+              optimize: int = 0) -> BuildReport:
+        """Write the datapack to disk and return the BuildReport of the build.
+
+        Unlike export(), this streams the mcfunctions to disk one at a time, so the whole pack is never held in
+        memory. With zipped=True, the pack is written to a zip file instead of a directory.
+
+        With incremental=True, only mcfunctions whose fingerprint changed since the last incremental write are
+        rendered and written. The result is byte-identical to a full export. Without valid fingerprints of a previous
+        incremental write, the pack is written from scratch.
+
+        optimize works like in export().
+        """
+
+        assert not (incremental and zipped), "Incremental writes are not supported for zipped datapacks."
+
+        self.report = report = BuildReport(self.name)
+
+        with report.phase("collect"):
+            all_mcfuncs = self.get_all_mcfunctions()
+
+            for link_pass in LINK_PASSES:
+                all_mcfuncs = link_pass(all_mcfuncs)
+
+            if optimize:
+                # before the registers are allocated, so the temps that are no longer needed don't take any
+                all_mcfuncs = lower_conditions(all_mcfuncs)
+
+        with report.phase("resolve"):
+            unique_strings = self.resolve_unique_strings(all_mcfuncs)
+            report.add_names(unique_strings)
+
+        if optimize:
+            with report.phase("collect"):
+                all_mcfuncs = inline_mcfunctions(all_mcfuncs)
+
+        if incremental:
+            self._write_incremental(all_mcfuncs, unique_strings, report, workers, optimize)
+        else:
+            self._write_full(all_mcfuncs, unique_strings, report, zipped, workers, optimize)
+
+        self.finish_report(verbose)
+
+        return report
+
+    def finish_report(self, verbose: bool):
+        # all warnings issued since the last build belong to this one
+        self.report.warnings = warning_buffer.drain()
+
+        if verbose:
+            self.report.print()
+
+        if self.report.warnings:
+            sys.stderr.write(format_warning_summary(self.report.warnings))
+
+    def _write_full(self,
+                    all_mcfuncs: dict[tuple[str, ...], MCFunction],
+                    unique_strings: dict[UniqueString, str],
+                    report: BuildReport,
+                    zipped: bool,
+                    workers: int | None,
+                    optimize: int):
+        output_path = self.output_path() + (".zip" if zipped else "")
+
+        remove_output(output_path)
+
+        # the stored fingerprints don't describe the files on disk anymore
+        if os.path.isfile(self.fingerprints_path()):
+            os.remove(self.fingerprints_path())
+
+        if zipped:
+            os.makedirs(self.path_, exist_ok=True)
+            origin = zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            os.makedirs(output_path, exist_ok=True)
+            origin = contextlib.nullcontext(output_path)
+
+        jobs = list(all_mcfuncs.items())
+        function_tags: dict[str, list[str]] = {}
+
+        with origin as origin:
+            contents = report.timed("render", render_mcfunctions(jobs, unique_strings, workers, optimize))
+
+            for (path, mcfunc), content in zip(jobs, contents):
+                with report.phase("write"):
+                    for tag in get_mcfunc_tags(mcfunc):
+                        function_tags.setdefault(tag, []).append(path_to_str(path))
+
+                    dump_file(origin, function_file_path(path), beet.Function(content))
+                    report.add_function(path_to_str(path), content)
+                    report.written.append(path_to_str(path))
+
+            with report.phase("write"):
+                self.write_metadata(origin, function_tags)
+
+    def _write_incremental(self,
+                           all_mcfuncs: dict[tuple[str, ...], MCFunction],
+                           unique_strings: dict[UniqueString, str],
+                           report: BuildReport,
+                           workers: int | None,
+                           optimize: int):
+        output_path = self.output_path()
+
+        try:
+            with open(self.fingerprints_path(), "r", encoding="utf-8") as f:
+                old_fingerprints = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            old_fingerprints = {}
+
+        if old_fingerprints.get("version") != FINGERPRINT_VERSION:
+            old_fingerprints = {}
+
+        if not old_fingerprints:
+            # nothing tells which files on disk are stale, so start over like a full write
+            remove_output(output_path)
+
+        # file path -> {"fingerprint": ..., "commands": ..., "size": ...}
+        old_functions: dict[str, dict[str, typing.Any]] = old_fingerprints.get("functions", {})
+        new_functions: dict[str, dict[str, typing.Any]] = {}
+        function_tags: dict[str, list[str]] = {}
+        changed: list[tuple[Path, MCFunction]] = []
+
+        with report.phase("render"):
+            for path, mcfunc in all_mcfuncs.items():
+                file_path = function_file_path(path)
+
+                for tag in get_mcfunc_tags(mcfunc):
+                    function_tags.setdefault(tag, []).append(path_to_str(path))
+
+                fingerprint = get_mcfunc_fingerprint(path, mcfunc, unique_strings, optimize)
+                old_function = old_functions.get(file_path, {})
+
+                if (old_function.get("fingerprint") == fingerprint
+                        and os.path.isfile(os.path.join(output_path, file_path))):
+                    # unchanged functions are not rendered again, take their stats from the last build
+                    new_functions[file_path] = old_function
+                    report.functions[path_to_str(path)] = FunctionReport(
+                        path_to_str(path), old_function["commands"], old_function["size"]
+                    )
+                    continue
+
+                new_functions[file_path] = {"fingerprint": fingerprint}
+                changed.append((path, mcfunc))
+
+        contents = report.timed("render", render_mcfunctions(changed, unique_strings, workers, optimize))
+
+        for (path, mcfunc), content in zip(changed, contents):
+            with report.phase("write"):
+                file_path = function_file_path(path)
+                dump_file(output_path, file_path, beet.Function(content))
+
+                report.add_function(path_to_str(path), content)
+                report.written.append(path_to_str(path))
+                new_functions[file_path] |= report.functions[path_to_str(path)].to_dict()
+
+        # keep the report in the order of the mcfunctions
+        report.functions = {path_to_str(path): report.functions[path_to_str(path)] for path in all_mcfuncs}
+
+        with report.phase("write"):
+            # remove mcfunctions that don't exist anymore
+            for file_path in old_functions.keys() - new_functions.keys():
+                if os.path.isfile(os.path.join(output_path, file_path)):
+                    os.remove(os.path.join(output_path, file_path))
+
+            # function tags and pack.mcmeta are cheap, always rewrite them
+            old_tags: list[str] = old_fingerprints.get("function_tags", [])
+            for tag in old_tags:
+                if tag not in function_tags and os.path.isfile(os.path.join(output_path, function_tag_file_path(tag))):
+                    os.remove(os.path.join(output_path, function_tag_file_path(tag)))
+
+            self.write_metadata(output_path, function_tags)
+
+            with open(self.fingerprints_path(), "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": FINGERPRINT_VERSION,
+                    "functions": new_functions,
+                    "function_tags": sorted(function_tags),
+                }, f, indent=2)
+
 
 path_of_func_callable = typing.Callable[[Pathable], str]
 resolve_callable = typing.Callable[[UniqueString | str], str]
@@ -44,6 +44,11 @@ class LongType(WholeNumberType, ConcreteDataType):
     dtype = "long"
 
 
+class ObjectType(IntType):
+    """The id of a std object. Scores and object attributes of this type hold a reference to the object, which keeps
+    it from being garbage collected."""
+
+
 class FloatingPointType(NumberType):
     """A floating point number."""
 
@@ -111,6 +116,29 @@ class Expression(Generic):
     def __repr__(self):
         raise NotImplementedError
 
+    # arithmetic builds an ArithmeticExpression, which is compiled when it is assigned, see arithmetic.py
+    def __add__(self, other): return ArithmeticExpression.create("+", self, other)
+
+    def __radd__(self, other): return ArithmeticExpression.create("+", other, self)
+
+    def __sub__(self, other): return ArithmeticExpression.create("-", self, other)
+
+    def __rsub__(self, other): return ArithmeticExpression.create("-", other, self)
+
+    def __mul__(self, other): return ArithmeticExpression.create("*", self, other)
+
+    def __rmul__(self, other): return ArithmeticExpression.create("*", other, self)
+
+    def __floordiv__(self, other): return ArithmeticExpression.create("//", self, other)
+
+    def __rfloordiv__(self, other): return ArithmeticExpression.create("//", other, self)
+
+    def __mod__(self, other): return ArithmeticExpression.create("%", self, other)
+
+    def __rmod__(self, other): return ArithmeticExpression.create("%", other, self)
+
+    def __neg__(self): return ArithmeticExpression.create("-", 0, self)
+
 
 # noinspection PyAbstractClass
 class Variable(Expression):
@@ -138,6 +166,38 @@ class ConstInt(ConstExpr[WholeNumberType]):
         super().__init__(str(value))
 
 
+class ArithmeticExpression(Expression[WholeNumberType]):
+    """An integer operation on two expressions, with the semantics of scoreboard players operation: // and % round
+    towards negative infinity, min and max are the < and > operations."""
+
+    operators = ("+", "-", "*", "//", "%", "min", "max")
+
+    def __init__(self, operator: str, left: Expression, right: Expression):
+        assert operator in self.operators, f"Unknown operator {operator!r}."
+
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+    @classmethod
+    def create(cls, operator: str, left: "Expression | int", right: "Expression | int") -> "ArithmeticExpression":
+        left, right = (ConstInt(operand) if isinstance(operand, int) else operand for operand in (left, right))
+
+        if not isinstance(left, Expression) or not isinstance(right, Expression):
+            return NotImplemented
+
+        return cls(operator, left, right)
+
+    def to_tellraw(self,
+                   curr_text_kwargs: dict[str, typing.Any],
+                   resolve: typing.Callable[["UniqueString | str"], str]
+                   ) -> tuple[list[str], list["tellraw.TextComponent"]]:
+        raise CompilationError(f"Cannot print {self!r}, assign it to a variable first.")
+
+    def __repr__(self):
+        return f"({self.left!r} {self.operator} {self.right!r})"
+
+
 class ScoreboardVar(Variable[WholeNumberType]):
     def __init__(self, player: "str | UniqueString", objective: "str | UniqueString"):
         self.player = player
@@ -2,7 +2,15 @@ from .namespace import Namespace, FunctionTag, MCFunction
 from .command import *
 from . import conversion as conv
 from .expression import *
-from .condition import Condition, ScoreConditionMatches
+from .condition import Condition, ScoreCondition, ScoreConditionMatches
+from . import arithmetic
+from .exception import CompilationError
+from .paths import path_to_str
+
+# a loop that is lowered as a tree calls itself again after this many iterations, see Loop
+LOOP_ITERATIONS = 2 ** 10
+# constant ranges up to this many iterations are fully unrolled by default, see ForLoop
+FOR_MAX_UNROLLED = 16
 
 
 class Function(Namespace):
@@ -25,6 +33,12 @@ class Function(Namespace):
         self.current_mcfunction = self.entry_point
 
         self.was_ended = False
+        # whether return_ or c_yield was called, and the branches and loops created in this function, see may_return
+        self.returns = False
+        self.yields = False
+        self.branches: list[Function] = []
+        # whether tools.call_function called this function, which rules out yield points
+        self.called = False
 
         self.init()
 
@@ -44,114 +58,491 @@ class Function(Namespace):
     def comment(self, *args, **kwargs):
         self.add_command(Comment(*args, **kwargs))
 
-    def c_if(self, condition: "Condition") -> "Function":
+    def c_if(self, condition: "Condition") -> "FunctionWithElse":
         if_name = f"if{len(self.children)}"
 
-        if_function = self.create_function(
+        if_function = FunctionWithElse(
             if_name,
             entry_point_name="branch",
             description=f"If-branch of {self.name}",
         )
+        self.add(if_function)
+        self.branches.append(if_function)
 
         continuation_mcfunc = self.create_mcfunction(f"{if_name}-continue")
 
-        cond_temp_var = self.get_unique_scoreboard_var("_cond")
+        cond_temp_var = if_function.get_temp_scoreboard_var("_cond")
         is_true_cond = ScoreConditionMatches(cond_temp_var, "1")
 
         is_true_cond_string, is_true_cond_u_strings = is_true_cond.to_str()
         cond_string, cond_u_strings = condition.to_str()
+
+        mcfunc = self.current_mcfunction
+        else_call = ComposedCommand(
+            LiteralCommand(f"execute unless {is_true_cond_string} run", *is_true_cond_u_strings),
+            FunctionCall(continuation_mcfunc)
+        )
         self.add_command(
-            # store condition result in (global!) temp var, recursion is prohibited!
-            conv.const_to_score(ConstInt(0), cond_temp_var),
-            ComposedCommand(
-                LiteralCommand(f"execute if {cond_string} run", *cond_u_strings),
-                conv.const_to_score(ConstInt(1), cond_temp_var)
-            ),
+            # store condition result in a temp var, the branch may change what the condition depends on
+            ConditionStore(tuple(cond_temp_var), cond_string, cond_u_strings, condition.get_score_inputs()),
 
             # if cond is true, call if_function
             ComposedCommand(
                 LiteralCommand(f"execute if {is_true_cond_string} run", *is_true_cond_u_strings),
                 FunctionCall(if_function.entry_point)
             ),
-            # else just call the continuation
-            ComposedCommand(
-                LiteralCommand(f"execute unless {is_true_cond_string} run", *is_true_cond_u_strings),
-                FunctionCall(continuation_mcfunc)
-            )
+            # else call the else-branch or just the continuation
+            else_call
         )
 
         if_function.continuation = self.current_mcfunction = continuation_mcfunc
+        if_function.else_call = mcfunc, else_call
 
         return if_function
 
-    def c_while(self, condition: "Condition") -> "Function":
+    def c_while(self, condition: "Condition", *, unroll: int = 4, iterations_per_tick: int | None = None) -> "Loop":
+        """Loop while condition holds, see Loop for how the loop is lowered.
+
+        unroll is the number of iterations that one mcfunction of the loop runs. With iterations_per_tick, the loop
+        runs at most that many iterations per tick and resumes in the next tick. The code after a resumed loop runs
+        without the executor and position of the function, see ScheduleFunction.
+        """
+
+        assert unroll >= 1 and (iterations_per_tick is None or iterations_per_tick >= 1)
+
         while_name = f"while{len(self.children)}"
-        while_function = self.create_function(
+        while_function = Loop(
             while_name,
-            entry_point_name="loop",
+            condition,
+            unroll,
+            iterations_per_tick,
+            entry_point_name="body",
             description=f"While-loop of {self.name}",
         )
+        self.add(while_function)
+        self.branches.append(while_function)
+
+        while_function.start = self.current_mcfunction
+        while_function.after = self.current_mcfunction = self.create_mcfunction(f"{while_name}-continue")
+
+        return while_function
+
+    def end(self):
+        if self.was_ended:
+            return
 
-        iteration_number = self.get_unique_scoreboard_var("_iteration_number")
-        while_function.add_command(
-            *conv.add_in_place(iteration_number, ConstInt(1))
+        self.current_mcfunction.continuation = self.continuation
+        self.was_ended = True
+
+    def c_for(self, var: ScoreboardVar, start: "Expression | int | range", stop: "Expression | int | None" = None,
+              step: int = 1, *, unroll: int = 4, max_unrolled: int = FOR_MAX_UNROLLED) -> "ForLoop":
+        """Loop var over range(start, stop, step), or over start if it is a range. stop is evaluated once, before the
+        loop. The body must not change var.
+
+        If start and stop are constant, the loop is fully unrolled up to max_unrolled iterations. Otherwise, it is
+        lowered like c_while, and unroll means the same.
+        """
+
+        if isinstance(start, range):
+            assert stop is None and step == 1, "Pass either a range or start, stop and step."
+            start, stop, step = start.start, start.stop, start.step
+
+        assert step != 0 and unroll >= 1
+
+        start = ConstInt(start) if isinstance(start, int) else start
+        stop = ConstInt(stop) if isinstance(stop, int) else stop
+
+        for_name = f"for{len(self.children)}"
+        for_function = ForLoop(
+            for_name,
+            var,
+            start,
+            stop,
+            step,
+            unroll,
+            max_unrolled,
+            entry_point_name="body",
+            description=f"For-loop of {self.name}",
         )
+        self.add(for_function)
+        self.branches.append(for_function)
+
+        for_function.start = self.current_mcfunction
+        for_function.after = self.current_mcfunction = self.create_mcfunction(f"{for_name}-continue")
 
-        check_cond_mcfunc = while_function.create_mcfunction(f"check-cond")
+        return for_function
 
-        continuation_mcfunc = self.create_mcfunction(f"{while_name}-continue")
+    def c_for_each_entity(self, tag: UniqueTag | str) -> "ForEachEntity":
+        """Run the body as and at each entity with tag, using a single execute. The body can't return."""
 
-        cond_str, ustr = condition.to_str()
-        check_cond_mcfunc.add_command(
+        for_each_function = ForEachEntity(
+            f"for_each{len(self.children)}",
+            entry_point_name="body",
+            description=f"For-each-entity-loop of {self.name}",
+        )
+        self.add(for_each_function)
+        self.branches.append(for_each_function)
+
+        self.add_command(
             ComposedCommand(
-                LiteralCommand(f"execute if {cond_str} run", *ustr),
-                FunctionCall(while_function.entry_point)
+                LiteralCommand("execute as @e[tag=%s] at @s run", tag),
+                FunctionCall(for_each_function.entry_point)
             )
         )
-        check_cond_mcfunc.add_command(
-            *conv.add_in_place(iteration_number, ConstInt(-1))
+
+        return for_each_function
+
+    def return_(self, var: "Expression | None" = None):
+        if var:
+            from .lib.std import STD_RET
+
+            self.add_command(
+                *conv.var_to_var(var, STD_RET)
+            )
+
+        self.continuation = None
+        self.returns = True
+
+    def may_return(self) -> bool:
+        """Whether a return_ or c_yield in this function or one of its branches may end the call of its entry point
+        before the rest of it ran."""
+
+        return self.returns or self.yields or any(branch.may_return() for branch in self.branches)
+
+    def may_yield(self) -> bool:
+        return self.yields or any(branch.may_yield() for branch in self.branches)
+
+    def c_yield(self, cost: int | None = None):
+        """Yield point of a job of the scheduler, see lib/scheduler.py. If the budget of commands of this tick is used
+        up, the rest of the function runs in a later tick.
+
+        A function with yield points must only be run as a job, as a caller would continue right after the first
+        suspension. tools.call_function raises a CompilationError for it.
+
+        cost is the number of commands run since the previous yield point. By default, it is estimated as the number
+        of commands added to the current mcfunction since then, which doesn't include calls and loops.
+        """
+
+        from .lib.scheduler import std_scheduler_yield
+
+        # the function a branch belongs to
+        function = self
+        while isinstance(function.parent, Function) and function in function.parent.branches:
+            function = function.parent
+
+        if function.called:
+            raise CompilationError(f"Function {path_to_str(function.path())} was called with tools.call_function, so "
+                                   f"it can't have yield points. Run it as a job with std_scheduler_spawn instead.")
+
+        if cost is None:
+            cost = sum(not isinstance(command, Comment) for command in self.current_mcfunction.commands)
+
+        resume = self.create_mcfunction(f"yield{len(self.children)}")
+        self.add_command(*std_scheduler_yield(resume, cost))
+
+        self.current_mcfunction = resume
+        self.yields = True
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.end()
+
+
+class FunctionWithElse(Function):
+    """The branch of an if, see Function.c_if."""
+
+    else_: Function | None = None
+    # the command of the parent function that calls the continuation if the condition is false
+    else_call: tuple[MCFunction, Command]
+
+    def c_else(self) -> Function:
+        assert self.else_ is None, "An if can only have one else-branch."
+
+        parent: Function = self.parent
+        mcfunc, else_call = self.else_call
+
+        self.else_ = parent.create_function(
+            f"{self.name}-else",
+            entry_point_name="branch",
+            description=f"Else-branch of {parent.name}",
         )
+        # the continuation of the if, even if the if-branch returns
+        self.else_.continuation = else_call.commands[1].function
+        parent.branches.append(self.else_)
 
-        is_first_iteration_cond = ScoreConditionMatches(iteration_number, "0")
-        is_first_iteration_cond_str, is_first_iteration_cond_ustr = is_first_iteration_cond.to_str()
-        check_cond_mcfunc.add_command(
-            ComposedCommand(
-                LiteralCommand(f"execute unless {cond_str} if {is_first_iteration_cond_str} run",
-                               *ustr, *is_first_iteration_cond_ustr),
-                FunctionCall(continuation_mcfunc)
+        new_else_call = ComposedCommand(else_call.commands[0], FunctionCall(self.else_.entry_point))
+        mcfunc.commands[next(i for i, command in enumerate(mcfunc.commands) if command is else_call)] = new_else_call
+        self.else_call = mcfunc, new_else_call
+
+        return self.else_
+
+    def c_elif(self, condition: "Condition") -> "FunctionWithElse":
+        """Shorthand for an if in the else-branch."""
+
+        else_ = self.c_else()
+        elif_ = else_.c_if(condition)
+        else_.end()
+
+        return elif_
+
+
+class Loop(Function):
+    """The body of a while-loop, see Function.c_while. The loop is lowered when the body ends, because that depends
+    on whether the body may return. Neither way adds commands to the body.
+
+    If the body can't return, it is called from a tree of mcfunctions. Level j of the tree runs up to unroll ** j
+    iterations by calling level j - 1 unroll times, checking the condition before each call but the first. The loop
+    calls level 0 (the body), 1, 2, ... in turn and calls itself again after the level that runs LOOP_ITERATIONS
+    iterations. So an iteration costs about one check, and the depth of the calls grows logarithmically. With
+    iterations_per_tick, a step that runs once per tick calls a chunk of levels that add up to that many iterations
+    and schedules itself.
+
+    If the body may return, a return must also skip the rest of the loop, so the body continues with a step that
+    checks the condition and calls the body again. Because every iteration goes one call deeper, the step stores
+    the condition first and resets it when the calls return, so that only the last step continues after the loop.
+    With iterations_per_tick, the step counts the iterations and schedules itself once there were enough.
+    """
+
+    # start is the mcfunction that enters the loop, after is the one that continues after it
+    start: MCFunction
+    after: MCFunction
+
+    def __init__(self,
+                 name: str,
+                 condition: "Condition | None",
+                 unroll: int,
+                 iterations_per_tick: int | None,
+                 **kwargs):
+        super().__init__(name, **kwargs)
+
+        self.condition = condition
+        self.unroll = unroll
+        self.iterations_per_tick = iterations_per_tick
+
+        self._levels: dict[int, MCFunction] = {0: self.entry_point}
+
+    def call_if_condition(self, mcfunc: MCFunction) -> Command:
+        cond_string, cond_u_strings = self.condition.to_str()
+
+        return ComposedCommand(
+            LiteralCommand(f"execute if {cond_string} run", *cond_u_strings),
+            FunctionCall(mcfunc)
+        )
+
+    def call_while_condition(self, mcfunc: MCFunction, times: int) -> list[Command]:
+        """Call mcfunc times times, but only while the condition holds. It is known to hold at the start."""
+
+        return [FunctionCall(mcfunc), *(self.call_if_condition(mcfunc) for _ in range(times - 1))]
+
+    def get_level(self, level: int) -> MCFunction:
+        if level not in self._levels:
+            mcfunc = self._levels[level] = self.create_mcfunction(f"level{level}")
+            mcfunc.add_command(*self.call_while_condition(self.get_level(level - 1), self.unroll))
+
+        return self._levels[level]
+
+    def lower_as_tree(self):
+        if self.iterations_per_tick is None:
+            loop = self.create_mcfunction("loop")
+            loop.add_command(FunctionCall(self.get_level(0)))
+
+            level = 0
+            while self.unroll > 1 and self.unroll ** level < LOOP_ITERATIONS:
+                level += 1
+                loop.add_command(self.call_if_condition(self.get_level(level)))
+
+            loop.add_command(self.call_if_condition(loop))
+
+            self.start.add_command(
+                self.call_if_condition(loop),
+                FunctionCall(self.after)
             )
+            return
+
+        # the levels that add up to iterations_per_tick, largest first
+        if self.unroll == 1:
+            levels = [0] * self.iterations_per_tick
+        else:
+            levels = []
+            iterations, level = self.iterations_per_tick, 0
+            while iterations:
+                iterations, digit = divmod(iterations, self.unroll)
+                levels = [level] * digit + levels
+                level += 1
+
+        chunk = self.create_mcfunction("chunk")
+        chunk.add_command(FunctionCall(self.get_level(levels[0])))
+        chunk.add_command(*(self.call_if_condition(self.get_level(level)) for level in levels[1:]))
+
+        step = self.create_mcfunction("step")
+        cond_temp_var = self.get_temp_scoreboard_var("_cond")
+
+        step.add_command(
+            *self.store_condition(cond_temp_var),
+            *self.if_score_matches(cond_temp_var, "1", FunctionCall(chunk), ScheduleFunction(step)),
+            *self.if_score_matches(cond_temp_var, "0", FunctionCall(self.after)),
         )
 
-        self.add_command(
-            *conv.var_to_var(ConstInt(0), iteration_number),
-            FunctionCall(check_cond_mcfunc)
+        self.start.add_command(FunctionCall(step))
+
+    def lower_as_steps(self):
+        step = self.create_mcfunction("step")
+        cond_temp_var = self.get_temp_scoreboard_var("_cond")
+
+        step.add_command(*self.store_condition(cond_temp_var))
+
+        if self.iterations_per_tick is not None:
+            iterations = self.get_unique_scoreboard_var("_iterations")
+
+            resume = self.create_mcfunction("resume")
+            resume.add_command(
+                *conv.var_to_var(ConstInt(0), iterations),
+                FunctionCall(step)
+            )
+
+            step.add_command(
+                # 2 means the loop continues in the next tick
+                *self.if_score_matches(cond_temp_var, "1", *conv.add_in_place(iterations, ConstInt(1))),
+                *self.if_score_matches(iterations, f"{self.iterations_per_tick + 1}..",
+                                       *conv.var_to_var(ConstInt(2), cond_temp_var)),
+                *self.if_score_matches(cond_temp_var, "2", ScheduleFunction(resume)),
+            )
+
+            self.start.add_command(*conv.var_to_var(ConstInt(0), iterations))
+
+        step.add_command(
+            *self.if_score_matches(cond_temp_var, "1", FunctionCall(self.entry_point)),
+            *self.if_score_matches(cond_temp_var, "0", FunctionCall(self.after)),
+            # the steps this one called have run the rest, the ones that called it must not do it again
+            *conv.var_to_var(ConstInt(1), cond_temp_var),
         )
 
-        while_function.continuation = check_cond_mcfunc
-        self.current_mcfunction = continuation_mcfunc
+        if not self.returns:
+            self.continuation = step
 
-        return while_function
+        self.start.add_command(FunctionCall(step))
+
+    def store_condition(self, var: ScoreboardVar) -> list[Command]:
+        cond_string, cond_u_strings = self.condition.to_str()
+
+        return [
+            ScoreAssignment(f"execute store success score %s %s if {cond_string}", *var, *cond_u_strings,
+                            dst=tuple(var))
+        ]
+
+    @staticmethod
+    def if_score_matches(var: ScoreboardVar, value: str, *commands: Command) -> list[Command]:
+        cond_string, cond_u_strings = ScoreConditionMatches(var, value).to_str()
+
+        return [
+            ComposedCommand(
+                LiteralCommand(f"execute if {cond_string} run", *cond_u_strings),
+                command
+            )
+            for command in commands
+        ]
+
+    def lower(self):
+        if self.may_return():
+            self.lower_as_steps()
+        else:
+            self.lower_as_tree()
 
     def end(self):
         if self.was_ended:
             return
 
-        self.current_mcfunction.continuation = self.continuation
-        self.was_ended = True
+        self.lower()
+        super().end()
 
-    def return_(self, var: "Expression | None" = None):
-        if var:
-            from .lib.std import STD_RET
 
-            self.add_command(
-                *conv.var_to_var(var, STD_RET)
+class ForLoop(Loop):
+    """The body of a for-loop, see Function.c_for.
+
+    var is set to start, and step is added after every iteration. Instead of the body, level 0 of the tree of a Loop
+    (see there) is an mcfunction that runs the body and increments var, so var is the first value past the range
+    after the loop. If the range is constant, a level-0 mcfunction runs unroll iterations without checking the
+    condition, and ranges up to max_unrolled iterations are fully unrolled into the function that runs the loop.
+    """
+
+    def __init__(self, name: str, var: ScoreboardVar, start: "Expression", stop: "Expression", step: int,
+                 unroll: int, max_unrolled: int, **kwargs):
+        super().__init__(name, None, unroll, None, **kwargs)
+
+        self.var = var
+        self.start_value = start
+        self.stop_value = stop
+        self.step = step
+        self.max_unrolled = max_unrolled
+
+        self.range: range | None = None
+        start_constant = arithmetic.get_constant(arithmetic.fold(start))
+        stop_constant = arithmetic.get_constant(arithmetic.fold(stop))
+
+        if start_constant is not None and stop_constant is not None:
+            self.range = range(start_constant, stop_constant, step)
+
+        # the stop value is evaluated once before the loop, so the condition only compares var with it
+        if stop_constant is not None:
+            self.stop_var = None
+            self.condition = ScoreConditionMatches(
+                var, f"..{stop_constant - 1}" if step > 0 else f"{stop_constant + 1}.."
             )
+        else:
+            self.stop_var = self.get_unique_scoreboard_var("_stop", var.objective)
+            self.condition = ScoreCondition(var, "<" if step > 0 else ">", self.stop_var)
 
-        self.continuation = None
+    def get_increment(self) -> list[Command]:
+        return conv.add_in_place(self.var, ConstInt(self.step))
 
-    def __exit__(self, exc_type, exc_value, tb):
-        self.end()
+    def lower(self):
+        # like range(), stop is evaluated before start is assigned
+        if self.stop_var is not None:
+            self.start.add_command(*conv.var_to_var(self.stop_value, self.stop_var))
 
+        self.start.add_command(*conv.var_to_var(self.start_value, self.var))
 
-class FunctionWithElse(Function):
-    else_: Function
+        if self.range is not None and not self.may_return():
+            self.lower_unrolled()
+            return
+
+        if self.may_return():
+            self.lower_as_steps()
+
+            if self.continuation is not None:
+                increment = self.create_mcfunction("next")
+                increment.add_command(*self.get_increment())
+                increment.continuation = self.continuation
+                self.continuation = increment
+        else:
+            self._levels[0] = self.create_mcfunction("iteration")
+            self._levels[0].add_command(FunctionCall(self.entry_point), *self.get_increment())
+            self.lower_as_tree()
+
+    def lower_unrolled(self):
+        iterations = len(self.range)
+        remainder = iterations if iterations <= self.max_unrolled else iterations % self.unroll
+
+        for _ in range(remainder):
+            self.start.add_command(FunctionCall(self.entry_point), *self.get_increment())
+
+        if remainder == iterations:
+            self.start.add_command(FunctionCall(self.after))
+            return
+
+        # the rest of the iterations is a multiple of unroll, so they can run unroll at a time
+        self._levels[0] = self.create_mcfunction("iterations")
+        for _ in range(self.unroll):
+            self._levels[0].add_command(FunctionCall(self.entry_point), *self.get_increment())
+
+        last = self.range[-1]
+        self.condition = ScoreConditionMatches(self.var, f"..{last}" if self.step > 0 else f"{last}..")
+        self.lower_as_tree()
+
+
+class ForEachEntity(Function):
+    """The body of a for-each-entity loop, see Function.c_for_each_entity."""
+
+    def end(self):
+        assert not self.may_return(), "Can't return or yield in the body of a for-each-entity loop."
+
+        super().end()
@@ -2,6 +2,9 @@ import typing
 
 T = typing.TypeVar("T")
 
+# (generic class, generic arguments) -> subscripted class
+_subscriptions: dict[tuple[type, tuple], type] = {}
+
 
 class GenericMetaclass(type):
 
@@ -13,6 +16,19 @@ class GenericMetaclass(type):
         if not isinstance(item, tuple):
             item = item,
 
+        # subscriptions are interned, so that Generic[X] is Generic[X]
+        try:
+            return _subscriptions[self, item]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable generic arguments can't be cached
+            return self._subscribe(item)
+
+        _subscriptions[self, item] = out = self._subscribe(item)
+        return out
+
+    def _subscribe(self: T, item: tuple) -> T:
         # return a new class with the given generic arguments saved and a subclass of self
         return type(self.__name__, (self,), {"__generic_args__": item, "__base_class__": self})
 
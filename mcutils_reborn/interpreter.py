@@ -0,0 +1,1250 @@
+"""Offline interpreter for the subset of mcfunction commands this library emits.
+
+It runs an exported beet.DataPack (or a Datapack, which is exported first) without a Minecraft server and counts
+what the code does at runtime:
+
+    interpreter = Interpreter.from_datapack(datapack)
+    interpreter.load()
+    stats = interpreter.run("my_namespace:my_function")
+    print(stats.commands, stats.max_chain_length, stats.entities)
+
+Supported commands:
+ * scoreboard objectives add/remove, scoreboard players set/add/remove/reset/get/operation
+ * execute as/at/positioned/if/unless (score, entity, data)/store (score, storage, entity)/run
+ * data get/modify (set, append, prepend, insert, merge with value or from)/remove/merge on storage and entity NBT
+ * tag, summon, kill, tp
+ * function (including function tags), schedule function/clear
+ * tellraw and say, which are collected in Interpreter.output
+ * gamerule maxCommandChainLength
+
+Entities live in a simple table and have a type, tags, a position and NBT. Selectors support the arguments tag, type,
+limit, sort and scores. Every @e selector counts all entities as scanned. There are no players, so @a and @p select
+nothing. Unlike Minecraft, NBT lists are not type-checked.
+"""
+
+import copy
+import functools
+import json
+import math
+import re
+import sys
+import typing
+
+import beet
+import nbtlib
+
+from .exception import InterpreterError
+
+Nbt = typing.Union[dict, list, nbtlib.tag.Base]
+Holder = typing.Union[str, "Entity"]
+NbtPath = tuple[str | int | None, ...]
+
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+class CommandFailed(Exception):
+    """A command failed at runtime. Minecraft reports this in chat and carries on with the next command."""
+
+
+class _ChainLimitReached(Exception):
+    pass
+
+
+def int32(value: int) -> int:
+    return (value - INT_MIN) % 2 ** 32 + INT_MIN
+
+
+def tokenize(line: str) -> list[str]:
+    """Split a command at spaces that are not inside brackets, braces or quotes."""
+
+    tokens, current = [], []
+    depth, quote, escaped = 0, None, False
+
+    for char in line:
+        if quote is not None:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == quote:
+                quote = None
+
+        elif char in "\"'":
+            quote = char
+
+        elif char in "[{":
+            depth += 1
+
+        elif char in "]}":
+            depth -= 1
+
+        elif char.isspace() and depth == 0:
+            if current:
+                tokens.append("".join(current))
+                current = []
+
+            continue
+
+        current.append(char)
+
+    if current:
+        tokens.append("".join(current))
+
+    return tokens
+
+
+def split_top_level(string: str, separator: str = ",") -> list[str]:
+    out, current, depth, quote = [], [], 0, None
+
+    for char in string:
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+        elif char == separator and depth == 0:
+            out.append("".join(current).strip())
+            current = []
+            continue
+
+        current.append(char)
+
+    if "".join(current).strip():
+        out.append("".join(current).strip())
+
+    return out
+
+
+def parse_range(string: str) -> tuple[float, float]:
+    if ".." not in string:
+        return int(string), int(string)
+
+    low, high = string.split("..")
+    return int(low) if low else -math.inf, int(high) if high else math.inf
+
+
+def parse_resource_location(string: str) -> str:
+    return string if ":" in string else f"minecraft:{string}"
+
+
+# NBT values are dicts (compounds), lists and the scalar tags of nbtlib
+
+def from_nbtlib(tag: nbtlib.tag.Base) -> Nbt:
+    if isinstance(tag, dict):
+        return {key: from_nbtlib(value) for key, value in tag.items()}
+
+    if isinstance(tag, (list, nbtlib.tag.Array)):
+        return [from_nbtlib(value) for value in tag]
+
+    return tag
+
+
+def parse_snbt(string: str) -> Nbt:
+    try:
+        return from_nbtlib(nbtlib.parse_nbt(string))
+    except Exception as e:
+        raise InterpreterError(f"Invalid SNBT {string!r}.") from e
+
+
+def to_snbt(value: Nbt) -> str:
+    if isinstance(value, dict):
+        return "{" + ", ".join(f"{nbtlib.tag.String(key).snbt() if not re.fullmatch(r'[a-zA-Z0-9_.+-]+', key) else key}"
+                               f": {to_snbt(item)}" for key, item in value.items()) + "}"
+
+    if isinstance(value, list):
+        return "[" + ", ".join(to_snbt(item) for item in value) + "]"
+
+    return value.snbt()
+
+
+def nbt_number(value: Nbt) -> float:
+    """The value of an NBT tag as returned by data get: numbers are returned as is, everything else by length."""
+
+    if isinstance(value, nbtlib.tag.String):
+        return len(value)
+
+    if isinstance(value, (dict, list)):
+        return len(value)
+
+    return value
+
+
+def nbt_cast(dtype: str, value: float) -> nbtlib.tag.Base:
+    """Convert the scaled result of a command to an NBT number like execute store does."""
+
+    if dtype in ("float", "double"):
+        return nbtlib.Float(value) if dtype == "float" else nbtlib.Double(value)
+
+    bits = {"byte": 8, "short": 16, "int": 32, "long": 64}[dtype]
+    value = (int(value) + 2 ** (bits - 1)) % 2 ** bits - 2 ** (bits - 1)
+    return {"byte": nbtlib.Byte, "short": nbtlib.Short, "int": nbtlib.Int, "long": nbtlib.Long}[dtype](value)
+
+
+_PATH_KEY = re.compile(r"[^.\[\]\"{}]+")
+_PATH_QUOTED_KEY = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+@functools.lru_cache(maxsize=None)
+def parse_nbt_path(path: str) -> NbtPath:
+    """Parse an NBT path into keys (str), list indices (int) and [] (None). Compound filters are not supported."""
+
+    nodes, i = [], 0
+
+    while i < len(path):
+        if path[i] == ".":
+            i += 1
+
+        elif path[i] == "[":
+            end = path.index("]", i)
+            index = path[i + 1:end].strip()
+            if index.startswith("{"):
+                raise InterpreterError(f"Compound filters in NBT path {path!r} are not supported.")
+
+            nodes.append(int(index) if index else None)
+            i = end + 1
+
+        elif path[i] == '"':
+            match = _PATH_QUOTED_KEY.match(path, i)
+            nodes.append(re.sub(r"\\(.)", r"\1", match.group(1)))
+            i = match.end()
+
+        elif path[i] == "{":
+            raise InterpreterError(f"Compound filters in NBT path {path!r} are not supported.")
+
+        else:
+            match = _PATH_KEY.match(path, i)
+            nodes.append(match.group())
+            i = match.end()
+
+    return tuple(nodes)
+
+
+def nbt_locate(root: dict, nodes: NbtPath, create: bool = False) -> list[tuple[dict | list, str | int]]:
+    """Return the (container, key) pairs a path points to. With create, missing compounds on the way are created."""
+
+    containers: list = [root]
+    out = []
+
+    for n, node in enumerate(nodes):
+        last = n == len(nodes) - 1
+        next_containers = []
+
+        for container in containers:
+            if isinstance(node, str):
+                if not isinstance(container, dict):
+                    continue
+
+                if last:
+                    out.append((container, node))
+                    continue
+
+                if node not in container:
+                    if not create:
+                        continue
+
+                    container[node] = {} if isinstance(nodes[n + 1], str) else []
+
+                next_containers.append(container[node])
+
+            elif isinstance(container, list):
+                if node is None:
+                    indices = range(len(container))
+                elif -len(container) <= node < len(container):
+                    indices = [node % len(container)]
+                else:
+                    indices = []
+
+                for i in indices:
+                    if last:
+                        out.append((container, i))
+                    else:
+                        next_containers.append(container[i])
+
+        containers = next_containers
+
+    return out
+
+
+def nbt_get(root: dict, nodes: NbtPath) -> list[Nbt]:
+    if not nodes:
+        return [root]
+
+    return [
+        container[key]
+        for container, key in nbt_locate(root, nodes)
+        if not isinstance(container, dict) or key in container
+    ]
+
+
+def nbt_merge(dst: dict, src: dict):
+    for key, value in src.items():
+        if isinstance(value, dict) and isinstance(dst.get(key), dict):
+            nbt_merge(dst[key], value)
+        else:
+            dst[key] = copy.deepcopy(value)
+
+
+class Entity:
+    def __init__(self, uuid: int, type_: str, position: tuple[float, float, float], nbt: dict):
+        self.uuid = uuid
+        self.type = type_
+        # an ordered set
+        self.tags: dict[str, None] = dict.fromkeys(str(tag) for tag in nbt.pop("Tags", []))
+        self.nbt = nbt
+        self.position = position
+
+    @property
+    def position(self) -> tuple[float, float, float]:
+        # noinspection PyTypeChecker
+        return tuple(float(coordinate) for coordinate in self.nbt["Pos"])
+
+    @position.setter
+    def position(self, position: tuple[float, float, float]):
+        self.nbt["Pos"] = [nbtlib.Double(coordinate) for coordinate in position]
+
+    def get_nbt(self) -> dict:
+        """The NBT of the entity, including its tags. Call set_nbt after modifying it."""
+
+        self.nbt["Tags"] = [nbtlib.String(tag) for tag in self.tags]
+        return self.nbt
+
+    def set_nbt(self):
+        self.tags = dict.fromkeys(str(tag) for tag in self.nbt.pop("Tags", []))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.uuid}, {self.type!r}, tags={list(self.tags)!r})"
+
+
+class Selector:
+    _SUPPORTED_ARGUMENTS = {"tag", "type", "limit", "sort", "scores"}
+
+    def __init__(self, string: str):
+        self.string = string
+        self.kind = string[1]
+
+        # (tag, negated)
+        self.tags: list[tuple[str, bool]] = []
+        self.types: list[tuple[str, bool]] = []
+        self.scores: dict[str, tuple[float, float]] = {}
+        self.limit: int | None = 1 if self.kind in "spr" else None
+
+        if self.kind not in "epasr":
+            raise InterpreterError(f"Invalid selector {string!r}.")
+
+        arguments = string[3:-1] if len(string) > 2 else ""
+        if len(string) > 2 and not (string[2] == "[" and string[-1] == "]"):
+            raise InterpreterError(f"Invalid selector {string!r}.")
+
+        for argument in split_top_level(arguments):
+            key, value = (part.strip() for part in argument.split("=", 1))
+
+            if key not in self._SUPPORTED_ARGUMENTS:
+                raise InterpreterError(f"Selector argument {key!r} of {string!r} is not supported.")
+
+            negated = value.startswith("!")
+            value = value.removeprefix("!")
+
+            if key == "tag":
+                self.tags.append((value, negated))
+            elif key == "type":
+                self.types.append((parse_resource_location(value), negated))
+            elif key == "limit":
+                self.limit = int(value)
+            elif key == "scores":
+                for score in split_top_level(value[1:-1]):
+                    objective, range_ = (part.strip() for part in score.split("=", 1))
+                    self.scores[objective] = parse_range(range_)
+
+    def matches(self, entity: Entity, interpreter: "Interpreter") -> bool:
+        for tag, negated in self.tags:
+            # tag= matches entities without any tags
+            has_tag = tag in entity.tags if tag else not entity.tags
+            if has_tag == negated:
+                return False
+
+        for type_, negated in self.types:
+            if (entity.type == type_) == negated:
+                return False
+
+        for objective, (low, high) in self.scores.items():
+            score = interpreter.scores.get(objective, {}).get(entity)
+            if score is None or not low <= score <= high:
+                return False
+
+        return True
+
+    def select(self, interpreter: "Interpreter", context: "Context") -> list[Entity]:
+        if self.kind in "ap":
+            # there are no players
+            return []
+
+        if self.kind == "s":
+            candidates = [] if context.executor is None else [context.executor]
+        else:
+            candidates = interpreter.entities.values()
+            interpreter.count_scan(len(candidates))
+
+        out = [entity for entity in candidates if self.matches(entity, interpreter)]
+        return out if self.limit is None else out[:self.limit]
+
+
+class Context:
+    def __init__(self, executor: Entity | None = None, position: tuple[float, float, float] = (0., 0., 0.)):
+        self.executor = executor
+        self.position = position
+
+
+class _Frame:
+    """A function that is running: its commands, the index of the next one and the context it runs in."""
+
+    def __init__(self, function: str, commands: list[list[str]], context: Context):
+        self.function = function
+        self.commands = commands
+        self.index = 0
+        self.context = context
+
+
+class RunStats:
+    """What running an entry function cost at runtime."""
+
+    def __init__(self, entry: str):
+        self.entry = entry
+        self.runs = 0
+        # executed commands, including function commands and everything the called mcfunctions executed
+        self.commands = 0
+        self.failed_commands = 0
+        self.function_calls = 0
+        # the longest command chain of a single run, see the gamerule maxCommandChainLength
+        self.max_chain_length = 0
+        self.max_depth = 0
+        self.chain_limit_reached = False
+        self.commands_by_name: dict[str, int] = {}
+        self.commands_by_function: dict[str, int] = {}
+        # entities that selectors had to look at, e.g. all entities for every @e
+        self.entities_scanned = 0
+
+        self.summoned = 0
+        self.killed = 0
+        # entities alive after the last run and at most during the runs
+        self.entities = 0
+        self.max_entities = 0
+
+    def merge(self, other: "RunStats"):
+        self.runs += other.runs
+        self.commands += other.commands
+        self.failed_commands += other.failed_commands
+        self.function_calls += other.function_calls
+        self.max_chain_length = max(self.max_chain_length, other.max_chain_length)
+        self.max_depth = max(self.max_depth, other.max_depth)
+        self.chain_limit_reached |= other.chain_limit_reached
+
+        for name, count in other.commands_by_name.items():
+            self.commands_by_name[name] = self.commands_by_name.get(name, 0) + count
+
+        for function, count in other.commands_by_function.items():
+            self.commands_by_function[function] = self.commands_by_function.get(function, 0) + count
+
+        self.entities_scanned += other.entities_scanned
+        self.summoned += other.summoned
+        self.killed += other.killed
+        self.entities = other.entities
+        self.max_entities = max(self.max_entities, other.max_entities)
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "entry": self.entry,
+            "runs": self.runs,
+            "commands": self.commands,
+            "failed_commands": self.failed_commands,
+            "function_calls": self.function_calls,
+            "max_chain_length": self.max_chain_length,
+            "max_depth": self.max_depth,
+            "chain_limit_reached": self.chain_limit_reached,
+            "commands_by_name": self.commands_by_name,
+            "commands_by_function": self.commands_by_function,
+            "entities_scanned": self.entities_scanned,
+            "summoned": self.summoned,
+            "killed": self.killed,
+            "entities": self.entities,
+            "max_entities": self.max_entities,
+        }
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.entry!r}, commands={self.commands}, " \
+               f"max_chain_length={self.max_chain_length}, entities={self.entities})"
+
+
+class Interpreter:
+    def __init__(self, pack: beet.DataPack):
+        self.functions: dict[str, list[str]] = {
+            name: function.text.splitlines() for name, function in pack.functions.items()
+        }
+        self.function_tags: dict[str, list[str]] = {
+            name: [value if isinstance(value, str) else value["id"] for value in tag.data.get("values", [])]
+            for name, tag in pack.function_tags.items()
+        }
+        self._parsed_functions: dict[str, list[list[str]]] = {}
+        self._selectors: dict[str, Selector] = {}
+
+        self.objectives: set[str] = set()
+        self.scores: dict[str, dict[Holder, int]] = {}
+        self.storage: dict[str, dict] = {}
+        self.entities: dict[int, Entity] = {}
+        self.gamerules: dict[str, int] = {"maxCommandChainLength": 65536}
+        self.output: list[str] = []
+
+        self.tick_count = 0
+        # (tick, function)
+        self.scheduled: list[tuple[int, str]] = []
+
+        # accumulated stats of all runs, by entry function
+        self.stats: dict[str, RunStats] = {}
+
+        self._current: RunStats | None = None
+        # the functions that are running, the innermost one last, and the calls queued by the current command
+        self._frames: list[_Frame] = []
+        self._queued: list[_Frame] = []
+        self._next_uuid = 0
+
+        self._commands: dict[str, typing.Callable[[list[str], Context], int]] = {
+            "scoreboard": self._scoreboard,
+            "execute": self._execute,
+            "data": self._data,
+            "tag": self._tag,
+            "summon": self._summon,
+            "kill": self._kill,
+            "tp": self._tp,
+            "teleport": self._tp,
+            "function": self._function,
+            "schedule": self._schedule,
+            "tellraw": self._tellraw,
+            "say": self._say,
+            "gamerule": self._gamerule,
+        }
+
+    @classmethod
+    def from_datapack(cls, datapack: "Datapack", **kwargs) -> "Interpreter":
+        """Export datapack and interpret the result. kwargs are passed to Datapack.export()."""
+
+        return cls(datapack.export(**kwargs))
+
+    # running functions
+
+    def run(self, function: str, executor: Entity | None = None) -> RunStats:
+        """Run a function (or a function tag, prefixed with #) and return the stats of this run."""
+
+        stats = RunStats(function)
+        stats.runs = 1
+
+        previous, self._current = self._current, stats
+        try:
+            self.call(function, Context(executor))
+        except _ChainLimitReached:
+            stats.chain_limit_reached = True
+        finally:
+            self._current = previous
+
+        stats.max_chain_length = stats.commands
+        stats.entities = len(self.entities)
+
+        self.stats.setdefault(function, RunStats(function)).merge(stats)
+        return stats
+
+    def load(self) -> RunStats:
+        return self.run("#minecraft:load")
+
+    def tick(self) -> list[RunStats]:
+        """Advance the game by one tick: run the tick functions and the scheduled functions that are due."""
+
+        self.tick_count += 1
+        out = []
+
+        if "minecraft:tick" in self.function_tags:
+            out.append(self.run("#minecraft:tick"))
+
+        due = [function for tick, function in self.scheduled if tick <= self.tick_count]
+        self.scheduled = [(tick, function) for tick, function in self.scheduled if tick > self.tick_count]
+
+        for function in due:
+            out.append(self.run(function))
+
+        return out
+
+    def get_functions(self, function: str) -> list[str]:
+        """Resolve a function or function tag to the list of functions it calls, in order."""
+
+        if not function.startswith("#"):
+            function = parse_resource_location(function)
+            if function not in self.functions:
+                raise InterpreterError(f"Unknown function {function!r}.")
+
+            return [function]
+
+        tag = parse_resource_location(function[1:])
+        if tag not in self.function_tags:
+            raise InterpreterError(f"Unknown function tag {tag!r}.")
+
+        return [resolved for value in self.function_tags[tag] for resolved in self.get_functions(value)]
+
+    def parse_function(self, function: str) -> list[list[str]]:
+        if function not in self._parsed_functions:
+            self._parsed_functions[function] = [
+                tokenize(line)
+                for line in self.functions[function]
+                if line.strip() and not line.lstrip().startswith("#")
+            ]
+
+        return self._parsed_functions[function]
+
+    def call(self, function: str, context: Context) -> int:
+        """Run function and everything it calls, and return the number of commands of function.
+
+        Like in the game, calls don't nest: the commands of a called function are queued to run right after the
+        command that called it, on an explicit stack. The depth of calls is therefore only limited by the gamerule
+        maxCommandChainLength, not by Python's recursion limit.
+        """
+
+        base = len(self._frames)
+        out = self._queue_call(function, context)
+        stats = self._current
+
+        try:
+            self._push_queued()
+
+            while len(self._frames) > base:
+                frame = self._frames[-1]
+
+                if frame.index >= len(frame.commands):
+                    self._frames.pop()
+                    continue
+
+                if stats.commands >= self.gamerules["maxCommandChainLength"]:
+                    raise _ChainLimitReached
+
+                tokens = frame.commands[frame.index]
+                frame.index += 1
+
+                stats.commands += 1
+                stats.commands_by_function[frame.function] = stats.commands_by_function.get(frame.function, 0) + 1
+
+                try:
+                    self.execute(tokens, frame.context)
+                except CommandFailed:
+                    stats.failed_commands += 1
+
+                self._push_queued()
+        finally:
+            del self._frames[base:]
+            self._queued.clear()
+
+        return out
+
+    def _queue_call(self, function: str, context: Context) -> int:
+        """Queue function to run after the current command, see call."""
+
+        out = 0
+
+        for resolved in self.get_functions(function):
+            commands = self.parse_function(resolved)
+            self._queued.append(_Frame(resolved, commands, context))
+            self._current.function_calls += 1
+            out += len(commands)
+
+        return out
+
+    def _push_queued(self):
+        # a finished function is left before its calls run, so tail calls don't add a level
+        while self._frames and self._frames[-1].index >= len(self._frames[-1].commands):
+            self._frames.pop()
+
+        # the first queued call runs first
+        self._frames.extend(reversed(self._queued))
+        self._queued.clear()
+
+        self._current.max_depth = max(self._current.max_depth, len(self._frames))
+
+    def execute(self, tokens: list[str], context: Context) -> int:
+        """Execute a single command and return its result. Raises CommandFailed if the command fails."""
+
+        name = tokens[0]
+
+        stats = self._current
+        stats.commands_by_name[name] = stats.commands_by_name.get(name, 0) + 1
+
+        try:
+            command = self._commands[name]
+        except KeyError:
+            raise InterpreterError(f"Unsupported command {' '.join(tokens)!r}.") from None
+
+        try:
+            return command(tokens[1:], context)
+        except (IndexError, ValueError) as e:
+            raise InterpreterError(f"Invalid command {' '.join(tokens)!r}.") from e
+
+    # targets
+
+    def count_scan(self, entities: int):
+        if self._current is not None:
+            self._current.entities_scanned += entities
+
+    def select(self, target: str, context: Context) -> list[Entity]:
+        if not target.startswith("@"):
+            # player names and UUIDs, there are no players
+            return []
+
+        if target not in self._selectors:
+            self._selectors[target] = Selector(target)
+
+        return self._selectors[target].select(self, context)
+
+    def get_holders(self, target: str, context: Context, objective: str | None = None) -> list[Holder]:
+        if target == "*":
+            return list(self.scores.get(objective, {})) if objective is not None else []
+
+        if target.startswith("@"):
+            return self.select(target, context)
+
+        return [target]
+
+    def get_objective(self, objective: str) -> dict[Holder, int]:
+        if objective not in self.objectives:
+            raise CommandFailed(f"Unknown scoreboard objective {objective!r}.")
+
+        return self.scores.setdefault(objective, {})
+
+    def get_score(self, holder: Holder, objective: str) -> int:
+        try:
+            return self.get_objective(objective)[holder]
+        except KeyError:
+            raise CommandFailed(f"No score for {holder!r} in {objective!r}.") from None
+
+    def get_nbt_root(self, target_type: str, target: str, context: Context) -> tuple[dict, Entity | None]:
+        if target_type == "storage":
+            return self.storage.setdefault(parse_resource_location(target), {}), None
+
+        if target_type == "entity":
+            entities = self.select(target, context)
+            if len(entities) != 1:
+                raise CommandFailed(f"{target!r} selected {len(entities)} entities instead of one.")
+
+            return entities[0].get_nbt(), entities[0]
+
+        raise InterpreterError(f"NBT target type {target_type!r} is not supported.")
+
+    def resolve_position(self, coordinates: list[str], context: Context) -> tuple[float, float, float]:
+        # noinspection PyTypeChecker
+        return tuple(
+            origin + float(coordinate[1:] or 0) if coordinate.startswith("~") else float(coordinate)
+            for origin, coordinate in zip(context.position, coordinates)
+        )
+
+    # commands
+
+    def _scoreboard(self, args: list[str], context: Context) -> int:
+        if args[0] == "objectives":
+            if args[1] == "add":
+                if args[2] in self.objectives:
+                    raise CommandFailed(f"Objective {args[2]!r} already exists.")
+
+                self.objectives.add(args[2])
+                self.scores[args[2]] = {}
+                return len(self.objectives)
+
+            if args[1] == "remove":
+                self.get_objective(args[2])
+                self.objectives.remove(args[2])
+                del self.scores[args[2]]
+                return len(self.objectives)
+
+            if args[1] in ("setdisplay", "modify"):
+                return 0
+
+            raise InterpreterError(f"Unsupported command 'scoreboard objectives {args[1]}'.")
+
+        if args[0] != "players":
+            raise InterpreterError(f"Unsupported command 'scoreboard {args[0]}'.")
+
+        action = args[1]
+
+        if action == "reset":
+            objectives = [args[3]] if len(args) > 3 else list(self.objectives)
+            for objective in objectives:
+                scores = self.get_objective(objective)
+                for holder in self.get_holders(args[2], context, objective):
+                    scores.pop(holder, None)
+
+            return 0
+
+        scores = self.get_objective(args[3])
+        holders = self.get_holders(args[2], context, args[3])
+        if not holders:
+            raise CommandFailed(f"No score holders found for {args[2]!r}.")
+
+        if action == "get":
+            return self.get_score(holders[0], args[3])
+
+        if action in ("set", "add", "remove"):
+            value = int(args[4])
+
+            for holder in holders:
+                if action == "set":
+                    scores[holder] = int32(value)
+                elif action == "add":
+                    scores[holder] = int32(scores.get(holder, 0) + value)
+                else:
+                    scores[holder] = int32(scores.get(holder, 0) - value)
+
+            return scores[holders[-1]] if len(holders) == 1 else len(holders)
+
+        if action == "operation":
+            operation = args[4]
+            sources = self.get_holders(args[5], context, args[6])
+            source_scores = self.get_objective(args[6])
+            if not sources:
+                raise CommandFailed(f"No score holders found for {args[5]!r}.")
+
+            for holder in holders:
+                for source in sources:
+                    if source not in source_scores:
+                        raise CommandFailed(f"No score for {source!r} in {args[6]!r}.")
+
+                    a, b = scores.get(holder, 0), source_scores[source]
+
+                    if operation == "=":
+                        a = b
+                    elif operation == "+=":
+                        a = a + b
+                    elif operation == "-=":
+                        a = a - b
+                    elif operation == "*=":
+                        a = a * b
+                    elif operation == "/=":
+                        # division by zero leaves the score unchanged
+                        a = a // b if b else a
+                    elif operation == "%=":
+                        a = a % b if b else a
+                    elif operation == "<":
+                        a = min(a, b)
+                    elif operation == ">":
+                        a = max(a, b)
+                    elif operation == "><":
+                        a, source_scores[source] = b, a
+                    else:
+                        raise InterpreterError(f"Unknown scoreboard operation {operation!r}.")
+
+                    scores[holder] = int32(a)
+
+            return scores[holders[-1]] if len(holders) == 1 else len(holders)
+
+        raise InterpreterError(f"Unsupported command 'scoreboard players {action}'.")
+
+    def _check_condition(self, args: list[str], context: Context) -> tuple[int, int]:
+        """Evaluate the condition of execute if/unless. Returns the result and the number of arguments consumed."""
+
+        kind = args[0]
+
+        if kind == "score":
+            holders = self.get_holders(args[1], context, args[2])
+            score = self.get_objective(args[2]).get(holders[0]) if len(holders) == 1 else None
+
+            if args[3] == "matches":
+                low, high = parse_range(args[4])
+                return int(score is not None and low <= score <= high), 5
+
+            sources = self.get_holders(args[4], context, args[5])
+            other = self.get_objective(args[5]).get(sources[0]) if len(sources) == 1 else None
+            if score is None or other is None:
+                return 0, 6
+
+            return int({
+                "<": score < other, "<=": score <= other, "=": score == other, ">=": score >= other, ">": score > other
+            }[args[3]]), 6
+
+        if kind == "entity":
+            return len(self.select(args[1], context)), 2
+
+        if kind == "data":
+            try:
+                root, entity = self.get_nbt_root(args[1], args[2], context)
+            except CommandFailed:
+                return 0, 4
+
+            return len(nbt_get(root, parse_nbt_path(args[3]))), 4
+
+        raise InterpreterError(f"Unsupported condition 'execute if {kind}'.")
+
+    def _store(self, store: tuple[str, list[str]], result: int, success: bool, context: Context):
+        kind, args = store
+        value = result if kind == "result" else int(success)
+
+        if args[0] == "score":
+            scores = self.get_objective(args[2])
+            for holder in self.get_holders(args[1], context, args[2]):
+                scores[holder] = int32(value)
+
+            return
+
+        root, entity = self.get_nbt_root(args[0], args[1], context)
+        nodes = parse_nbt_path(args[2])
+
+        for container, key in nbt_locate(root, nodes, create=True):
+            container[key] = nbt_cast(args[3], value * float(args[4]))
+
+        if entity is not None:
+            entity.set_nbt()
+
+    def _execute(self, args: list[str], context: Context,
+                 stores: tuple[tuple[str, list[str]], ...] = ()) -> int:
+        i = 0
+
+        while i < len(args):
+            subcommand = args[i]
+
+            if subcommand == "run":
+                try:
+                    result, success = self.execute(args[i + 1:], context), True
+                except CommandFailed:
+                    result, success = 0, False
+
+                for store in stores:
+                    self._store(store, result, success, context)
+
+                if not success:
+                    raise CommandFailed("The command after run failed.")
+
+                return result
+
+            if subcommand in ("as", "at"):
+                entities = self.select(args[i + 1], context)
+
+                results = []
+                for entity in entities:
+                    if subcommand == "as":
+                        branch = Context(entity, context.position)
+                    else:
+                        branch = Context(context.executor, entity.position)
+
+                    try:
+                        results.append(self._execute(args[i + 2:], branch, stores))
+                    except CommandFailed:
+                        pass
+
+                if not results:
+                    raise CommandFailed(f"No branch of execute {subcommand} {args[i + 1]} succeeded.")
+
+                return results[0] if len(results) == 1 else len(results)
+
+            if subcommand == "positioned":
+                context = Context(context.executor, self.resolve_position(args[i + 1:i + 4], context))
+                i += 4
+                continue
+
+            if subcommand in ("if", "unless"):
+                result, consumed = self._check_condition(args[i + 1:], context)
+                if subcommand == "unless":
+                    result = int(not result)
+
+                i += 1 + consumed
+
+                if i >= len(args):
+                    # the condition is the last subcommand, its result is the result of the command
+                    for store in stores:
+                        self._store(store, result, bool(result), context)
+
+                    if not result:
+                        raise CommandFailed("The condition of execute failed.")
+
+                    return result
+
+                if not result:
+                    # the branch ends here, without storing anything
+                    raise CommandFailed("The condition of execute failed.")
+
+                continue
+
+            if subcommand == "store":
+                kind, target = args[i + 1], args[i + 2]
+                argument_count = 3 if target == "score" else 5
+                stores += ((kind, args[i + 2:i + 2 + argument_count]),)
+                i += 2 + argument_count
+                continue
+
+            raise InterpreterError(f"Unsupported subcommand 'execute {subcommand}'.")
+
+        raise InterpreterError("Incomplete execute command.")
+
+    def _get_data_source(self, args: list[str], context: Context) -> tuple[list[Nbt], int]:
+        """Parse `value <snbt>` or `from <target> [<path>]`. Returns the values and the number of arguments consumed."""
+
+        if args[0] == "value":
+            return [parse_snbt(" ".join(args[1:]))], len(args)
+
+        if args[0] == "from":
+            root, entity = self.get_nbt_root(args[1], args[2], context)
+            path = args[3] if len(args) > 3 else ""
+            values = nbt_get(root, parse_nbt_path(path))
+            if not values:
+                raise CommandFailed(f"Found no elements matching {path!r}.")
+
+            return values, len(args)
+
+        raise InterpreterError(f"Unsupported data source {args[0]!r}.")
+
+    def _data(self, args: list[str], context: Context) -> int:
+        action = args[0]
+        root, entity = self.get_nbt_root(args[1], args[2], context)
+
+        if action == "get":
+            values = nbt_get(root, parse_nbt_path(args[3] if len(args) > 3 else ""))
+            if len(values) != 1:
+                raise CommandFailed(f"Found {len(values)} elements instead of one.")
+
+            scale = float(args[4]) if len(args) > 4 else 1.
+            return math.floor(nbt_number(values[0]) * scale)
+
+        if action == "merge":
+            value = parse_snbt(" ".join(args[3:]))
+            nbt_merge(root, value)
+            if entity is not None:
+                entity.set_nbt()
+
+            return 1
+
+        nodes = parse_nbt_path(args[3])
+
+        if action == "remove":
+            locations = [
+                (container, key)
+                for container, key in nbt_locate(root, nodes)
+                if not isinstance(container, dict) or key in container
+            ]
+
+            # remove list elements back to front so that the indices stay valid
+            for container, key in sorted(locations, key=lambda location: location[1] if isinstance(
+                    location[1], int) else 0, reverse=True):
+                del container[key]
+
+            if entity is not None:
+                entity.set_nbt()
+
+            if not locations:
+                raise CommandFailed(f"Found no elements matching {args[3]!r}.")
+
+            return len(locations)
+
+        if action != "modify":
+            raise InterpreterError(f"Unsupported command 'data {action}'.")
+
+        mode = args[4]
+        source_args = args[6:] if mode == "insert" else args[5:]
+        values, _ = self._get_data_source(source_args, context)
+
+        changed = 0
+        for container, key in nbt_locate(root, nodes, create=True):
+            if mode == "set":
+                value = copy.deepcopy(values[0])
+                if not isinstance(container, dict) or container.get(key) != value:
+                    changed += 1
+
+                container[key] = value
+                continue
+
+            if isinstance(container, dict) and key not in container:
+                container[key] = {} if mode == "merge" else []
+
+            target = container[key]
+
+            if mode == "merge":
+                if not isinstance(target, dict) or not isinstance(values[0], dict):
+                    raise CommandFailed("Can only merge compounds.")
+
+                nbt_merge(target, values[0])
+                changed += 1
+
+            elif mode in ("append", "prepend", "insert"):
+                if not isinstance(target, list):
+                    raise CommandFailed(f"Can only {mode} to lists.")
+
+                index = {"append": len(target), "prepend": 0}.get(mode) if mode != "insert" else int(args[5])
+                for value in values:
+                    target.insert(index, copy.deepcopy(value))
+                    index += 1
+
+                changed += 1
+
+            else:
+                raise InterpreterError(f"Unsupported command 'data modify ... {mode}'.")
+
+        if entity is not None:
+            entity.set_nbt()
+
+        if not changed:
+            raise CommandFailed("Nothing changed.")
+
+        return changed
+
+    def _tag(self, args: list[str], context: Context) -> int:
+        entities = self.select(args[0], context)
+
+        if args[1] == "list":
+            return sum(len(entity.tags) for entity in entities)
+
+        changed = 0
+        for entity in entities:
+            if args[1] == "add" and args[2] not in entity.tags:
+                entity.tags[args[2]] = None
+                changed += 1
+            elif args[1] == "remove" and args[2] in entity.tags:
+                del entity.tags[args[2]]
+                changed += 1
+
+        if not changed:
+            raise CommandFailed(f"No entity was changed by tag {args[1]} {args[2]}.")
+
+        return changed
+
+    def _summon(self, args: list[str], context: Context) -> int:
+        position = self.resolve_position(args[1:4], context) if len(args) >= 4 else context.position
+        nbt = parse_snbt(" ".join(args[4:])) if len(args) > 4 else {}
+        type_ = parse_resource_location(args[0])
+
+        if type_ == "minecraft:marker":
+            nbt.setdefault("data", {})
+
+        self._next_uuid += 1
+        self.entities[self._next_uuid] = Entity(self._next_uuid, type_, position, nbt)
+
+        stats = self._current
+        stats.summoned += 1
+        stats.max_entities = max(stats.max_entities, len(self.entities))
+
+        return 1
+
+    def _kill(self, args: list[str], context: Context) -> int:
+        entities = self.select(args[0], context) if args else (
+            [] if context.executor is None else [context.executor]
+        )
+
+        if not entities:
+            raise CommandFailed("No entity was found.")
+
+        for entity in entities:
+            del self.entities[entity.uuid]
+
+            # killed entities lose their scores
+            for scores in self.scores.values():
+                scores.pop(entity, None)
+
+        self._current.killed += len(entities)
+        return len(entities)
+
+    def _tp(self, args: list[str], context: Context) -> int:
+        if len(args) == 3:
+            entities = [] if context.executor is None else [context.executor]
+            coordinates = args
+        else:
+            entities = self.select(args[0], context)
+            coordinates = args[1:4]
+
+        if not entities:
+            raise CommandFailed("No entity was found.")
+
+        position = self.resolve_position(coordinates, context)
+        for entity in entities:
+            entity.position = position
+
+        return len(entities)
+
+    def _function(self, args: list[str], context: Context) -> int:
+        return self._queue_call(args[0], context)
+
+    def _schedule(self, args: list[str], context: Context) -> int:
+        if args[0] == "clear":
+            before = len(self.scheduled)
+            self.scheduled = [(tick, function) for tick, function in self.scheduled if function != args[1]]
+            return before - len(self.scheduled)
+
+        if args[0] != "function":
+            raise InterpreterError(f"Unsupported command 'schedule {args[0]}'.")
+
+        function, time = args[1], args[2]
+        ticks = int(float(time[:-1]) * {"t": 1, "s": 20, "d": 24000}[time[-1]]) if time[-1] in "tsd" else int(time)
+        if ticks <= 0:
+            raise CommandFailed("Can't schedule for the current tick.")
+
+        if len(args) <= 3 or args[3] == "replace":
+            self.scheduled = [(tick, scheduled) for tick, scheduled in self.scheduled if scheduled != function]
+
+        self.scheduled.append((self.tick_count + ticks, function))
+        return self.tick_count + ticks
+
+    def _text(self, component: typing.Any, context: Context) -> str:
+        if isinstance(component, str):
+            return component
+
+        if isinstance(component, list):
+            return "".join(self._text(item, context) for item in component)
+
+        out = ""
+        if "text" in component:
+            out += str(component["text"])
+
+        elif "score" in component:
+            holders = self.get_holders(component["score"]["name"], context, component["score"]["objective"])
+            score = self.scores.get(component["score"]["objective"], {}).get(holders[0]) if holders else None
+            out += "" if score is None else str(score)
+
+        elif "nbt" in component:
+            for target_type in ("storage", "entity", "block"):
+                if target_type in component:
+                    try:
+                        root, entity = self.get_nbt_root(target_type, component[target_type], context)
+                    except CommandFailed:
+                        break
+
+                    out += ", ".join(
+                        str(value) if isinstance(value, nbtlib.tag.String) else to_snbt(value)
+                        for value in nbt_get(root, parse_nbt_path(component["nbt"]))
+                    )
+                    break
+
+        elif "selector" in component:
+            out += ", ".join(entity.type.split(":")[-1].capitalize()
+                             for entity in self.select(component["selector"], context))
+
+        out += "".join(self._text(item, context) for item in component.get("extra", []))
+        return out
+
+    def _tellraw(self, args: list[str], context: Context) -> int:
+        self.output.append(self._text(json.loads(" ".join(args[1:])), context))
+        return 1
+
+    def _say(self, args: list[str], context: Context) -> int:
+        self.output.append(" ".join(args))
+        return 1
+
+    def _gamerule(self, args: list[str], context: Context) -> int:
+        if len(args) > 1:
+            value = args[1]
+            self.gamerules[args[0]] = int(value) if value.lstrip("-").isdigit() else int(value == "true")
+
+        return self.gamerules.get(args[0], 0)
+
+    def print_stats(self, file: typing.TextIO = sys.stdout):
+        """Print the accumulated stats of all entry functions."""
+
+        _max_entry_len = max([len("entry"), *(len(entry) for entry in self.stats)])
+
+        print(f"{'entry': <{_max_entry_len}} {'runs': >6} {'commands': >10} {'failed': >8} {'max chain': >10} "
+              f"{'depth': >6} {'scanned': >9} {'entities': >9} {'max ent.': >9}", file=file)
+        for entry, stats in self.stats.items():
+            print(f"{entry: <{_max_entry_len}} {stats.runs: >6} {stats.commands: >10} {stats.failed_commands: >8} "
+                  f"{stats.max_chain_length: >10} {stats.max_depth: >6} {stats.entities_scanned: >9} "
+                  f"{stats.entities: >9} {stats.max_entities: >9}", file=file)
+
+
+from .export import Datapack
@@ -0,0 +1,54 @@
+"""Settings that change how the std library is built. The std library is built once, when mcutils_reborn.lib.std is
+first imported, e.g. by mcutils_reborn.all, and reads them then. So they must be set before:
+
+    from mcutils_reborn.lib import config
+    config.set_object_backend("storage")
+
+    from mcutils_reborn.all import *
+
+This module doesn't import the std library.
+"""
+
+import os
+import typing
+
+# How objects are stored:
+#  * entity: one marker entity per object, found by scanning @e. Attribute access is O(number of entities).
+#  * storage: a heap in data storage, indexed by a dispatch tree over the object ids. Attribute access is
+#    O(log heap_size) commands without any entity scan, but at most heap_size objects can be created.
+ObjectBackend = typing.Literal["entity", "storage"]
+_STD_OBJ_BACKEND: ObjectBackend = os.environ.get("MCUTILS_REBORN_OBJECT_BACKEND", "entity")
+_STD_OBJ_HEAP_SIZE = int(os.environ.get("MCUTILS_REBORN_OBJECT_HEAP_SIZE", 256))
+# children per node of the dispatch tree, more means fewer mcfunctions per lookup but more commands
+_STD_OBJ_HEAP_BRANCHING = int(os.environ.get("MCUTILS_REBORN_OBJECT_HEAP_BRANCHING", 2))
+
+# whether the object library was built, after which the settings can't change
+_STD_OBJ_BUILT = False
+
+
+def set_object_backend(backend: ObjectBackend, heap_size: int = 256, branching: int = 2):
+    """Select how objects are stored, see above. This overrides the environment variables
+    MCUTILS_REBORN_OBJECT_BACKEND, MCUTILS_REBORN_OBJECT_HEAP_SIZE and MCUTILS_REBORN_OBJECT_HEAP_BRANCHING.
+
+    Must be called before the std library is built.
+    """
+
+    global _STD_OBJ_BACKEND, _STD_OBJ_HEAP_SIZE, _STD_OBJ_HEAP_BRANCHING
+
+    assert backend in ("entity", "storage"), f"Unknown object backend {backend!r}."
+    assert heap_size >= 1 and branching >= 2
+    assert not _STD_OBJ_BUILT, \
+        "The std library was already built with another object backend. Call set_object_backend before importing it."
+
+    _STD_OBJ_BACKEND, _STD_OBJ_HEAP_SIZE, _STD_OBJ_HEAP_BRANCHING = backend, heap_size, branching
+
+
+def get_object_backend() -> tuple[ObjectBackend, int, int]:
+    """The backend, heap size and branching the object library is built with. Called once, when it is built."""
+
+    global _STD_OBJ_BUILT
+
+    assert _STD_OBJ_BACKEND in ("entity", "storage"), f"Unknown object backend {_STD_OBJ_BACKEND!r}."
+    _STD_OBJ_BUILT = True
+
+    return _STD_OBJ_BACKEND, _STD_OBJ_HEAP_SIZE, _STD_OBJ_HEAP_BRANCHING
@@ -11,11 +11,9 @@ with std_namespace.create_namespace("debug") as std_debug:
         std_debug_objdump.add_command(
             *tools.print_({"underlined": True}, "All objects:", {"underlined": False, "color": "gray"},
                           " (ID: data, tags)"),
-            *conv.var_to_var(ConstInt(0), std_debug_objdump_obj_id),
         )
 
-        with std_debug_objdump.c_while(ScoreCondition(std_debug_objdump_obj_id, "<", STD_OBJ_ID_COUNTER)) \
-                as std_debug_objdump_loop:
+        with std_debug_objdump.c_for(std_debug_objdump_obj_id, 0, STD_OBJ_ID_COUNTER) as std_debug_objdump_loop:
             std_debug_objdump_loop.add_command(
                 *tools.call_function(
                     std_object_fetch_object,
@@ -26,9 +24,8 @@ with std_namespace.create_namespace("debug") as std_debug:
             std_debug_objdump_loop.add_command(
                 *tools.print_(
                     {"color": "light_purple"}, std_debug_objdump_obj_id, ": ",
-                    {"color": tellraw.UNSET}, NbtVar("entity", STD_OBJ_RET_SEL, path="data"),
-                    {"color": "gray"}, " (", NbtVar("entity", STD_OBJ_RET_SEL, path="Tags"), ")"
+                    {"color": tellraw.UNSET}, std_object_data(),
+                    *([{"color": "gray"}, " (", NbtVar("entity", STD_OBJ_RET_SEL, path="Tags"), ")"]
+                      if STD_OBJ_BACKEND == "entity" else []),
                 ),
-
-                *conv.add_in_place(std_debug_objdump_obj_id, ConstInt(1))
             )
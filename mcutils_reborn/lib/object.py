@@ -1,8 +1,21 @@
+import copy
+import os
+import typing
+
 from .std import *
+from . import config
 from ..command import *
-from ..expression import ConstInt
+from ..exception import CompilationError
+from ..export import register_link_pass
+from ..namespace import MCFunction
+from ..expression import Expression, Variable, ConstInt, NbtVar, ScoreboardVar, DataType, ObjectType
 from .. import conversion as conv
 
+# see config.set_object_backend
+STD_OBJ_BACKEND, STD_OBJ_HEAP_SIZE, STD_OBJ_HEAP_BRANCHING = config.get_object_backend()
+# the number of objects garbage_collect frees per tick at most, the rest is left for the following ticks
+STD_OBJ_GC_OBJECTS_PER_TICK = int(os.environ.get("MCUTILS_REBORN_GC_OBJECTS_PER_TICK", 16))
+
 
 with std_namespace.create_namespace("object") as std_object:
     STD_OBJ_RET_TAG = UniqueTag("object_ret", std_object)
@@ -10,6 +23,45 @@ with std_namespace.create_namespace("object") as std_object:
     STD_OBJ_ID_OBJECTIVE = UniqueScoreboardObjective("id", std_object)
     STD_OBJ_ID_COUNTER = std_object.get_unique_scoreboard_var("obj_id_counter")
 
+    # the heap of the storage backend: the object with id i is heap.o<i>, the fetched object is ret
+    STD_OBJ_HEAP = PathString(std_object)
+    _STD_OBJ_HEAP_ID = std_object.get_unique_scoreboard_var("heap_id")
+    # 0: copy heap.o<heap_id> to ret, 1: copy ret to heap.o<heap_id>
+    _STD_OBJ_HEAP_STORE = std_object.get_unique_scoreboard_var("heap_store")
+    # the ids of freed objects are kept in the list free, to be reused
+    _STD_OBJ_NEW_ID = std_object.get_unique_scoreboard_var("new_id")
+
+
+    def std_object_data(dtype: typing.Type[DataType] = DataType, path: str = "") -> NbtVar:
+        """The data of the object that was last fetched with fetch_object, or one of its attributes."""
+
+        if STD_OBJ_BACKEND == "storage":
+            return NbtVar[dtype]("storage", STD_OBJ_HEAP, "ret" + (f".{path}" if path else ""))
+
+        return NbtVar[dtype]("entity", STD_OBJ_RET_SEL, "data" + (f".{path}" if path else ""))
+
+
+    def std_object_fetch(obj: Expression) -> list[Command]:
+        """Fetch the object with the id obj, see fetch_object."""
+
+        # not tools.call_function, which would pin an object of type ObjectType while it is fetched
+        return [
+            Comment("calling function %s with STD_ARG", PathString(std_object_fetch_object)),
+            *conv.var_to_var(obj, STD_ARG),
+            FetchObject(std_object_fetch_object.entry_point, tuple(obj) if isinstance(obj, ScoreboardVar) else None),
+        ]
+
+
+    def std_object_write_back() -> list[Command]:
+        """Write modifications of std_object_data() back to the object. The object must still be the fetched one."""
+
+        if STD_OBJ_BACKEND == "storage":
+            *commands, call = tools.call_function(std_object_store_object)
+            return [*commands, StoreObject(call.function)]
+
+        # the entity backend modifies the object in place
+        return []
+
     with std_object.create_function("load", tags={STD_LOAD_TAG}) as load:
         load.add_command(
             Comment("create the object id objective"),
@@ -18,35 +70,92 @@ with std_namespace.create_namespace("object") as std_object:
             Comment("initialize the object id counter"),
             *conv.var_to_var(ConstInt(0), STD_OBJ_ID_COUNTER),
 
+            *([
+                Comment("clear the object heap"),
+                LiteralCommand("data modify storage %s heap set value {}", STD_OBJ_HEAP),
+                LiteralCommand("data modify storage %s free set value []", STD_OBJ_HEAP),
+            ] if STD_OBJ_BACKEND == "storage" else []),
+
             *tools.log("mcutils_reborn", " * Loaded object library!"),
         )
 
+    if STD_OBJ_BACKEND == "storage":
+        with std_object.create_namespace("heap") as std_object_heap:
+            std_object_heap_root = tools.dispatch_tree(
+                std_object_heap, _STD_OBJ_HEAP_ID, 1, STD_OBJ_HEAP_SIZE,
+                lambda i: [
+                    LiteralCommand(f"execute if score %s %s matches 0 run "
+                                   f"data modify storage %s ret set from storage %s heap.o{i}",
+                                   *_STD_OBJ_HEAP_STORE, STD_OBJ_HEAP, STD_OBJ_HEAP),
+                    LiteralCommand(f"execute if score %s %s matches 1 run "
+                                   f"data modify storage %s heap.o{i} set from storage %s ret",
+                                   *_STD_OBJ_HEAP_STORE, STD_OBJ_HEAP, STD_OBJ_HEAP),
+                ],
+                branching=STD_OBJ_HEAP_BRANCHING
+            )
+
     with std_object.create_class("object") as std_object_object:
         STD_OBJ_TAG = UniqueTag("object", std_object_object)
         _STD_OBJ_TEMP_TAG = UniqueTag("temp", std_object_object)
 
         with std_object_object.create_function("__new__") as std_object_object_new:
             std_object_object_new.describe(
-                "Create a new object and return its object id."
+                "Create a new object and return its object id, or 0 if the storage backend's heap is full. Store "
+                "the id in a var of type ObjectType, e.g. with tools.create_object, otherwise the object is never "
+                "garbage collected."
             )
 
-            std_object_object_new.add_command(
-                *tools.tag_remove_all(_STD_OBJ_TEMP_TAG),
-                *tools.tag_remove_all(STD_OBJ_RET_TAG),
+            if STD_OBJ_BACKEND == "storage":
+                heap_full = LiteralCommand(f"execute if score %s %s matches {STD_OBJ_HEAP_SIZE + 1}.. run",
+                                           *_STD_OBJ_NEW_ID)
 
-                Comment("increment the object id counter"),
-                LiteralCommand('scoreboard players add %s %s 1', *STD_OBJ_ID_COUNTER),
+                std_object_object_new.add_command(
+                    Comment("reuse the id of a freed object, new_id is 0 if there is none"),
+                    LiteralCommand("execute store result score %s %s run data get storage %s free[0]",
+                                   *_STD_OBJ_NEW_ID, STD_OBJ_HEAP),
+                    LiteralCommand("data remove storage %s free[0]", STD_OBJ_HEAP),
 
-                Comment("summon a marker with the temp tag"),
-                LiteralCommand('summon minecraft:marker 0 0 0 {Tags:["%s", "%s", "%s", "%s"]}',
-                               STD_TAG, STD_OBJ_TAG, _STD_OBJ_TEMP_TAG, STD_OBJ_RET_TAG),
+                    Comment("otherwise increment the object id counter"),
+                    LiteralCommand("execute if score %s %s matches 0 run scoreboard players add %s %s 1",
+                                   *_STD_OBJ_NEW_ID, *STD_OBJ_ID_COUNTER),
+                    LiteralCommand("execute if score %s %s matches 0 run scoreboard players operation %s %s = %s %s",
+                                   *_STD_OBJ_NEW_ID, *_STD_OBJ_NEW_ID, *STD_OBJ_ID_COUNTER),
 
-                Comment("set the object id of the marker"),
-                LiteralCommand('scoreboard players operation @e[tag=%s] %s = %s %s',
-                               _STD_OBJ_TEMP_TAG, STD_OBJ_ID_OBJECTIVE, *STD_OBJ_ID_COUNTER),
-            )
+                    Comment("if the heap is full, return 0, which is no object"),
+                    ComposedCommand(
+                        heap_full,
+                        SayCommand(f"!! object heap is full, it can hold {STD_OBJ_HEAP_SIZE} objects !!"),
+                    ),
+                    ComposedCommand(heap_full, LiteralCommand("scoreboard players remove %s %s 1",
+                                                              *STD_OBJ_ID_COUNTER)),
+                    ComposedCommand(heap_full, LiteralCommand("scoreboard players set %s %s 0", *_STD_OBJ_NEW_ID)),
+
+                    Comment("store an empty object at the new id, nothing is stored for 0"),
+                    LiteralCommand("data modify storage %s ret set value {}", STD_OBJ_HEAP),
+                    *conv.var_to_var(_STD_OBJ_NEW_ID, _STD_OBJ_HEAP_ID),
+                    *conv.var_to_var(ConstInt(1), _STD_OBJ_HEAP_STORE),
+                    FunctionCall(std_object_heap_root),
+                )
+
+                std_object_object_new.return_(_STD_OBJ_NEW_ID)
+            else:
+                std_object_object_new.add_command(
+                    *tools.tag_remove_all(_STD_OBJ_TEMP_TAG),
+                    *tools.tag_remove_all(STD_OBJ_RET_TAG),
 
-            std_object_object_new.return_(STD_OBJ_ID_COUNTER)
+                    Comment("increment the object id counter"),
+                    LiteralCommand('scoreboard players add %s %s 1', *STD_OBJ_ID_COUNTER),
+
+                    Comment("summon a marker with the temp tag"),
+                    LiteralCommand('summon minecraft:marker 0 0 0 {Tags:["%s", "%s", "%s", "%s"]}',
+                                   STD_TAG, STD_OBJ_TAG, _STD_OBJ_TEMP_TAG, STD_OBJ_RET_TAG),
+
+                    Comment("set the object id of the marker"),
+                    LiteralCommand('scoreboard players operation @e[tag=%s] %s = %s %s',
+                                   _STD_OBJ_TEMP_TAG, STD_OBJ_ID_OBJECTIVE, *STD_OBJ_ID_COUNTER),
+                )
+
+                std_object_object_new.return_(STD_OBJ_ID_COUNTER)
 
         with std_object_object.create_function("__init__", args=("self",)) as std_object_object_init:
             std_object_object_init.describe(
@@ -54,50 +163,378 @@ with std_namespace.create_namespace("object") as std_object:
             )
 
     with std_object.create_function("fetch_object", args=()) as std_object_fetch_object:
-        std_object_fetch_object.describe(
-            """Assign the object with the given id a tag."""
-        )
-        std_object_fetch_object.add_command(
-            *tools.tag_remove_all(STD_OBJ_RET_TAG),
+        if STD_OBJ_BACKEND == "storage":
+            std_object_fetch_object.describe(
+                """Copy the object with the given id to the ret slot of the heap."""
+            )
+            std_object_fetch_object.add_command(
+                Comment("clear ret, in case there is no object with the id"),
+                LiteralCommand("data remove storage %s ret", STD_OBJ_HEAP),
 
-            Comment("give the selected entity the tag"),
-            LiteralCommand("execute as @e[tag=%s] if score @s %s = %s %s run tag @s add %s",
-                           STD_OBJ_TAG, STD_OBJ_ID_OBJECTIVE, *STD_ARG, STD_OBJ_RET_TAG),
-        )
+                *conv.var_to_var(STD_ARG, _STD_OBJ_HEAP_ID),
+                *conv.var_to_var(ConstInt(0), _STD_OBJ_HEAP_STORE),
+                FunctionCall(std_object_heap_root),
+            )
+        else:
+            std_object_fetch_object.describe(
+                """Assign the object with the given id a tag."""
+            )
+            std_object_fetch_object.add_command(
+                *tools.tag_remove_all(STD_OBJ_RET_TAG),
+
+                Comment("give the selected entity the tag"),
+                LiteralCommand("execute as @e[tag=%s] if score @s %s = %s %s run tag @s add %s",
+                               STD_OBJ_TAG, STD_OBJ_ID_OBJECTIVE, *STD_ARG, STD_OBJ_RET_TAG),
+            )
+
+    if STD_OBJ_BACKEND == "storage":
+        with std_object.create_function("store_object", args=()) as std_object_store_object:
+            std_object_store_object.describe(
+                """Copy the ret slot of the heap back to the object that was fetched last."""
+            )
+            std_object_store_object.add_command(
+                *conv.var_to_var(ConstInt(1), _STD_OBJ_HEAP_STORE),
+                FunctionCall(std_object_heap_root),
+            )
 
+    # Reference counting: scores and object attributes of type ObjectType hold a reference to the object whose id they
+    # hold, see std_object_assign. Once the last reference is dropped, the object is queued and garbage_collect frees
+    # it in a later tick, releasing the references it holds in turn. Objects that were never referenced aren't freed,
+    # nor are objects that reference each other in a cycle.
     with std_object.create_namespace("garbage_collection") as std_object_garbage_collection:
         STD_OBJ_REF_COUNT_OBJECTIVE = UniqueScoreboardObjective("reference_count", std_object_garbage_collection)
+        # garbage: the ids of the queued objects (storage backend), pinned: see std_object_pin
+        STD_OBJ_GC_STORAGE = PathString(std_object_garbage_collection)
+        # the id of the object whose reference count is changed
+        _STD_OBJ_GC_REF = std_object_garbage_collection.get_unique_scoreboard_var("ref")
+        _STD_OBJ_GC_ID = std_object_garbage_collection.get_unique_scoreboard_var("id")
+        # the objects garbage_collect may still free in this tick
+        _STD_OBJ_GC_LEFT = std_object_garbage_collection.get_unique_scoreboard_var("left")
+        # the entity backend tags queued objects
+        _STD_OBJ_GC_TAG = UniqueTag("garbage", std_object_garbage_collection)
 
-        with std_object_garbage_collection.create_function("increment_reference_count", args=("obj_id",)) \
-                as std_object_garbage_collection_increment_reference_count:
-            std_object_garbage_collection_increment_reference_count.describe(
-                "Increment the reference count of an object."
-            )
+        # the storage backend keeps the reference count of the object with id i in the fake player #o<i>, and adds
+        # this while the object is queued, so that it is queued only once
+        _STD_OBJ_GC_QUEUED = 2 ** 30
+        _STD_OBJ_GC_DELTA = std_object_garbage_collection.get_unique_scoreboard_var("delta")
+        _STD_OBJ_GC_COUNT = std_object_garbage_collection.get_unique_scoreboard_var("count")
 
-            std_object_garbage_collection_increment_reference_count.add_command(
-                SayCommand("!! HIT increment_reference_count STUB !!")
-            )
+        with std_object_garbage_collection.create_function("load", tags={STD_LOAD_TAG}) as load:
+            load.add_command(
+                Comment("create the reference count objective"),
+                LiteralCommand("scoreboard objectives add %s dummy", STD_OBJ_REF_COUNT_OBJECTIVE),
+                LiteralCommand("scoreboard players reset * %s", STD_OBJ_REF_COUNT_OBJECTIVE),
 
-        with std_object_garbage_collection.create_function("decrement_reference_count", args=("obj_id",)) \
-                as std_object_garbage_collection_decrement_reference_count:
-            std_object_garbage_collection_decrement_reference_count.describe(
-                "Decrement the reference count of an object."
+                LiteralCommand("data modify storage %s garbage set value []", STD_OBJ_GC_STORAGE),
+                LiteralCommand("data modify storage %s pinned set value []", STD_OBJ_GC_STORAGE),
             )
 
-            std_object_garbage_collection_decrement_reference_count.add_command(
-                SayCommand("!! HIT decrement_reference_count STUB !!")
-            )
+        if STD_OBJ_BACKEND == "storage":
+            with std_object_garbage_collection.create_namespace("counts") as std_object_garbage_collection_counts:
+                std_object_garbage_collection_counts_root = tools.dispatch_tree(
+                    std_object_garbage_collection_counts, _STD_OBJ_GC_REF, 1, STD_OBJ_HEAP_SIZE,
+                    lambda i: [
+                        LiteralCommand(f"scoreboard players operation #o{i} %s += %s %s",
+                                       STD_OBJ_REF_COUNT_OBJECTIVE, *_STD_OBJ_GC_DELTA),
+                        LiteralCommand(f"scoreboard players operation %s %s = #o{i} %s",
+                                       *_STD_OBJ_GC_COUNT, STD_OBJ_REF_COUNT_OBJECTIVE),
+                    ],
+                    branching=STD_OBJ_HEAP_BRANCHING
+                )
+
+
+        def _std_object_add_to_count(delta: int) -> list[Command]:
+            """Add delta to the reference count of the object ref and copy the result to count."""
+
+            return [
+                *conv.var_to_var(ConstInt(delta), _STD_OBJ_GC_DELTA),
+                FunctionCall(std_object_garbage_collection_counts_root),
+            ]
+
+
+        def _std_object_if_ref(command: Command) -> Command:
+            # object ids start at 1, 0 is no object
+            return ComposedCommand(LiteralCommand("execute if score %s %s matches 1.. run", *_STD_OBJ_GC_REF), command)
+
 
         with std_object_garbage_collection.create_function("garbage_collect") as std_object_garbage_collect:
             std_object_garbage_collect.describe(
-                "Run the garbage collector."
+                f"Free up to {STD_OBJ_GC_OBJECTS_PER_TICK} queued objects and run again in the next tick if there are "
+                "more."
+            )
+
+            # decrement and increment the reference counts of the objects the attributes of an object reference,
+            # filled per export by _link_references
+            std_object_garbage_collect_release = std_object_garbage_collect.create_mcfunction("release")
+            std_object_garbage_collect_retain = std_object_garbage_collect.create_mcfunction("retain")
+            std_object_garbage_collect_free = std_object_garbage_collect.create_mcfunction("free")
+
+            if STD_OBJ_BACKEND == "storage":
+                if_garbage = LiteralCommand("execute if data storage %s garbage[0] run", STD_OBJ_GC_STORAGE)
+
+                std_object_garbage_collect_free_object = std_object_garbage_collect.create_mcfunction("free_object")
+                std_object_garbage_collect_free_object.add_command(
+                    Comment("fetch the object to release the references it holds"),
+                    LiteralCommand("data remove storage %s ret", STD_OBJ_HEAP),
+                    *conv.var_to_var(_STD_OBJ_GC_ID, _STD_OBJ_HEAP_ID),
+                    *conv.var_to_var(ConstInt(0), _STD_OBJ_HEAP_STORE),
+                    FunctionCall(std_object_heap_root),
+                    FunctionCall(std_object_garbage_collect_release),
+
+                    Comment("clear the object and reuse its id"),
+                    LiteralCommand("data modify storage %s ret set value {}", STD_OBJ_HEAP),
+                    *conv.var_to_var(_STD_OBJ_GC_ID, _STD_OBJ_HEAP_ID),
+                    *conv.var_to_var(ConstInt(1), _STD_OBJ_HEAP_STORE),
+                    FunctionCall(std_object_heap_root),
+                    LiteralCommand("data modify storage %s free append value 0", STD_OBJ_HEAP),
+                    LiteralCommand("execute store result storage %s free[-1] int 1 run scoreboard players get %s %s",
+                                   STD_OBJ_HEAP, *_STD_OBJ_GC_ID),
+                )
+
+                std_object_garbage_collect_free.add_command(
+                    LiteralCommand("execute store result score %s %s run data get storage %s garbage[0]",
+                                   *_STD_OBJ_GC_ID, STD_OBJ_GC_STORAGE),
+                    LiteralCommand("data remove storage %s garbage[0]", STD_OBJ_GC_STORAGE),
+
+                    Comment("unqueue the object, it is only freed if it wasn't referenced again in the meantime"),
+                    *conv.var_to_var(_STD_OBJ_GC_ID, _STD_OBJ_GC_REF),
+                    *_std_object_add_to_count(-_STD_OBJ_GC_QUEUED),
+                    ComposedCommand(
+                        LiteralCommand("execute if score %s %s matches 0 run", *_STD_OBJ_GC_COUNT),
+                        FunctionCall(std_object_garbage_collect_free_object)
+                    ),
+                )
+            else:
+                # objects that were referenced again after they were queued keep the tag
+                if_garbage = LiteralCommand("execute as @e[tag=%s, scores={%s=..0}, limit=1] run",
+                                            _STD_OBJ_GC_TAG, STD_OBJ_REF_COUNT_OBJECTIVE)
+
+                # runs as the object
+                std_object_garbage_collect_free.add_command(
+                    FunctionCall(std_object_garbage_collect_release),
+                    LiteralCommand("kill @s"),
+                )
+
+            # objects are freed one at a time, so that the ones queued by releasing references are freed in this
+            # tick as well
+            std_object_garbage_collect_free.add_command(
+                *conv.add_in_place(_STD_OBJ_GC_LEFT, ConstInt(-1)),
+                ComposedCommand(
+                    LiteralCommand("execute if score %s %s matches 1.. run", *_STD_OBJ_GC_LEFT),
+                    if_garbage,
+                    FunctionCall(std_object_garbage_collect_free)
+                ),
             )
 
             std_object_garbage_collect.add_command(
-                SayCommand("!! HIT garbage_collect STUB !!"),
+                *conv.var_to_var(ConstInt(STD_OBJ_GC_OBJECTS_PER_TICK), _STD_OBJ_GC_LEFT),
+                ComposedCommand(if_garbage, FunctionCall(std_object_garbage_collect_free)),
+                ComposedCommand(if_garbage, ScheduleFunction(std_object_garbage_collect.entry_point, "1t", "replace")),
+            )
 
-                Comment("remove all objects with a reference count of 0"),
+        with std_object_garbage_collection.create_function("increment_reference_count") \
+                as std_object_garbage_collection_increment_reference_count:
+            std_object_garbage_collection_increment_reference_count.describe(
+                "Increment the reference count of the object with the id in ref."
+            )
 
-                Comment("remove all objects that are not referenced by the local scopes")
+            if STD_OBJ_BACKEND == "storage":
+                std_object_garbage_collection_increment_reference_count.add_command(*_std_object_add_to_count(1))
+            else:
+                std_object_garbage_collection_increment_reference_count.add_command(
+                    LiteralCommand("execute as @e[tag=%s] if score @s %s = %s %s run scoreboard players add @s %s 1",
+                                   STD_OBJ_TAG, STD_OBJ_ID_OBJECTIVE, *_STD_OBJ_GC_REF, STD_OBJ_REF_COUNT_OBJECTIVE),
+                )
 
+        with std_object_garbage_collection.create_function("decrement_reference_count") \
+                as std_object_garbage_collection_decrement_reference_count:
+            std_object_garbage_collection_decrement_reference_count.describe(
+                "Decrement the reference count of the object with the id in ref and queue it for garbage_collect if "
+                "it drops to 0."
             )
+
+            queue = std_object_garbage_collection_decrement_reference_count.create_mcfunction("queue")
+            collect_later = ScheduleFunction(std_object_garbage_collect.entry_point, "1t", "replace")
+
+            if STD_OBJ_BACKEND == "storage":
+                queue.add_command(
+                    LiteralCommand("data modify storage %s garbage append value 0", STD_OBJ_GC_STORAGE),
+                    LiteralCommand("execute store result storage %s garbage[-1] int 1 run scoreboard players get %s %s",
+                                   STD_OBJ_GC_STORAGE, *_STD_OBJ_GC_REF),
+                    *_std_object_add_to_count(_STD_OBJ_GC_QUEUED),
+                    collect_later,
+                )
+
+                std_object_garbage_collection_decrement_reference_count.add_command(
+                    *_std_object_add_to_count(-1),
+                    ComposedCommand(
+                        LiteralCommand("execute if score %s %s matches 0 run", *_STD_OBJ_GC_COUNT),
+                        FunctionCall(queue)
+                    ),
+                )
+            else:
+                # runs as the object
+                queue.add_command(
+                    LiteralCommand("scoreboard players remove @s %s 1", STD_OBJ_REF_COUNT_OBJECTIVE),
+                    LiteralCommand("execute if score @s %s matches ..0 run tag @s add %s",
+                                   STD_OBJ_REF_COUNT_OBJECTIVE, _STD_OBJ_GC_TAG),
+                    ComposedCommand(
+                        LiteralCommand("execute if score @s %s matches ..0 run", STD_OBJ_REF_COUNT_OBJECTIVE),
+                        collect_later
+                    ),
+                )
+
+                std_object_garbage_collection_decrement_reference_count.add_command(
+                    ComposedCommand(
+                        LiteralCommand("execute as @e[tag=%s] if score @s %s = %s %s run",
+                                       STD_OBJ_TAG, STD_OBJ_ID_OBJECTIVE, *_STD_OBJ_GC_REF),
+                        FunctionCall(queue)
+                    ),
+                )
+
+
+        def _std_object_attribute_reference(attribute: str) -> NbtVar:
+            """The object id held by attribute of the fetched object (storage backend) or the object that runs the
+            command (entity backend)."""
+
+            if STD_OBJ_BACKEND == "storage":
+                return std_object_data(ObjectType, attribute)
+
+            return NbtVar[ObjectType]("entity", "@s", f"data.{attribute}")
+
+
+        def _std_object_run_on_data(mcfunc: MCFunction) -> list[Command]:
+            if STD_OBJ_BACKEND == "storage":
+                return [FunctionCall(mcfunc)]
+
+            return [ComposedCommand(LiteralCommand("execute as %s run", STD_OBJ_RET_SEL), FunctionCall(mcfunc))]
+
+
+        def std_object_release_data() -> list[Command]:
+            """Decrement the reference counts of the objects the attributes of the fetched object reference, before
+            its data is overwritten as a whole."""
+
+            return _std_object_run_on_data(std_object_garbage_collect_release)
+
+
+        def std_object_retain_data() -> list[Command]:
+            """Increment the reference counts of the objects the attributes of the fetched object reference, after its
+            data was overwritten as a whole."""
+
+            return _std_object_run_on_data(std_object_garbage_collect_retain)
+
+
+        def std_object_assign(src: Expression, dst: Variable) -> list[Command]:
+            """Set dst, a score or object attribute of type ObjectType, to the object id src. The reference count of
+            the object src is incremented and the one of the object dst referenced before is decremented."""
+
+            if isinstance(dst, ScoreboardVar):
+                # an unset score is no object
+                read = [LiteralCommand("execute store result score %s %s run scoreboard players get %s %s",
+                                       *_STD_OBJ_GC_REF, *dst)]
+                write = conv.expr_to_score(_STD_OBJ_GC_REF, dst)
+            else:
+                read = dst.to_primitive_var(_STD_OBJ_GC_REF)
+                write = dst.from_primitive_var(_STD_OBJ_GC_REF)
+
+            return [
+                # garbage_collect releases the reference when it frees the object
+                *([_HoldsReferences(dst.attribute)] if isinstance(dst, ObjectAttributeVar) else []),
+                *read,
+                _std_object_if_ref(FunctionCall(std_object_garbage_collection_decrement_reference_count.entry_point)),
+                *conv.var_to_var(src, _STD_OBJ_GC_REF),
+                _std_object_if_ref(FunctionCall(std_object_garbage_collection_increment_reference_count.entry_point)),
+                *write,
+            ]
+
+
+        def std_object_pin(obj: Expression) -> list[Command]:
+            """Keep the object obj alive until std_object_unpin, e.g. while a function it was passed to runs. Pins
+            nest: they are kept in one list, so a pin must be released in the same tick, before anything else runs.
+            This holds for tools.call_function, as functions with yield points can't be called."""
+
+            return [
+                *conv.var_to_var(obj, _STD_OBJ_GC_REF),
+                LiteralCommand("data modify storage %s pinned append value 0", STD_OBJ_GC_STORAGE),
+                LiteralCommand("execute store result storage %s pinned[-1] int 1 run scoreboard players get %s %s",
+                               STD_OBJ_GC_STORAGE, *_STD_OBJ_GC_REF),
+                _std_object_if_ref(FunctionCall(std_object_garbage_collection_increment_reference_count.entry_point)),
+            ]
+
+
+        def std_object_unpin() -> list[Command]:
+            """Release the object that was pinned last."""
+
+            return [
+                LiteralCommand("execute store result score %s %s run data get storage %s pinned[-1]",
+                               *_STD_OBJ_GC_REF, STD_OBJ_GC_STORAGE),
+                LiteralCommand("data remove storage %s pinned[-1]", STD_OBJ_GC_STORAGE),
+                _std_object_if_ref(FunctionCall(std_object_garbage_collection_decrement_reference_count.entry_point)),
+            ]
+
+
+        def std_object_ref(var: Variable) -> Variable:
+            """var as a var of type ObjectType if it is a score or an object attribute, so that assigning an object id
+            to it is reference counted. Other vars are returned unchanged."""
+
+            if isinstance(var, ScoreboardVar):
+                return ScoreboardVar[ObjectType](var.player, var.objective)
+
+            if isinstance(var, ObjectAttributeVar):
+                return ObjectAttributeVar[ObjectType](var.obj, var.attribute)
+
+            return var
+
+
+class _HoldsReferences(Command):
+    """Marks that attribute holds references to objects. It is removed at export, see _link_references."""
+
+    def __init__(self, attribute: str):
+        self.attribute = attribute
+
+    def get_str(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
+        raise CompilationError(f"The references of attribute {self.attribute!r} are released at export, export the "
+                               f"datapack with Datapack.export or Datapack.write.")
+
+
+@register_link_pass
+def _link_references(all_mcfuncs: dict[tuple[str, ...], MCFunction]) -> dict[tuple[str, ...], MCFunction]:
+    """Fill release and retain with the attributes that are assigned object ids in this datapack, so that only they
+    are released when an object is freed."""
+
+    attributes: dict[str, None] = {}
+    out = dict(all_mcfuncs)
+
+    for path, mcfunc in all_mcfuncs.items():
+        if any(isinstance(command, _HoldsReferences) for command in mcfunc.commands):
+            attributes |= {command.attribute: None for command in mcfunc.commands
+                           if isinstance(command, _HoldsReferences)}
+
+            out[path] = copy.copy(mcfunc)
+            out[path].commands = [command for command in mcfunc.commands if not isinstance(command, _HoldsReferences)]
+
+    if not attributes:
+        return out
+
+    for mcfunc, change_count in ((std_object_garbage_collect_release,
+                                  std_object_garbage_collection_decrement_reference_count),
+                                 (std_object_garbage_collect_retain,
+                                  std_object_garbage_collection_increment_reference_count)):
+        path = tuple(mcfunc.path())
+        if path not in out:
+            raise CompilationError("The datapack assigns object ids to attributes, but doesn't contain the std library.")
+
+        out[path] = copy.copy(out[path])
+        out[path].commands = [
+            *out[path].commands,
+            *(command for attribute in attributes for command in [
+                *conv.var_to_var(_std_object_attribute_reference(attribute), _STD_OBJ_GC_REF),
+                _std_object_if_ref(FunctionCall(change_count.entry_point)),
+            ])
+        ]
+
+    return out
+
+
+from ..derived_var import ObjectAttributeVar
+from ..export import path_of_func_callable
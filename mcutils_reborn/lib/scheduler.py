@@ -0,0 +1,193 @@
+import copy
+import os
+import typing
+
+from .std import *
+from ..command import *
+from ..exception import CompilationError
+from ..expression import ConstInt
+from ..namespace import MCFunction
+from ..export import register_link_pass
+from ..paths import path_to_str
+from .. import conversion as conv
+
+# The scheduler runs jobs, functions started with std_scheduler_spawn, spread across ticks. A job marks yield points
+# with Function.c_yield. Every yield point subtracts the estimated number of commands run since the previous one from
+# the budget of the tick. Once the budget is used up, the job is suspended: the mcfunction that continues after the
+# yield point is appended to the run queue, and the scheduler resumes it in a later tick using schedule function.
+#
+# Code that runs in a later tick runs as the server and at the world spawn, and other code may run in between. A job
+# should therefore keep its state in unique scoreboard vars, not in STD_ARG, STD_RET or the stacks. Functions with
+# yield points must only be run as jobs, as a function that calls one would continue right after the yield point.
+# tools.call_function rejects them with a CompilationError.
+
+# the budget of commands per tick, can be changed at runtime with scoreboard players set
+STD_SCHEDULER_DEFAULT_BUDGET = int(os.environ.get("MCUTILS_REBORN_SCHEDULER_BUDGET", 10000))
+# resumable mcfunctions per mcfunction of the dispatch, it selects one of n in O(n / size + size) commands
+STD_SCHEDULER_DISPATCH_SIZE = 16
+# the commands the scheduler runs per resumed job, they are subtracted from the budget as well
+_STD_SCHEDULER_OVERHEAD = 6
+
+with std_namespace.create_namespace("scheduler") as std_scheduler:
+    # the run queue, a list of the ids of the mcfunctions to resume
+    STD_SCHEDULER_STORAGE = PathString(std_scheduler)
+    STD_SCHEDULER_BUDGET = std_scheduler.get_unique_scoreboard_var("budget")
+    # the commands that are left in the current tick
+    _STD_SCHEDULER_LEFT = std_scheduler.get_unique_scoreboard_var("left")
+    _STD_SCHEDULER_CURRENT = std_scheduler.get_unique_scoreboard_var("current")
+
+    with std_scheduler.create_function("load", tags={STD_LOAD_TAG}) as load:
+        load.add_command(
+            Comment("clear the run queue"),
+            LiteralCommand("data modify storage %s queue set value []", STD_SCHEDULER_STORAGE),
+
+            *conv.var_to_var(ConstInt(STD_SCHEDULER_DEFAULT_BUDGET), STD_SCHEDULER_BUDGET),
+            # code that isn't run by the scheduler never yields
+            *conv.var_to_var(ConstInt(2 ** 31 - 1), _STD_SCHEDULER_LEFT),
+
+            *tools.log("mcutils_reborn", " * Loaded scheduler library!"),
+        )
+
+    with std_scheduler.create_function("dispatch") as std_scheduler_dispatch:
+        std_scheduler_dispatch.describe("Resume the mcfunction with the id in current.")
+        # the ids and the mcfunctions that select one are only known at export, see _link_jobs
+
+
+    def _std_scheduler_enqueue(mcfunc: MCFunction) -> list[Command]:
+        return [_EnqueueJob(mcfunc), ScheduleFunction(std_scheduler_run.entry_point, "1t", "replace")]
+
+
+    def std_scheduler_spawn(function: "Function | MCFunction") -> list[Command]:
+        """Start function as a job in the next tick."""
+
+        return _std_scheduler_enqueue(function.entry_point if isinstance(function, Function) else function)
+
+
+    def std_scheduler_yield(resume: MCFunction, cost: int) -> list[Command]:
+        """Subtract cost from the budget and continue with resume, in this tick if the budget isn't used up yet and
+        in a later one otherwise. See Function.c_yield."""
+
+        def if_left(check: str, command: Command) -> Command:
+            return ComposedCommand(LiteralCommand(f"execute {check} score %s %s matches 1.. run",
+                                                  *_STD_SCHEDULER_LEFT), command)
+
+        return [
+            *conv.add_in_place(_STD_SCHEDULER_LEFT, ConstInt(-cost)),
+            # suspend first, the continuation may use up the budget
+            *(if_left("unless", command) for command in _std_scheduler_enqueue(resume)),
+            if_left("if", FunctionCall(resume)),
+        ]
+
+
+    with std_scheduler.create_function("run") as std_scheduler_run:
+        std_scheduler_run.describe("Resume the jobs in the run queue until the budget of this tick is used up.")
+
+        std_scheduler_run_step = std_scheduler_run.create_mcfunction("step")
+        std_scheduler_run_next = ComposedCommand(
+            LiteralCommand("execute if score %s %s matches 1.. if data storage %s queue[0] run",
+                           *_STD_SCHEDULER_LEFT, STD_SCHEDULER_STORAGE),
+            FunctionCall(std_scheduler_run_step)
+        )
+
+        std_scheduler_run_step.add_command(
+            LiteralCommand("execute store result score %s %s run data get storage %s queue[0]",
+                           *_STD_SCHEDULER_CURRENT, STD_SCHEDULER_STORAGE),
+            LiteralCommand("data remove storage %s queue[0]", STD_SCHEDULER_STORAGE),
+            *conv.add_in_place(_STD_SCHEDULER_LEFT, ConstInt(-_STD_SCHEDULER_OVERHEAD)),
+            FunctionCall(std_scheduler_dispatch.entry_point),
+            std_scheduler_run_next,
+        )
+
+        std_scheduler_run.add_command(
+            *conv.var_to_var(STD_SCHEDULER_BUDGET, _STD_SCHEDULER_LEFT),
+            std_scheduler_run_next,
+
+            Comment("continue in the next tick, outside of the scheduler nothing yields"),
+            ComposedCommand(
+                LiteralCommand("execute if data storage %s queue[0] run", STD_SCHEDULER_STORAGE),
+                ScheduleFunction(std_scheduler_run.entry_point, "1t", "replace")
+            ),
+            *conv.var_to_var(ConstInt(2 ** 31 - 1), _STD_SCHEDULER_LEFT),
+        )
+
+
+
+class _EnqueueJob(Command):
+    """Appends the id of mcfunc to the run queue. The ids are assigned per export, see _link_jobs."""
+
+    def __init__(self, mcfunc: MCFunction):
+        self.mcfunc = mcfunc
+
+    def get_str(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
+        raise CompilationError(f"Job {path_to_str(self.mcfunc.path())} has no id, export the datapack with "
+                               f"Datapack.export or Datapack.write.")
+
+    def get_unique_strings(self) -> typing.Sequence[UniqueString]:
+        return STD_SCHEDULER_STORAGE,
+
+
+@register_link_pass
+def _link_jobs(all_mcfuncs: dict[tuple[str, ...], MCFunction]) -> dict[tuple[str, ...], MCFunction]:
+    """Give the mcfunctions that are appended to the run queue in this datapack an id, in the order they are found,
+    and build the dispatch that resumes them."""
+
+    ids: dict[MCFunction, int] = {}
+
+    def link(command: Command) -> Command:
+        if isinstance(command, _EnqueueJob):
+            mcfunc_id = ids.setdefault(command.mcfunc, len(ids))
+            return LiteralCommand(f"data modify storage %s queue append value {mcfunc_id}", STD_SCHEDULER_STORAGE)
+
+        if isinstance(command, ComposedCommand):
+            commands = [link(sub_command) for sub_command in command.commands]
+            if any(new is not old for new, old in zip(commands, command.commands)):
+                return ComposedCommand(*commands)
+
+        return command
+
+    out = dict(all_mcfuncs)
+
+    for path, mcfunc in all_mcfuncs.items():
+        commands = [link(command) for command in mcfunc.commands]
+
+        if any(new is not old for new, old in zip(commands, mcfunc.commands)):
+            out[path] = copy.copy(mcfunc)
+            out[path].commands = commands
+
+    if not ids:
+        return out
+
+    dispatch_path = tuple(std_scheduler_dispatch.entry_point.path())
+    if dispatch_path not in out:
+        raise CompilationError("The datapack runs jobs, but doesn't contain the std library.")
+
+    dispatch = out[dispatch_path] = copy.copy(out[dispatch_path])
+    dispatch.commands = list(dispatch.commands)
+    # the mcfunctions of the dispatch, by the lowest id they handle
+    buckets: dict[int, MCFunction] = {}
+
+    for mcfunc, mcfunc_id in ids.items():
+        low = mcfunc_id - mcfunc_id % STD_SCHEDULER_DISPATCH_SIZE
+        high = low + STD_SCHEDULER_DISPATCH_SIZE - 1
+
+        if low not in buckets:
+            # not added to the tree, it only belongs to this export
+            buckets[low] = MCFunction(f"{low}_{high}")
+            buckets[low].parent = std_scheduler_dispatch
+            out[tuple(buckets[low].path())] = buckets[low]
+
+            dispatch.add_command(ComposedCommand(
+                LiteralCommand(f"execute if score %s %s matches {low}..{high} run", *_STD_SCHEDULER_CURRENT),
+                FunctionCall(buckets[low])
+            ))
+
+        buckets[low].add_command(ComposedCommand(
+            LiteralCommand(f"execute if score %s %s matches {mcfunc_id} run", *_STD_SCHEDULER_CURRENT),
+            FunctionCall(mcfunc)
+        ))
+
+    return out
+
+
+from ..function import Function
+from ..export import path_of_func_callable
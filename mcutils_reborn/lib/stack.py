@@ -1,3 +1,5 @@
+import typing
+
 from .std import *
 from .. import tools
 from .. import conversion as conv
@@ -11,17 +13,60 @@ with std_namespace.create_namespace("stack") as std_stack_namespace:
     _STD_STACK_TEMP_TAG = UniqueTag("temp", std_stack_namespace)
     _STD_STACK_TEMP_SEL = CompositeString("@e[tag=%s]", _STD_STACK_TEMP_TAG)
 
+    # storage-backed stacks are lists in this storage
+    STD_STACK_STORAGE = PathString(std_stack_namespace)
+
     with std_stack_namespace.create_function("load", tags={STD_LOAD_TAG}) as std_stack_load:
         std_stack_load.add_command(
             Comment("create the stack objective"),
             LiteralCommand("scoreboard objectives add %s dummy", STD_STACK_INDEX_OBJECTIVE),
             LiteralCommand("scoreboard objectives add %s dummy", STD_STACK_VALUE_OBJECTIVE),
 
+            Comment("clear the storage-backed stacks"),
+            LiteralCommand("data modify storage %s stacks set value {}", STD_STACK_STORAGE),
+
             *tools.log("mcutils_reborn", " * Loaded stack library!"),
         )
 
     _STD_STACK_TAGS = {}
 
+    # how deep peek_any can look into a storage-backed stack
+    STD_STACK_PEEK_ANY_DEPTH = 64
+
+    StackBackend = typing.Literal["entity", "storage"]
+    STD_STACK_DEFAULT_BACKEND: StackBackend = "entity"
+    _STD_STACK_BACKENDS: dict[int, StackBackend] = {}
+
+
+    def set_stack_backend(stack_nr: int, backend: StackBackend):
+        """Select how the items of a stack are stored:
+         * entity: one marker per item, found by scanning @e. Peek and pop are O(number of entities).
+         * storage: a list in data storage. All operations are O(1).
+
+        Must be called before any function of the stack is created.
+        """
+
+        assert backend in ("entity", "storage"), f"Unknown stack backend {backend!r}."
+        assert all(
+            kwargs != (("stack_nr", stack_nr),)
+            for template in (std_stack_peek_any, std_stack_peek, std_stack_push, std_stack_pop)
+            for kwargs in template.functions
+        ), f"The functions of stack {stack_nr} were already created with another backend."
+
+        _STD_STACK_BACKENDS[stack_nr] = backend
+
+
+    def backend_of_stacknr(stack_nr: int) -> StackBackend:
+        return _STD_STACK_BACKENDS.get(stack_nr, STD_STACK_DEFAULT_BACKEND)
+
+
+    def storage_of_stacknr(stack_nr: int) -> NbtVar:
+        return NbtVar[ListType]("storage", STD_STACK_STORAGE, f"stacks.stack{stack_nr}")
+
+
+    def top_of_stacknr(stack_nr: int) -> NbtVar:
+        return NbtVar[IntType]("storage", STD_STACK_STORAGE, f"stacks.stack{stack_nr}[-1]")
+
 
     def tag_of_stacknr(stacknr: int):
         if stacknr not in _STD_STACK_TAGS:
@@ -36,9 +81,43 @@ with std_namespace.create_namespace("stack") as std_stack_namespace:
 
     def std_stack_peek_any_template(stack_nr: int) -> Function:
         out = Function(f"peek_any_{stack_nr}")
+        out.describe(
+            "Return the item STD_ARG places below the top of the stack, 0 being the top."
+        )
+
+        if backend_of_stacknr(stack_nr) == "storage":
+            # a list can't be indexed by a score, so select the index with a dispatch tree
+            with out.create_namespace("index") as index_namespace:
+                index_root = tools.dispatch_tree(
+                    index_namespace, STD_ARG, 0, STD_STACK_PEEK_ANY_DEPTH - 1,
+                    lambda i: conv.var_to_var(
+                        NbtVar[IntType]("storage", STD_STACK_STORAGE, f"stacks.stack{stack_nr}[{-i - 1}]"), STD_RET
+                    )
+                )
+
+            out.add_command(
+                Comment(f"return the item, only the top {STD_STACK_PEEK_ANY_DEPTH} items can be peeked, 0 otherwise"),
+                *conv.var_to_var(ConstInt(0), STD_RET),
+                FunctionCall(index_root),
+            )
+
+            return out
+
+        index = out.get_unique_scoreboard_var("index")
 
         out.add_command(
-            *tools.log(f"{'.'.join(std_stack_namespace.path())}", f"!! HIT {out.name} STUB !!")
+            *tools.tag_remove_all(_STD_STACK_TEMP_TAG),
+
+            Comment("calculate the stack index"),
+            *conv.var_to_var(stack_len_of_stacknr(stack_nr), index),
+            *conv.score_score_op_in_place(index, "-=", STD_ARG),
+
+            Comment("select entity"),
+            LiteralCommand("execute as @e[tag=%s] if score @s %s = %s %s run tag @s add %s",
+                           tag_of_stacknr(stack_nr), STD_STACK_INDEX_OBJECTIVE, *index, _STD_STACK_TEMP_TAG),
+
+            Comment("return value"),
+            *conv.var_to_var(ScoreboardVar(_STD_STACK_TEMP_SEL, STD_STACK_VALUE_OBJECTIVE), STD_RET),
         )
 
         return out
@@ -47,6 +126,14 @@ with std_namespace.create_namespace("stack") as std_stack_namespace:
     def std_stack_peek_template(stack_nr: int) -> Function:
         out = Function(f"peek_{stack_nr}")
 
+        if backend_of_stacknr(stack_nr) == "storage":
+            out.add_command(
+                Comment("return the last item"),
+                *conv.var_to_var(top_of_stacknr(stack_nr), STD_RET),
+            )
+
+            return out
+
         out.add_command(
             *tools.tag_remove_all(_STD_STACK_TEMP_TAG),
 
@@ -68,6 +155,16 @@ with std_namespace.create_namespace("stack") as std_stack_namespace:
             "Push an item onto the stack."
         )
 
+        if backend_of_stacknr(stack_nr) == "storage":
+            out.add_command(
+                Comment("append an item and set its value"),
+                LiteralCommand(f"data modify storage %s {storage_of_stacknr(stack_nr).path} append value 0",
+                               STD_STACK_STORAGE),
+                *conv.var_to_var(STD_ARG, top_of_stacknr(stack_nr)),
+            )
+
+            return out
+
         out.add_command(
             *tools.tag_remove_all(_STD_STACK_TEMP_TAG),
 
@@ -95,6 +192,17 @@ with std_namespace.create_namespace("stack") as std_stack_namespace:
             "Pop an item from the stack."
         )
 
+        if backend_of_stacknr(stack_nr) == "storage":
+            out.add_command(
+                Comment("return the last item"),
+                *conv.var_to_var(top_of_stacknr(stack_nr), STD_RET),
+
+                Comment("remove it"),
+                LiteralCommand(f"data remove storage %s {top_of_stacknr(stack_nr).path}", STD_STACK_STORAGE),
+            )
+
+            return out
+
         out.add_command(
             *tools.call_function(std_stack_peek(stack_nr=stack_nr)),
 
@@ -116,3 +224,7 @@ with std_namespace.create_namespace("stack") as std_stack_namespace:
     STD_ARGSTACK = 0
     STD_EXPRSTACK = 1
     STD_CALLSTACK = 2
+
+    # the stacks of the std library are used by every function call with varargs, so they must not scan all entities
+    for _stack_nr in (STD_ARGSTACK, STD_EXPRSTACK, STD_CALLSTACK):
+        set_stack_backend(_stack_nr, "storage")
@@ -1,5 +1,10 @@
-from ..namespace import Namespace
+import copy
+
+from ..namespace import Namespace, MCFunction
 from ..command import *
+from ..expression import ScoreboardVar
+from ..exception import CompilationError
+from ..export import register_link_pass
 from .. import tools
 
 std_namespace = Namespace("mcutils_reborn_std")
@@ -11,6 +16,44 @@ STD_RET = std_namespace.get_unique_scoreboard_var("ret")
 
 STD_TAG = UniqueTag("mcutils_reborn", std_namespace)
 
+STD_TEMP_STORAGE = PathString(std_namespace)
+
+# scores that hold constants, for operations that need a score as operand, e.g. multiplication
+STD_CONST_OBJECTIVE = UniqueScoreboardObjective("const", std_namespace)
+
+
+class _StdConstant(NonUniqueString):
+    """The player of the score that holds value. Players of the same value are equal."""
+
+    def __init__(self, value: int):
+        super().__init__(f"#{value}", std_namespace)
+        self.constant = value
+
+    def __hash__(self):
+        return hash((self.__class__.__name__, self.constant))
+
+    def __eq__(self, other):
+        return isinstance(other, _StdConstant) and self.constant == other.constant
+
+    def get(self, allocator: "UniqueStringAllocator", resolve: "resolve_callable",
+            path_of_func: "path_of_func_callable") -> str:
+        return self.value
+
+
+def std_constant(value: int) -> ScoreboardVar:
+    """A score that holds value. The constants a datapack uses are set in the load function, see _link_constants."""
+
+    return ScoreboardVar(_StdConstant(value), STD_CONST_OBJECTIVE)
+
+
+class _SetConstants(Command):
+    """Marks where the load function sets the constants. It is replaced at export, see _link_constants."""
+
+    def get_str(self, path_of_func: "path_of_func_callable", strings: dict[UniqueString, str]) -> str:
+        raise CompilationError("The constants are set at export, export the datapack with Datapack.export or "
+                               "Datapack.write.")
+
+
 STD_LOAD_TAG = std_namespace.create_function_tag("load")
 
 with std_namespace.create_function("load", tags={"minecraft:load"}) as load:
@@ -21,11 +64,15 @@ with std_namespace.create_function("load", tags={"minecraft:load"}) as load:
         Comment("create the std objective"),
         LiteralCommand("scoreboard objectives add %s dummy", STD_OBJECTIVE),
         LiteralCommand("scoreboard objectives add %s dummy", STD_TEMP_OBJECTIVE),
+        LiteralCommand("scoreboard objectives add %s dummy", STD_CONST_OBJECTIVE),
 
         Comment("reset the std objective"),
         LiteralCommand("scoreboard players reset * %s", STD_OBJECTIVE),
         LiteralCommand("scoreboard players reset * %s", STD_TEMP_OBJECTIVE),
 
+        Comment("set the constants"),
+        _SetConstants(),
+
         Comment("Kill all entities with the std tag"),
         LiteralCommand("kill @e[tag=%s]", STD_TAG),
 
@@ -34,6 +81,43 @@ with std_namespace.create_function("load", tags={"minecraft:load"}) as load:
         *tools.log("mcutils_reborn", "Finished reloading!"),
     )
 
+
 from .object import *
 from .stack import *
 from .debug import *
+from .scheduler import *
+
+
+# registered after the link passes of the libraries above, which may add commands that use constants
+@register_link_pass
+def _link_constants(all_mcfuncs: dict[tuple[str, ...], MCFunction]) -> dict[tuple[str, ...], MCFunction]:
+    """Set the constants that the commands of this datapack use, in the order of their values."""
+
+    constants = sorted({
+        unique_string.constant
+        for mcfunc in all_mcfuncs.values() for command in mcfunc.commands
+        for unique_string in flatten_unique_strings(command.get_unique_strings())
+        if isinstance(unique_string, _StdConstant)
+    })
+
+    set_constants = [LiteralCommand(f"scoreboard players set %s %s {value}", *std_constant(value))
+                     for value in constants]
+
+    out = dict(all_mcfuncs)
+    linked = False
+
+    for path, mcfunc in all_mcfuncs.items():
+        if any(isinstance(command, _SetConstants) for command in mcfunc.commands):
+            out[path] = copy.copy(mcfunc)
+            out[path].commands = [new for command in mcfunc.commands
+                                  for new in (set_constants if isinstance(command, _SetConstants) else [command])]
+            linked = True
+
+    if constants and not linked:
+        raise CompilationError("The datapack uses constants, but doesn't contain the std library.")
+
+    return out
+
+
+from ..optimize import flatten_unique_strings
+from ..export import path_of_func_callable, resolve_callable
@@ -64,6 +64,16 @@ class Namespace(Pathable):
 
         return ScoreboardVar(UniqueScoreboardPlayer(player, self), objective)
 
+    def get_temp_scoreboard_var(self, player: str, objective: "str | UniqueString | None" = None) -> "ScoreboardVar":
+        """Like get_unique_scoreboard_var, but the var must only be used within one mcfunction. In return, it shares
+        its player with other temps where that is safe."""
+
+        if objective is None:
+            from .lib.std import STD_OBJECTIVE
+            objective = STD_OBJECTIVE
+
+        return ScoreboardVar(TempScoreboardPlayer(player, self), objective)
+
     def get(self, name: str):
         return self.children[name]
 
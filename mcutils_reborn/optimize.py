@@ -0,0 +1,504 @@
+"""Peephole optimizer for the command lists of mcfunctions.
+
+Passes are registered with an optimization level and run on the commands of every mcfunction before rendering,
+see Datapack.export(optimize=...). A pass gets a list of commands and returns a new one. It must not change what
+the mcfunction does.
+
+Commands that the passes can't see through (function calls, dynamic commands) are treated as reading and writing
+everything.
+"""
+
+import copy
+import typing
+
+from .command import Command, LiteralCommand, ComposedCommand, DynamicCommand, FunctionCall, UniqueString, \
+    NonUniqueString, CompositeString, Comment, NoOpCommand, ScoreAssignment, TagRemoveAll, FetchObject, StoreObject, \
+    ConditionStore, ScheduleFunction
+
+OptimizationPass = typing.Callable[[list[Command]], list[Command]]
+
+# (level, pass), in the order the passes are run
+PASSES: list[tuple[int, OptimizationPass]] = []
+
+ScoreKey = tuple[UniqueString | str, UniqueString | str]
+
+
+def register_pass(level: int) -> typing.Callable[[OptimizationPass], OptimizationPass]:
+    """Register an optimization pass that runs if the optimization level is at least level."""
+
+    def decorator(optimization_pass: OptimizationPass) -> OptimizationPass:
+        PASSES.append((level, optimization_pass))
+        return optimization_pass
+
+    return decorator
+
+
+def optimize(commands: list[Command], level: int) -> list[Command]:
+    for pass_level, optimization_pass in PASSES:
+        if level >= pass_level:
+            commands = optimization_pass(commands)
+
+    return commands
+
+
+def is_opaque(command: Command) -> bool:
+    """Whether the effects of the command are unknown. This is the case for function calls and dynamic commands."""
+
+    if isinstance(command, ComposedCommand):
+        return any(is_opaque(sub_command) for sub_command in command.commands)
+
+    if isinstance(command, (FunctionCall, DynamicCommand)):
+        return True
+
+    return not isinstance(command, LiteralCommand)
+
+
+def flatten_unique_strings(unique_strings: typing.Iterable[UniqueString]) -> list[UniqueString]:
+    """Return the unique strings and, recursively, the arguments of composite strings among them."""
+
+    out = []
+    todo = list(unique_strings)
+
+    while todo:
+        unique_string = todo.pop()
+        out.append(unique_string)
+
+        if isinstance(unique_string, CompositeString):
+            todo += [arg for arg in unique_string.args if isinstance(arg, UniqueString)]
+
+    return out
+
+
+def get_references(command: Command) -> set[UniqueString]:
+    """All unique strings a command references, including the arguments of composite strings."""
+
+    return set(flatten_unique_strings(command.get_unique_strings()))
+
+
+def is_trackable(score: ScoreKey) -> bool:
+    # selectors may select different entities at different times, so only track fake players with a unique name
+    player, objective = score
+    return isinstance(player, UniqueString) and not isinstance(player, NonUniqueString)
+
+
+def reads_dst(command: ScoreAssignment) -> bool:
+    """Whether a score assignment references its destination player anywhere else, e.g. in its source."""
+
+    return flatten_unique_strings(command.get_unique_strings()).count(command.dst[0]) > 1
+
+
+@register_pass(1)
+def remove_no_ops(commands: list[Command]) -> list[Command]:
+    return [command for command in commands if not isinstance(command, NoOpCommand)]
+
+
+@register_pass(1)
+def remove_duplicate_tag_clears(commands: list[Command]) -> list[Command]:
+    """Remove tag_remove_all of a tag if it was already cleared and nothing could have added it since."""
+
+    out = []
+    cleared: set[UniqueString] = set()
+
+    for command in commands:
+        if isinstance(command, TagRemoveAll) and isinstance(command.tag, UniqueString):
+            if command.tag in cleared:
+                continue
+
+            cleared.add(command.tag)
+
+        elif is_opaque(command):
+            cleared.clear()
+
+        else:
+            cleared -= get_references(command)
+
+        out.append(command)
+
+    return out
+
+
+@register_pass(2)
+def remove_redundant_fetches(commands: list[Command]) -> list[Command]:
+    """Remove fetches of the object that is already fetched, e.g. when accessing several attributes of self.
+
+    Function calls other than object stores may fetch another object or create one, so they end the tracking. So do
+    commands that could change the score holding the id of the fetched object.
+    """
+
+    out = []
+    fetched: ScoreKey | None = None
+
+    for command in commands:
+        if isinstance(command, FetchObject):
+            if command.obj is not None and command.obj == fetched:
+                continue
+
+            fetched = command.obj if command.obj is not None and is_trackable(command.obj) else None
+
+        elif isinstance(command, StoreObject):
+            pass
+
+        elif is_opaque(command):
+            fetched = None
+
+        elif fetched is not None:
+            if isinstance(command, ScoreAssignment):
+                if command.dst[0] == fetched[0]:
+                    fetched = None
+
+            elif fetched[0] in get_references(command):
+                fetched = None
+
+        out.append(command)
+
+    return out
+
+
+@register_pass(2)
+def remove_redundant_copies(commands: list[Command]) -> list[Command]:
+    """Remove score copies a = b if a is already known to be equal to b, e.g. when copying back and forth."""
+
+    out = []
+    # pairs of scores that are known to be equal
+    equal: set[frozenset[ScoreKey]] = set()
+
+    def forget(players: set[UniqueString | str]):
+        for pair in list(equal):
+            if any(player in players for player, objective in pair):
+                equal.discard(pair)
+
+    for command in commands:
+        if isinstance(command, ScoreAssignment) and command.src is not None \
+                and is_trackable(command.dst) and is_trackable(command.src):
+            pair = frozenset((command.dst, command.src))
+
+            if pair in equal:
+                continue
+
+            forget({command.dst[0]})
+            equal.add(pair)
+
+        elif is_opaque(command):
+            equal.clear()
+
+        else:
+            forget(get_references(command))
+
+        out.append(command)
+
+    return out
+
+
+@register_pass(2)
+def remove_dead_stores(commands: list[Command]) -> list[Command]:
+    """Remove score assignments whose value is overwritten before it is read.
+
+    The value of a score at the end of the command list is always considered to be read.
+    """
+
+    out = []
+    # scores that are overwritten later without being read before that
+    overwritten: set[ScoreKey] = set()
+
+    def read(players: set[UniqueString | str]):
+        for score in list(overwritten):
+            if score[0] in players:
+                overwritten.discard(score)
+
+    for command in reversed(commands):
+        if isinstance(command, ScoreAssignment) and is_trackable(command.dst) and not reads_dst(command):
+            if command.dst in overwritten:
+                continue
+
+            overwritten.add(command.dst)
+            read(get_references(command) - {command.dst[0]})
+
+        elif is_opaque(command):
+            overwritten.clear()
+
+        else:
+            read(get_references(command))
+
+        out.append(command)
+
+    return out[::-1]
+
+
+def is_empty(mcfunc: "MCFunction") -> bool:
+    return all(isinstance(command, Comment) for command in mcfunc.commands)
+
+
+def is_pinned(mcfunc: "MCFunction") -> bool:
+    """Whether an mcfunction may be called from outside the datapack, so its file must be kept.
+
+    This is the case for tagged mcfunctions and the entry points of functions. The other mcfunctions of a function are
+    only ever called by the generated code, e.g. the continuations of c_if and c_while.
+    """
+
+    parent = mcfunc.parent
+    # mcfunc may be a copy made by a whole-pack pass
+    return bool(mcfunc.tags) or not isinstance(parent, Function) or parent.entry_point.name == mcfunc.name
+
+
+def get_calls(command: Command) -> list["Pathable"]:
+    if isinstance(command, FunctionCall):
+        return [command.function]
+
+    if isinstance(command, ComposedCommand):
+        return [function for sub_command in command.commands for function in get_calls(sub_command)]
+
+    return []
+
+
+class CallGraph:
+    """The mcfunctions that each mcfunction of a datapack calls or continues with.
+
+    Calls of function tags go to the mcfunctions of the datapack with the tag. Calls of mcfunctions outside the
+    datapack are ignored, and so are DynamicCommands, whose calls can't be seen.
+    """
+
+    def __init__(self, all_mcfuncs: dict[tuple[str, ...], "MCFunction"]):
+        self.all_mcfuncs = all_mcfuncs
+
+        self.tagged: dict[str, list[tuple[str, ...]]] = {}
+        for path, mcfunc in all_mcfuncs.items():
+            for tag in mcfunc.tags:
+                tag_name = path_to_str(tag.path()) if isinstance(tag, FunctionTag) else tag
+                self.tagged.setdefault(tag_name, []).append(path)
+
+        self.successors: dict[tuple[str, ...], list[tuple[str, ...]]] = {}
+        for path, mcfunc in all_mcfuncs.items():
+            functions = [function for command in mcfunc.commands for function in get_calls(command)]
+            if mcfunc.continuation is not None:
+                functions.append(mcfunc.continuation)
+
+            self.successors[path] = self.get_callees(functions)
+
+        self._reachable: dict[tuple[str, ...], set[tuple[str, ...]]] = {}
+
+    def get_callees(self, functions: typing.Iterable["Pathable"]) -> list[tuple[str, ...]]:
+        out = []
+
+        for function in functions:
+            if isinstance(function, FunctionTag):
+                out += self.tagged.get(path_to_str(function.path()), [])
+            elif (path := tuple(function.path())) in self.all_mcfuncs:
+                out.append(path)
+
+        return out
+
+    def get_reachable(self, start: tuple[str, ...]) -> set[tuple[str, ...]]:
+        """The mcfunctions that can run while start runs, including start."""
+
+        if start not in self._reachable:
+            seen = {start}
+            todo = [start]
+
+            while todo:
+                for successor in self.successors[todo.pop()]:
+                    if successor not in seen:
+                        seen.add(successor)
+                        todo.append(successor)
+
+            self._reachable[start] = seen
+
+        return self._reachable[start]
+
+
+def lower_conditions(all_mcfuncs: dict[tuple[str, ...], "MCFunction"]) -> dict[tuple[str, ...], "MCFunction"]:
+    """Check the condition of ifs directly instead of storing it first, where that is safe. Returns copies of the
+    mcfunctions that changed, the tree is not modified.
+
+    c_if stores the condition, because the branch runs before the else branch or continuation is chosen and could
+    change what the condition depends on. If the condition only reads scores that nothing reachable from the branch
+    references, the three commands
+
+        execute store success score <temp> if <condition>
+        execute if score <temp> matches 1 run function <branch>
+        execute unless score <temp> matches 1 run function <else>
+
+    become execute if <condition> run function <branch> and execute unless <condition> run function <else>.
+    """
+
+    call_graph = CallGraph(all_mcfuncs)
+
+    def get_lowered_call(command: Command, check: str, condition: ConditionStore) -> Command | None:
+        if not (isinstance(command, ComposedCommand) and len(command.commands) == 2
+                and isinstance(command.commands[0], LiteralCommand) and isinstance(command.commands[1], FunctionCall)
+                and command.commands[0].literal == f"execute {check} score %s %s matches 1 run"
+                and command.commands[0].args == condition.dst):
+            return None
+
+        return ComposedCommand(
+            LiteralCommand(f"execute {check} {condition.condition} run", *condition.condition_args),
+            command.commands[1]
+        )
+
+    def is_safe(condition: ConditionStore, branch_call: Command) -> bool:
+        if condition.inputs is None:
+            return False
+
+        for path in call_graph.get_reachable(*call_graph.get_callees(get_calls(branch_call))):
+            for command in all_mcfuncs[path].commands:
+                if get_references(command) & condition.inputs:
+                    return False
+
+        return True
+
+    out = dict(all_mcfuncs)
+
+    for path, mcfunc in all_mcfuncs.items():
+        commands = list(mcfunc.commands)
+        i = 0
+
+        while i + 2 < len(commands):
+            condition = commands[i]
+
+            if isinstance(condition, ConditionStore):
+                branch_call = get_lowered_call(commands[i + 1], "if", condition)
+                else_call = get_lowered_call(commands[i + 2], "unless", condition)
+
+                temp_uses = sum(condition.dst[0] in get_references(command) for command in commands)
+
+                if (branch_call is not None and else_call is not None and temp_uses == 3
+                        and len(call_graph.get_callees(get_calls(commands[i + 1]))) == 1
+                        and is_safe(condition, commands[i + 1])):
+                    commands[i:i + 3] = [branch_call, else_call]
+
+            i += 1
+
+        if len(commands) != len(mcfunc.commands):
+            out[path] = copy.copy(mcfunc)
+            out[path].commands = commands
+
+    return out
+
+
+def inline_mcfunctions(all_mcfuncs: dict[tuple[str, ...], "MCFunction"]) -> dict[tuple[str, ...], "MCFunction"]:
+    """Simplify the call graph of the mcfunctions of a datapack. Returns copies, the tree is not modified.
+
+     * Calls and continuations that lead to an empty mcfunction go directly to its continuation instead. Calls of
+       empty mcfunctions without a continuation are removed.
+     * A continuation that is referenced only once is inlined into the mcfunction that continues with it.
+     * mcfunctions that aren't pinned (see is_pinned) and not reachable anymore are removed.
+
+    DynamicCommands must not call mcfunctions that aren't pinned, as their calls can't be seen.
+    """
+
+    mcfuncs = {path: copy.copy(mcfunc) for path, mcfunc in all_mcfuncs.items()}
+
+    def get_path(function: "Pathable | None") -> tuple[str, ...] | None:
+        # None for function tags and mcfunctions that are not part of this datapack
+        if not isinstance(function, MCFunction):
+            return None
+
+        path = tuple(function.path())
+        return path if path in mcfuncs else None
+
+    def follow(mcfunc: "MCFunction") -> "MCFunction | None":
+        """The first non-empty mcfunction of the chain of continuations starting at mcfunc."""
+
+        seen = set()
+
+        while (path := get_path(mcfunc)) is not None and is_empty(all_mcfuncs[path]):
+            if path in seen:
+                # an endless chain of empty mcfunctions, keep it
+                return mcfunc
+
+            seen.add(path)
+            mcfunc = all_mcfuncs[path].continuation
+
+            if mcfunc is None:
+                return None
+
+        return mcfunc
+
+    def retarget(call: FunctionCall, target: "MCFunction") -> FunctionCall:
+        if target is call.function:
+            # keep subclasses like FetchObject
+            return call
+
+        if isinstance(call, ScheduleFunction):
+            return ScheduleFunction(target, call.time, call.mode)
+
+        return FunctionCall(target)
+
+    def redirect(command: Command) -> Command | None:
+        if isinstance(command, FunctionCall):
+            target = follow(command.function)
+
+            return None if target is None else retarget(command, target)
+
+        if (isinstance(command, ComposedCommand) and isinstance(command.commands[-1], FunctionCall)
+                and all(isinstance(sub_command, LiteralCommand) for sub_command in command.commands[:-1])):
+            *prefix, call = command.commands
+            target = follow(call.function)
+
+            if target is None:
+                # execute store would observe the call
+                if any("store" in sub_command.literal.split() for sub_command in prefix):
+                    return command
+
+                return None
+
+            return ComposedCommand(*prefix, retarget(call, target))
+
+        return command
+
+    for mcfunc in mcfuncs.values():
+        mcfunc.commands = [command for command in map(redirect, mcfunc.commands) if command is not None]
+        if mcfunc.continuation is not None:
+            mcfunc.continuation = follow(mcfunc.continuation)
+
+    def get_references(mcfunc: "MCFunction") -> list[tuple[str, ...]]:
+        functions = [function for command in mcfunc.commands for function in get_calls(command)]
+        if mcfunc.continuation is not None:
+            functions.append(mcfunc.continuation)
+
+        return [path for path in map(get_path, functions) if path is not None]
+
+    # remove unreachable mcfunctions
+    reachable = set()
+    todo = [path for path, mcfunc in all_mcfuncs.items() if is_pinned(mcfunc)]
+    while todo:
+        path = todo.pop()
+        if path not in reachable:
+            reachable.add(path)
+            todo += get_references(mcfuncs[path])
+
+    mcfuncs = {path: mcfunc for path, mcfunc in mcfuncs.items() if path in reachable}
+
+    reference_counts: dict[tuple[str, ...], int] = {}
+    for mcfunc in mcfuncs.values():
+        for path in get_references(mcfunc):
+            reference_counts[path] = reference_counts.get(path, 0) + 1
+
+    # inline continuations
+    def can_inline(path: tuple[str, ...], continuation_path: tuple[str, ...] | None) -> bool:
+        return (continuation_path is not None
+                and continuation_path != path
+                and reference_counts[continuation_path] == 1
+                and not is_pinned(all_mcfuncs[continuation_path]))
+
+    inlined = set()
+    for path, mcfunc in mcfuncs.items():
+        if path in inlined:
+            continue
+
+        while can_inline(path, continuation_path := get_path(mcfunc.continuation)):
+            continuation = mcfuncs[continuation_path]
+
+            mcfunc.commands = [
+                *mcfunc.commands,
+                Comment(f"Inlined {path_to_str(continuation_path)}:"),
+                *continuation.commands
+            ]
+            mcfunc.continuation = continuation.continuation
+            inlined.add(continuation_path)
+
+    return {path: mcfunc for path, mcfunc in mcfuncs.items() if path not in inlined}
+
+
+from .namespace import Pathable, MCFunction, FunctionTag
+from .function import Function
+from .paths import path_to_str
@@ -0,0 +1,269 @@
+"""Compile-time profiler for the generator pipeline.
+
+Usage::
+
+    with profiling.profile() as profiler:
+        ...  # build namespaces, export the datapack
+
+    profiler.print()
+
+Alternatively, set the environment variable MCUTILS_REBORN_PROFILE=1 before importing mcutils_reborn.all to profile
+the whole process and print the report to stderr at exit.
+
+Profiled phases:
+ * tree:     time spent inside the outermost `with` block of a namespace, i.e. building its tree
+ * conv:     conversion.* calls
+ * template: Template.__call__, i.e. instantiating templates
+ * resolve:  resolving unique strings during an export
+ * render:   rendering mcfunctions to strings during an export
+
+Phases may nest (conv calls happen while building the tree), so their times don't add up. Within one phase, only
+the outermost call is measured.
+"""
+
+import atexit
+import contextlib
+import functools
+import inspect
+import os
+import sys
+import time
+import tracemalloc
+import typing
+
+PHASES = ("tree", "conv", "template", "resolve", "render")
+
+_active_profiler: "Profiler | None" = None
+_originals: dict[tuple[object, str], typing.Callable] = {}
+
+
+class PhaseStats:
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.
+        self.memory = 0
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {"calls": self.calls, "time": self.time, "memory": self.memory}
+
+
+class Profiler:
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+
+        # (phase, top level namespace) -> stats
+        self.stats: dict[tuple[str, str], PhaseStats] = {}
+
+        self._depths: dict[str, int] = {phase: 0 for phase in PHASES}
+        self._namespace_stack: list["Namespace"] = []
+        self._tree_starts: list[tuple[float, int]] = []
+        self._started_tracemalloc = False
+
+    def _memory(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.trace_memory else 0
+
+    def current_namespace(self) -> str:
+        """Name of the top level namespace that is currently being built."""
+
+        if not self._namespace_stack:
+            return "<none>"
+
+        return root_name(self._namespace_stack[-1])
+
+    @contextlib.contextmanager
+    def measure(self, phase: str, namespace: str):
+        self._depths[phase] += 1
+        if self._depths[phase] > 1:
+            try:
+                yield
+            finally:
+                self._depths[phase] -= 1
+
+            return
+
+        start_time, start_memory = time.perf_counter(), self._memory()
+        try:
+            yield
+        finally:
+            self._depths[phase] -= 1
+            self.add(phase, namespace, time.perf_counter() - start_time, self._memory() - start_memory)
+
+    def add(self, phase: str, namespace: str, time_: float, memory: int):
+        stats = self.stats.setdefault((phase, namespace), PhaseStats())
+        stats.calls += 1
+        stats.time += time_
+        stats.memory += memory
+
+    def enter_namespace(self, namespace: "Namespace"):
+        if not self._namespace_stack:
+            self._tree_starts.append((time.perf_counter(), self._memory()))
+
+        self._namespace_stack.append(namespace)
+
+    def exit_namespace(self):
+        namespace = self._namespace_stack.pop()
+
+        if not self._namespace_stack:
+            start_time, start_memory = self._tree_starts.pop()
+            self.add("tree", root_name(namespace), time.perf_counter() - start_time, self._memory() - start_memory)
+
+    def start(self):
+        global _active_profiler
+        assert _active_profiler is None, "Another profiler is already active."
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+        _install_patches()
+        _active_profiler = self
+
+    def stop(self):
+        global _active_profiler
+        _active_profiler = None
+
+        _remove_patches()
+
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def by_phase(self) -> dict[str, PhaseStats]:
+        out = {}
+        for (phase, namespace), stats in self.stats.items():
+            total = out.setdefault(phase, PhaseStats())
+            total.calls += stats.calls
+            total.time += stats.time
+            total.memory += stats.memory
+
+        return out
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        out = {}
+        for (phase, namespace), stats in self.stats.items():
+            out.setdefault(phase, {})[namespace] = stats.to_dict()
+
+        return out
+
+    def print(self, file: typing.TextIO = sys.stdout):
+        rows = [(phase, namespace, stats) for (phase, namespace), stats in self.stats.items()]
+        rows.sort(key=lambda row: (PHASES.index(row[0]), -row[2].time))
+
+        _max_namespace_len = max([len("namespace"), *(len(namespace) for phase, namespace, stats in rows)])
+
+        print(f"{'phase': <8} {'namespace': <{_max_namespace_len}} {'calls': >8} {'time': >10} {'memory': >12}",
+              file=file)
+        for phase, namespace, stats in rows:
+            print(f"{phase: <8} {namespace: <{_max_namespace_len}} {stats.calls: >8} {stats.time: >9.3f}s "
+                  f"{stats.memory / 1024: >10.1f}kB", file=file)
+
+
+def root_name(pathable: "Pathable") -> str:
+    # Datapack.path() is [], so the first element of a path is always the top level namespace
+    path = pathable.path()
+    return path[0] if path else pathable.name
+
+
+@contextlib.contextmanager
+def profile(trace_memory: bool = True) -> typing.Iterator[Profiler]:
+    profiler = Profiler(trace_memory)
+    profiler.start()
+
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def _wrap(func: typing.Callable, phase: str, get_namespace: typing.Callable[[tuple], str]) -> typing.Callable:
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = _active_profiler
+        if profiler is None:
+            return func(*args, **kwargs)
+
+        with profiler.measure(phase, get_namespace(args)):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _wrap_enter(func: typing.Callable) -> typing.Callable:
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        if _active_profiler is not None:
+            _active_profiler.enter_namespace(self)
+
+        return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def _wrap_exit(func: typing.Callable) -> typing.Callable:
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            if _active_profiler is not None and _active_profiler._namespace_stack:
+                _active_profiler.exit_namespace()
+
+    return wrapper
+
+
+def _current_namespace(args: tuple) -> str:
+    return _active_profiler.current_namespace()
+
+
+def _patch(owner: object, attribute: str, wrapper: typing.Callable):
+    _originals[owner, attribute] = vars(owner)[attribute]
+    setattr(owner, attribute, wrapper)
+
+
+def _install_patches():
+    """Wrap the profiled functions. Patching (instead of decorating) keeps the overhead at zero when not profiling."""
+
+    if _originals:
+        return
+
+    from . import conversion, namespace, function, export
+
+    for name, obj in list(vars(conversion).items()):
+        if inspect.isfunction(obj) and obj.__module__ == conversion.__name__ and not name.startswith("_"):
+            _patch(conversion, name, _wrap(obj, "conv", _current_namespace))
+
+    _patch(namespace.Template, "__call__",
+           _wrap(namespace.Template.__call__, "template", lambda args: root_name(args[0])))
+    _patch(export.Datapack, "resolve_unique_strings",
+           _wrap(export.Datapack.resolve_unique_strings, "resolve", lambda args: args[0].name))
+    _patch(export, "get_mcfunc_content",
+           _wrap(export.get_mcfunc_content, "render", lambda args: args[0][0]))
+
+    _patch(namespace.Namespace, "__enter__", _wrap_enter(namespace.Namespace.__enter__))
+    for cls in (namespace.Namespace, function.Function):
+        _patch(cls, "__exit__", _wrap_exit(vars(cls)["__exit__"]))
+
+
+def _remove_patches():
+    for (owner, attribute), original in _originals.items():
+        setattr(owner, attribute, original)
+
+    _originals.clear()
+
+
+def _profile_process():
+    profiler = Profiler()
+    profiler.start()
+
+    def _report():
+        profiler.stop()
+        profiler.print(file=sys.stderr)
+
+    atexit.register(_report)
+
+
+if os.environ.get("MCUTILS_REBORN_PROFILE", "") not in ("", "0"):
+    _profile_process()
+
+
+from .namespace import Namespace, Pathable
@@ -0,0 +1,101 @@
+"""Register allocation for temporary scoreboard players.
+
+A TempScoreboardPlayer is only used within the commands of a single mcfunction. At export, temps that are never live
+at the same time share a player (a register), so the number of fake players on the scoreboard stays bounded by the
+number of temps that can be live at once instead of growing with the size of the datapack.
+
+A temp is live from its first to its last reference in the commands of its mcfunction. Two temps of the same
+mcfunction conflict if their live ranges overlap. A temp that is live across a function call also conflicts with
+every temp of every mcfunction that can be reached from the call, through calls and continuations.
+
+Calls in DynamicCommands can't be seen, so they must not call mcfunctions that use temps. Calls of mcfunctions outside
+the datapack are assumed not to call back into it.
+"""
+
+from .command import Command, TempScoreboardPlayer
+
+McfuncPath = tuple[str, ...]
+
+
+def get_temps(command: Command) -> set[TempScoreboardPlayer]:
+    return {unique_string for unique_string in get_references(command)
+            if isinstance(unique_string, TempScoreboardPlayer)}
+
+
+def allocate_registers(all_mcfuncs: dict[McfuncPath, "MCFunction"]) -> dict[TempScoreboardPlayer, int]:
+    """Assign every temp a register number, such that conflicting temps get different registers. Temps that are
+    referenced in more than one mcfunction are not assigned a register, they keep a unique player."""
+
+    call_graph = CallGraph(all_mcfuncs)
+
+    # live ranges of the temps and call sites of the mcfunctions
+    live_ranges: dict[TempScoreboardPlayer, tuple[McfuncPath, int, int]] = {}
+    shared: set[TempScoreboardPlayer] = set()
+    temps_of: dict[McfuncPath, set[TempScoreboardPlayer]] = {}
+    call_sites: dict[McfuncPath, list[tuple[int, list[McfuncPath]]]] = {}
+
+    for path, mcfunc in all_mcfuncs.items():
+        temps_of[path] = set()
+        call_sites[path] = []
+
+        for i, command in enumerate(mcfunc.commands):
+            for temp in get_temps(command):
+                if temp in live_ranges and live_ranges[temp][0] != path:
+                    shared.add(temp)
+                    continue
+
+                first = live_ranges[temp][1] if temp in live_ranges else i
+                live_ranges[temp] = path, first, i
+                temps_of[path].add(temp)
+
+            if callees := call_graph.get_callees(get_calls(command)):
+                call_sites[path].append((i, callees))
+
+    for path in temps_of:
+        temps_of[path] -= shared
+
+    reachable_temps: dict[McfuncPath, set[TempScoreboardPlayer]] = {}
+
+    def get_reachable_temps(start: McfuncPath) -> set[TempScoreboardPlayer]:
+        if start not in reachable_temps:
+            reachable_temps[start] = {temp for path in call_graph.get_reachable(start) for temp in temps_of[path]}
+
+        return reachable_temps[start]
+
+    conflicts: dict[TempScoreboardPlayer, set[TempScoreboardPlayer]] = {
+        temp: set() for temps in temps_of.values() for temp in temps
+    }
+
+    def add_conflict(a: TempScoreboardPlayer, b: TempScoreboardPlayer):
+        if a is not b:
+            conflicts[a].add(b)
+            conflicts[b].add(a)
+
+    for path, temps in temps_of.items():
+        for temp in temps:
+            _, first, last = live_ranges[temp]
+
+            for other in temps:
+                _, other_first, other_last = live_ranges[other]
+                if other_first <= last and first <= other_last:
+                    add_conflict(temp, other)
+
+            # a call in the same command as the first reference happens before the temp is set, but a call in the
+            # same command as the last one may happen before the temp is read, e.g. in execute as @e if score ...
+            for i, callees in call_sites[path]:
+                if first < i <= last:
+                    for callee in callees:
+                        for other in get_reachable_temps(callee):
+                            add_conflict(temp, other)
+
+    # greedy coloring in the order the temps appear
+    registers: dict[TempScoreboardPlayer, int] = {}
+    for temp in sorted(conflicts, key=lambda temp: temp.id):
+        taken = {registers[other] for other in conflicts[temp] if other in registers}
+        registers[temp] = next(register for register in range(len(taken) + 1) if register not in taken)
+
+    return registers
+
+
+from .namespace import MCFunction
+from .optimize import CallGraph, get_calls, get_references
@@ -0,0 +1,128 @@
+import contextlib
+import json
+import sys
+import time
+import typing
+
+from .command import UniqueString, NonUniqueString
+from .exception import WarningRecord
+
+PHASES = ("collect", "resolve", "render", "write")
+
+
+def count_commands(content: list[str]) -> int:
+    """Count the lines of a rendered mcfunction that are neither empty nor comments."""
+
+    return sum(
+        1
+        for command in content
+        for line in command.splitlines()
+        if line.strip() and not line.lstrip().startswith("#")
+    )
+
+
+class FunctionReport:
+    def __init__(self, path: str, commands: int, size: int):
+        self.path = path
+        self.commands = commands
+        self.size = size
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {"commands": self.commands, "size": self.size}
+
+
+class BuildReport:
+    """Structured result of a datapack build. Replaces the output that export() used to print."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.names: dict[str, tuple[str, str]] = {}
+        self.functions: dict[str, FunctionReport] = {}
+        self.timings: dict[str, float] = {phase: 0. for phase in PHASES}
+        self.written: list[str] = []
+        self.warnings: list[WarningRecord] = []
+
+    def add_names(self, unique_strings: dict[UniqueString, str]):
+        for unique_string, string in unique_strings.items():
+            if isinstance(unique_string, NonUniqueString):
+                continue
+
+            self.names[string] = unique_string.__class__.__name__, unique_string.value
+
+    def add_function(self, path: str, content: list[str]):
+        self.functions[path] = FunctionReport(
+            path,
+            count_commands(content),
+            # same serialization as beet.Function
+            len(("\n".join(content) + "\n").encode("utf-8"))
+        )
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.) + time.perf_counter() - start
+
+    def timed(self, name: str, iterable: typing.Iterable) -> typing.Iterator:
+        """Iterate over iterable and account the time spent producing the items to the given phase."""
+
+        iterator = iter(iterable)
+
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+
+            yield item
+
+    @property
+    def total_commands(self) -> int:
+        return sum(function.commands for function in self.functions.values())
+
+    @property
+    def total_size(self) -> int:
+        return sum(function.size for function in self.functions.values())
+
+    @property
+    def total_time(self) -> float:
+        return sum(self.timings.values())
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        return {
+            "name": self.name,
+            "names": {string: {"type": type_, "value": value} for string, (type_, value) in self.names.items()},
+            "functions": {path: function.to_dict() for path, function in self.functions.items()},
+            "timings": self.timings,
+            "written": self.written,
+            "warnings": [warning.to_dict() for warning in self.warnings],
+            "total_commands": self.total_commands,
+            "total_size": self.total_size,
+        }
+
+    def to_json(self, indent: int | None = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def print(self, file: typing.TextIO = sys.stdout):
+        """Print the name table and the built mcfunctions in the format export() used to print."""
+
+        if self.names:
+            _max_name_len = max(len(type_) for type_, value in self.names.values())
+            _max_args_len = max(len(repr(value)) for type_, value in self.names.values())
+
+            for string, (type_, value) in self.names.items():
+                print(f" * {type_: <{_max_name_len}} {value!r: <{_max_args_len}} -> {string!r}", file=file)
+
+        for path in self.functions:
+            print(f"-> {path}", file=file)
+
+        print(f"Built {len(self.functions)} mcfunctions with {self.total_commands} commands "
+              f"({self.total_size} bytes) in {self.total_time:.3f}s "
+              f"({', '.join(f'{phase}: {t:.3f}s' for phase, t in self.timings.items())}).", file=file)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.name!r}, functions={len(self.functions)}, " \
+               f"commands={self.total_commands}, size={self.total_size})"
@@ -1,13 +1,14 @@
 import typing
 
-from .expression import Expression, Variable
+from .expression import Expression, Variable, ScoreboardVar, NbtVar, ObjectType, DataType, ConcreteDataType, \
+    WholeNumberType, IntType
 from . import conversion as conv
 from .command import UniqueString, FunctionCall, PathString, DynamicCommand, UniqueTag, Command, Comment, \
-    LiteralCommand, Function
+    LiteralCommand, TagRemoveAll, ComposedCommand, Function
 from .exception import CompilationError
 from .paths import path_to_str
 from . import tellraw
-from .namespace import Class
+from .namespace import Class, Namespace, MCFunction
 
 
 def call_function(function: "Function", *,
@@ -21,10 +22,24 @@ def call_function(function: "Function", *,
                 PathString(function))
     ]
 
+    if function.may_yield():
+        raise CompilationError(f"Function {path_to_str(function.path())} has yield points, so it can't be called. Run "
+                               f"it as a job with std_scheduler_spawn instead.")
+
+    function.called = True
+
     if len(varargs) != len(function.args):
         raise CompilationError(
             f"Function {path_to_str(function.path())} has {len(function.args)} varargs, but {len(varargs)} were given.")
 
+    # objects passed to the function can't be garbage collected before it returns, which is in this tick
+    pinned = [expr for expr in (*varargs, arg) if expr is not None and expr.is_data_type(ObjectType)]
+
+    for expr in pinned:
+        from .lib.std import std_object_pin
+
+        out += std_object_pin(expr)
+
     for i, vararg in enumerate(varargs):
         from .lib.std import STD_ARGSTACK, std_stack_push
 
@@ -47,15 +62,39 @@ def call_function(function: "Function", *,
             *conv.var_to_var(STD_RET, target)
         ]
 
+    for _ in pinned:
+        from .lib.std import std_object_unpin
+
+        out += std_object_unpin()
+
     return out
 
 
-def create_object(class_: Class, args: tuple[Expression], target: Variable | None = None) -> list[Command]:
+def create_object(class_: Class, args: tuple[Expression], target: Variable | None = None,
+                  attributes: typing.Mapping[str, Expression] | None = None) -> list[Command]:
+    """Create an object of class_ and call its __init__ with args. attributes are set before __init__ runs, in one
+    batch: the object is fetched and written back once, and all constant attributes are merged in with one command.
+
+    A score or object attribute target holds a reference to the object, see std_object_assign. Without one, the object
+    is never garbage collected."""
+
     from .lib import std
+    from .derived_var import ObjectAttributeVar
+
+    def dtype_of(value: Expression) -> typing.Type[DataType]:
+        # scores and integer constants are stored as ints
+        if value.is_data_type(WholeNumberType) and not issubclass(value.dtype_obj, ConcreteDataType):
+            return IntType
+
+        return value.dtype_obj
 
     return [
-        *call_function(class_.get("__new__"), target=target),
+        *call_function(class_.get("__new__"), target=None if target is None else std.std_object_ref(target)),
         # STD_RET is the obj_id
+        *conv.vars_to_vars(
+            (value, ObjectAttributeVar[dtype_of(value)](std.STD_RET, attribute))
+            for attribute, value in (attributes or {}).items()
+        ),
         # STD_ARG is self argument
         *call_function(class_.get("__init__"), arg=std.STD_RET, varargs=args),
     ]
@@ -105,8 +144,16 @@ def _print(*args: str | dict[str, str | bool] | Expression | tellraw.TextCompone
 
 def print_(*args: str | dict[str, str | bool] | Expression | tellraw.TextComponent,
            player: str | UniqueString = "@a") -> list[Command]:
+    unique_strings = [
+        unique_string
+        for arg in (*args, player)
+        for unique_string in (arg if isinstance(arg, (ScoreboardVar, NbtVar)) else (arg,))
+        if isinstance(unique_string, UniqueString)
+    ]
+
     return [
-        DynamicCommand(lambda path_of_func, resolve: "\n".join(_print(*args, player=player, resolve=resolve)))
+        DynamicCommand(lambda path_of_func, resolve: "\n".join(_print(*args, player=player, resolve=resolve)),
+                       *unique_strings)
     ]
 
 
@@ -117,6 +164,51 @@ def log(prefix: str | UniqueString | Expression | tellraw.TextComponent, *args):
 
 def tag_remove_all(tag: UniqueTag | str) -> list[Command]:
     return [
-        Comment("remove the temp tag from all entities"),
-        LiteralCommand("tag @e remove %s", tag),
+        TagRemoveAll(tag),
     ]
+
+
+def dispatch_tree(namespace: Namespace, var: ScoreboardVar, low: int, high: int,
+                  action: typing.Callable[[int], list[Command]], *,
+                  branching: int = 2, leaf_size: int = 1) -> MCFunction:
+    """Create a search tree of mcfunctions that runs action(i) if var == i, for low <= i <= high, and return its root.
+    This selects i in O(log(high - low)) commands without scanning any entities. Nothing runs if var is out of range.
+
+    Every node has up to branching children and every leaf handles up to leaf_size values, each guarded by an
+    execute if. Larger values make the tree shallower and create fewer files, at the cost of more commands per lookup.
+
+    The mcfunctions are named after their range, so namespace should only hold this tree. action must not change var
+    and its commands (except comments) must be single commands that can follow execute ... run.
+    """
+
+    assert low <= high, f"Empty range {low}..{high}."
+    assert branching >= 2 and leaf_size >= 1
+
+    def guarded(sub_low: int, sub_high: int, command: Command) -> Command:
+        match = f"{sub_low}" if sub_low == sub_high else f"{sub_low}..{sub_high}"
+        return ComposedCommand(LiteralCommand(f"execute if score %s %s matches {match} run", *var), command)
+
+    def node(sub_low: int, sub_high: int, is_root: bool) -> MCFunction:
+        mcfunc = namespace.create_mcfunction(f"{sub_low}_{sub_high}")
+        size = sub_high - sub_low + 1
+
+        if size <= leaf_size:
+            for i in range(sub_low, sub_high + 1):
+                # the parent already checked the range
+                needs_guard = size > 1 or is_root
+
+                mcfunc.add_command(*(
+                    command if isinstance(command, Comment) or not needs_guard else guarded(i, i, command)
+                    for command in action(i)
+                ))
+
+            return mcfunc
+
+        step = -(-size // branching)
+        for child_low in range(sub_low, sub_high + 1, step):
+            child_high = min(child_low + step - 1, sub_high)
+            mcfunc.add_command(guarded(child_low, child_high, FunctionCall(node(child_low, child_high, False))))
+
+        return mcfunc
+
+    return node(low, high, True)
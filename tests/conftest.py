@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcutils_reborn.all import *
+from mcutils_reborn.interpreter import Interpreter
+
+OPTIMIZATION_LEVELS = (0, 1, 2)
+
+
+def run_at_level(datapack: Datapack, function: Pathable, optimize: int, ticks: int = 0) -> list[str]:
+    """Run function and then up to ticks ticks, while something is scheduled, and return what was printed, without
+    the log messages of the std library."""
+
+    interpreter = Interpreter.from_datapack(datapack, optimize=optimize)
+    interpreter.load()
+    interpreter.output.clear()
+
+    interpreter.run(path_to_str(function.path()))
+
+    for _ in range(ticks):
+        if not interpreter.scheduled:
+            break
+
+        interpreter.tick()
+
+    return [line for line in interpreter.output if not line.startswith("[")]
+
+
+@pytest.fixture
+def run():
+    """Run a function at every optimization level, check that it printed the same at each and return that."""
+
+    def run_(namespace: Namespace, function: Function | MCFunction, ticks: int = 0) -> list[str]:
+        datapack = Datapack("test")
+        datapack.add(namespace, std.std_namespace)
+
+        if isinstance(function, Function):
+            function = function.entry_point
+
+        outputs = [run_at_level(datapack, function, level, ticks) for level in OPTIMIZATION_LEVELS]
+
+        for level, output in zip(OPTIMIZATION_LEVELS[1:], outputs[1:]):
+            assert output == outputs[0], f"optimization level {level} changed the output"
+
+        return outputs[0]
+
+    return run_
@@ -0,0 +1,152 @@
+import operator
+
+import pytest
+
+from mcutils_reborn.all import *
+from mcutils_reborn.arithmetic import fold, get_constant, to_int32, assign_all, maximum
+
+INT_MIN, INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+# operands that are computed with each operation of an expression, see evaluate
+OVERFLOWS = [
+    ("max + 1", lambda a, b: a + b, INT_MAX, 1),
+    ("min - 1", lambda a, b: a - b, INT_MIN, 1),
+    ("x - min", lambda a, b: a - b, 1, INT_MIN),
+    ("2^16 * 2^16", lambda a, b: a * b, 2 ** 16, 2 ** 16),
+    ("46341^2", lambda a, b: a * b, 46341, 46341),
+    ("min // -1", lambda a, b: a // b, INT_MIN, -1),
+    ("(x + max) + 1", lambda a, b: (a + INT_MAX) + b, 5, 1),
+    ("(x * 2^16) * 2^16", lambda a, b: (a * 2 ** 16) * b, 3, 2 ** 16),
+]
+
+
+def evaluate(function, a: int, b: int) -> int:
+    """Evaluate function like the scoreboard does, wrapping every intermediate result to an int32."""
+
+    class Int32(int):
+        def _wrap(self, operation, other):
+            return Int32(to_int32(operation(int(self), int(other))))
+
+        __add__ = lambda self, other: self._wrap(operator.add, other)
+        __sub__ = lambda self, other: self._wrap(operator.sub, other)
+        __mul__ = lambda self, other: self._wrap(operator.mul, other)
+        __floordiv__ = lambda self, other: self._wrap(operator.floordiv, other)
+
+    return int(function(Int32(a), Int32(b)))
+
+
+@pytest.mark.parametrize("name, function, a, b", OVERFLOWS)
+def test_fold_wraps_like_the_scoreboard(run, name, function, a, b):
+    with Namespace("test") as namespace:
+        score_a = namespace.get_unique_scoreboard_var("a")
+        score_b = namespace.get_unique_scoreboard_var("b")
+        result = namespace.get_unique_scoreboard_var("result")
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(a), score_a),
+            *conv.var_to_var(ConstInt(b), score_b),
+
+            # folded at compile time
+            *conv.var_to_var(function(ConstInt(a), ConstInt(b)), result),
+            *tools.print_(result),
+
+            # only b is a constant
+            *conv.var_to_var(function(score_a, ConstInt(b)), result),
+            *tools.print_(result),
+
+            # computed at runtime
+            *conv.var_to_var(function(score_a, score_b), result),
+            *tools.print_(result),
+        )
+        main.end()
+
+    expected = evaluate(function, a, b)
+    assert run(namespace, main) == [str(expected)] * 3
+
+    folded = get_constant(fold(function(ConstInt(a), ConstInt(b))))
+    assert folded is None or folded == expected
+
+
+# x is 5 and y is 3 before each assignment
+ALIASED_ASSIGNMENTS = [
+    ("x = x + y * 2", lambda x, y: x + y * 2, 11),
+    ("x = x * (y + 1)", lambda x, y: x * (y + 1), 20),
+    ("x = x - y * 2", lambda x, y: x - y * 2, -1),
+    ("x = (x + 1) * (y + 2)", lambda x, y: (x + 1) * (y + 2), 30),
+    ("x = y * 2 + x", lambda x, y: y * 2 + x, 11),
+    ("x = x * x + y", lambda x, y: x * x + y, 28),
+    ("x = max(x, y * 3)", lambda x, y: maximum(x, y * 3), 9),
+    ("x = 1 - x", lambda x, y: 1 - x, -4),
+    ("x = y - x", lambda x, y: y - x, -2),
+    ("x = (y - x) * x", lambda x, y: (y - x) * x, -10),
+]
+
+
+@pytest.mark.parametrize("name, function, expected", ALIASED_ASSIGNMENTS)
+def test_assignment_to_an_operand(run, name, function, expected):
+    with Namespace("test") as namespace:
+        x = namespace.get_unique_scoreboard_var("x")
+        y = namespace.get_unique_scoreboard_var("y")
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(5), x),
+            *conv.var_to_var(ConstInt(3), y),
+            *conv.var_to_var(function(x, y), x),
+            *tools.print_(x, " ", y),
+        )
+        main.end()
+
+    assert run(namespace, main) == [f"{expected} 3"]
+
+
+def test_common_subexpression_after_assignment_to_an_operand(run):
+    with Namespace("test") as namespace:
+        x = namespace.get_unique_scoreboard_var("x")
+        y = namespace.get_unique_scoreboard_var("y")
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(5), x),
+            *conv.var_to_var(ConstInt(3), y),
+            # the second x + y reads the new x
+            *assign_all([(x + y, x), (x + y, y)]),
+            *tools.print_(x, " ", y),
+        )
+        main.end()
+
+    assert run(namespace, main) == ["8 11"]
+
+
+def build_multiplication(name: str, factor: int) -> tuple[Namespace, Function]:
+    with Namespace(name) as namespace:
+        x = namespace.get_unique_scoreboard_var("x")
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(5), x),
+            *conv.score_const_op_in_place(x, "*=", factor),
+            *tools.print_(x),
+        )
+        main.end()
+
+    return namespace, main
+
+
+def test_constants_of_other_datapacks(run):
+    """The load function only sets the constants of its own datapack, whatever was built before."""
+
+    def set_constants(namespace: Namespace) -> list[str]:
+        datapack = Datapack(namespace.name)
+        datapack.add(namespace, std.std_namespace)
+
+        return [line for function in datapack.export().functions.values() for line in function.lines
+                if line.startswith("scoreboard players set #")]
+
+    other, _ = build_multiplication("other", 7)
+    namespace, main = build_multiplication("test", 3)
+
+    assert set_constants(other) == ["scoreboard players set #7 mcutils_reborn_std.const 7"]
+    assert set_constants(namespace) == ["scoreboard players set #3 mcutils_reborn_std.const 3"]
+    assert run(namespace, main) == ["15"]
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from mcutils_reborn.all import *
+from mcutils_reborn.lib import config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_object_backend_is_read_when_the_std_library_is_built():
+    script = "\n".join([
+        "from mcutils_reborn.lib import config",
+        "config.set_object_backend('storage', heap_size=8, branching=4)",
+        "from mcutils_reborn.all import *",
+        "print(std.STD_OBJ_BACKEND, std.STD_OBJ_HEAP_SIZE, std.STD_OBJ_HEAP_BRANCHING)",
+    ])
+
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["storage", "8", "4"]
+
+
+def test_set_object_backend_after_the_std_library_was_built():
+    with pytest.raises(AssertionError):
+        config.set_object_backend("storage")
+
+    assert std.STD_OBJ_BACKEND == os.environ.get("MCUTILS_REBORN_OBJECT_BACKEND", "entity")
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from mcutils_reborn.all import *
+
+
+def build_datapack(path: str, iterations: int) -> Datapack:
+    with Namespace("test") as namespace:
+        i = namespace.get_unique_scoreboard_var("i")
+
+        main = namespace.create_function("main")
+        with main.c_for(i, range(iterations)) as loop:
+            loop.add_command(*tools.print_(i))
+        main.end()
+
+    datapack = Datapack("test", path)
+    datapack.add(namespace, std.std_namespace)
+    return datapack
+
+
+def read_tree(path: str) -> dict[str, bytes]:
+    tree = {}
+
+    for directory, _, files in os.walk(path):
+        for file in files:
+            with open(os.path.join(directory, file), "rb") as f:
+                tree[os.path.relpath(os.path.join(directory, file), path)] = f.read()
+
+    return tree
+
+
+def invalidate_fingerprints(path: str):
+    """Leave the fingerprints file of an older version behind."""
+
+    with open(path, "r", encoding="utf-8") as f:
+        fingerprints = json.load(f)
+
+    fingerprints["version"] -= 1
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fingerprints, f)
+
+
+# what is left of the previous build when the incremental write starts
+PREVIOUS_BUILDS = ["incremental", "full", "outdated fingerprints", "broken fingerprints"]
+
+
+@pytest.mark.parametrize("previous_build", PREVIOUS_BUILDS)
+def test_incremental_write_matches_full_write(tmp_path, previous_build):
+    full = build_datapack(str(tmp_path / "full"), 3)
+    full.write()
+
+    # the first build has more mcfunctions, e.g. the levels of the tree of the loop
+    incremental = build_datapack(str(tmp_path / "incremental"), 20)
+    incremental.write(incremental=previous_build != "full")
+
+    if previous_build == "outdated fingerprints":
+        invalidate_fingerprints(incremental.fingerprints_path())
+    elif previous_build == "broken fingerprints":
+        with open(incremental.fingerprints_path(), "w", encoding="utf-8") as f:
+            f.write("{")
+
+    incremental = build_datapack(str(tmp_path / "incremental"), 3)
+    incremental.write(incremental=True)
+
+    assert read_tree(incremental.output_path()) == read_tree(full.output_path())
+
+
+def test_printing_object_data_fails():
+    with Namespace("test") as namespace:
+        obj = std.std_object_ref(namespace.get_unique_scoreboard_var("obj"))
+
+        main = namespace.create_function("main")
+        main.add_command(*tools.print_(ObjectDataVar(obj)))
+        main.end()
+
+    datapack = Datapack("test")
+    datapack.add(namespace, std.std_namespace)
+
+    with pytest.raises(CompilationError) as error:
+        datapack.export()
+
+    assert "Cannot print ObjectDataVar" in str(error.value.__cause__)
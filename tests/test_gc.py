@@ -0,0 +1,228 @@
+"""Garbage collection of objects. The object backend is chosen when the std library is built, so
+test_storage_backend runs this file again in a process that uses the storage backend."""
+
+import os
+import subprocess
+import sys
+import typing
+
+import pytest
+
+from mcutils_reborn.all import *
+from mcutils_reborn.command import ScheduleFunction
+
+
+def object_var(namespace: Namespace, name: str) -> ScoreboardVar:
+    return std.std_object_ref(namespace.get_unique_scoreboard_var(name))
+
+
+def create_node_class(namespace: Namespace) -> Class:
+    with namespace.create_class("node", inherits_from=(std.std_object_object,)) as node:
+        with node.create_function("__init__"):
+            pass
+
+    return node
+
+
+def read(namespace: Namespace, attribute: ObjectAttributeVar) -> tuple[ScoreboardVar, list[Command]]:
+    """A score and the commands that copy the attribute to it, attributes can't be printed directly."""
+
+    score = namespace.get_unique_scoreboard_var("value")
+    return score, conv.var_to_var(attribute, score)
+
+
+def create_report(namespace: Namespace, *args, commands: typing.Sequence[Command] = ()) -> Function:
+    """A function that runs commands and prints args and the number of objects that weren't freed."""
+
+    live = namespace.get_unique_scoreboard_var("live")
+    free = namespace.get_unique_scoreboard_var("free")
+
+    report = namespace.create_function("report")
+    report.add_command(*commands)
+
+    if std.STD_OBJ_BACKEND == "storage":
+        # ids are reused, so the objects that were created and not freed are the ids below the counter that are not
+        # in the free list
+        report.add_command(
+            LiteralCommand("execute store result score %s %s run data get storage %s free", *free, std.STD_OBJ_HEAP),
+            *conv.var_to_var(std.STD_OBJ_ID_COUNTER - free, live),
+        )
+    else:
+        report.add_command(LiteralCommand("execute store result score %s %s if entity @e[tag=%s]",
+                                          *live, std.STD_OBJ_TAG))
+
+    report.add_command(*tools.print_(*args, "live ", live))
+    report.end()
+
+    return report
+
+
+def later(function: Function) -> Command:
+    # garbage_collect frees the queued objects in the next tick
+    return ScheduleFunction(function.entry_point, "3t")
+
+
+def test_chain_is_freed(run):
+    with Namespace("test") as namespace:
+        node = create_node_class(namespace)
+        first = object_var(namespace, "first")
+        second = object_var(namespace, "second")
+
+        report = create_report(namespace)
+
+        # second is only referenced by first, it must not be freed before first
+        x, read_x = read(namespace, ObjectAttributeVar[IntType](ObjectAttributeVar[IntType](first, "next"), "x"))
+
+        drop_first = namespace.create_function("drop_first")
+        drop_first.add_command(
+            *read_x,
+            *tools.print_("second x ", x),
+            *conv.var_to_var(ConstInt(0), first),
+            later(report),
+        )
+        drop_first.end()
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *tools.create_object(node, (), first),
+            *tools.create_object(node, (), second, {"x": ConstInt(2)}),
+            *conv.var_to_var(second, ObjectAttributeVar[ObjectType](first, "next")),
+            *conv.var_to_var(ConstInt(0), second),
+            later(drop_first),
+        )
+        main.end()
+
+    assert run(namespace, main, ticks=10) == ["second x 2", "live 0"]
+
+
+def test_reference_after_queue(run):
+    with Namespace("test") as namespace:
+        node = create_node_class(namespace)
+        obj = object_var(namespace, "obj")
+
+        x, read_x = read(namespace, ObjectAttributeVar[IntType](obj, "x"))
+        report = create_report(namespace, "x ", x, " ", commands=read_x)
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *tools.create_object(node, (), obj, {"x": ConstInt(5)}),
+            # the count drops to 0 and the object is queued before obj references it again
+            *conv.var_to_var(obj, obj),
+            later(report),
+        )
+        main.end()
+
+    assert run(namespace, main, ticks=10) == ["x 5 live 1"]
+
+
+def test_pins_across_call_function(run):
+    with Namespace("test") as namespace:
+        node = create_node_class(namespace)
+        first = object_var(namespace, "first")
+        second = object_var(namespace, "second")
+        kept = object_var(namespace, "kept")
+
+        x, read_x = read(namespace, ObjectAttributeVar[IntType](kept, "x"))
+        report = create_report(namespace, "kept ", x, " ", commands=read_x)
+
+        # the callees drop the scores that referenced their argument
+        inner = namespace.create_function("inner")
+        inner.add_command(
+            *conv.var_to_var(ConstInt(0), second),
+            *conv.var_to_var(ObjectAttributeVar[IntType](std.STD_ARG, "x"), x),
+            *tools.print_("inner ", x),
+            *conv.var_to_var(std.STD_ARG, kept),
+        )
+        inner.end()
+
+        # only the pin references first while inner runs
+        outer_arg = namespace.get_unique_scoreboard_var("outer_arg")
+        outer = namespace.create_function("outer")
+        outer.add_command(
+            *conv.var_to_var(std.STD_ARG, outer_arg),
+            *conv.var_to_var(ConstInt(0), first),
+            *tools.call_function(inner, arg=second),
+            *conv.var_to_var(ObjectAttributeVar[IntType](outer_arg, "x"), x),
+            *tools.print_("outer ", x),
+        )
+        outer.end()
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *tools.create_object(node, (), first, {"x": ConstInt(1)}),
+            *tools.create_object(node, (), second, {"x": ConstInt(2)}),
+            *tools.call_function(outer, arg=first),
+            later(report),
+        )
+        main.end()
+
+    # first is freed once it is unpinned, second is kept
+    assert run(namespace, main, ticks=10) == ["inner 2", "outer 1", "kept 2 live 1"]
+
+
+def test_writing_the_data_of_an_object(run):
+    with Namespace("test") as namespace:
+        node = create_node_class(namespace)
+        first = object_var(namespace, "first")
+        second = object_var(namespace, "second")
+        empty = NbtVar[CompoundType]("storage", std.STD_TEMP_STORAGE, "empty")
+        next_, read_next = read(namespace, ObjectAttributeVar[IntType](first, "next"))
+
+        report = create_report(namespace)
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *tools.create_object(node, (), first),
+            *tools.create_object(node, (), second),
+            *conv.var_to_var(second, ObjectAttributeVar[ObjectType](first, "next")),
+            *conv.var_to_var(ConstInt(0), second),
+
+            # keeps next
+            *ObjectDataVar(first).merge({"x": ConstInt(1)}),
+            LiteralCommand("data modify storage %s empty set value {}", std.STD_TEMP_STORAGE),
+            *conv.var_to_var(ObjectDataVar(first), empty),
+            *conv.var_to_var(empty, ObjectDataVar(first)),
+            *read_next,
+            *tools.print_("next ", next_),
+
+            # drops next
+            LiteralCommand("data modify storage %s empty set value {}", std.STD_TEMP_STORAGE),
+            *conv.var_to_var(empty, ObjectDataVar(first)),
+            later(report),
+        )
+        main.end()
+
+    assert run(namespace, main, ticks=10) == ["next 2", "live 1"]
+
+
+@pytest.mark.skipif(std.STD_OBJ_BACKEND != "storage", reason="only the storage backend reuses ids")
+def test_id_reuse(run):
+    with Namespace("test") as namespace:
+        node = create_node_class(namespace)
+        obj = object_var(namespace, "obj")
+
+        report = create_report(namespace, "id ", obj, " counter ", std.STD_OBJ_ID_COUNTER, " ")
+
+        recreate = namespace.create_function("recreate")
+        recreate.add_command(*tools.create_object(node, (), obj), later(report))
+        recreate.end()
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *tools.create_object(node, (), obj),
+            *tools.create_object(node, (), obj),
+            later(recreate),
+        )
+        main.end()
+
+    # the first object is freed and its id reused, then the second one is freed
+    assert run(namespace, main, ticks=20) == ["id 1 counter 2 live 1"]
+
+
+@pytest.mark.skipif(std.STD_OBJ_BACKEND == "storage", reason="already runs with the storage backend")
+def test_storage_backend():
+    result = subprocess.run([sys.executable, "-m", "pytest", "-q", __file__],
+                            env=os.environ | {"MCUTILS_REBORN_OBJECT_BACKEND": "storage"},
+                            capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stdout
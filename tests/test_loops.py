@@ -0,0 +1,90 @@
+import pytest
+
+from mcutils_reborn.all import *
+from mcutils_reborn.function import LOOP_ITERATIONS
+
+
+def iteration_counts(unroll: int) -> list[int]:
+    """0 and 1 iterations, and the iterations that fill the levels of the tree of a loop exactly and by one more."""
+
+    counts = {0, 1}
+    level_iterations = unroll
+
+    while level_iterations <= LOOP_ITERATIONS:
+        counts |= {level_iterations, level_iterations + 1}
+        level_iterations *= unroll
+
+    return sorted(counts)
+
+
+WHILE_LOOPS = [(unroll, iterations, iterations_per_tick)
+               for unroll in (2, 3, 4)
+               for iterations in iteration_counts(unroll)
+               for iterations_per_tick in (None, 10)]
+
+
+@pytest.mark.parametrize("unroll, iterations, iterations_per_tick", WHILE_LOOPS)
+def test_while_loop(run, unroll, iterations, iterations_per_tick):
+    with Namespace("test") as namespace:
+        i = namespace.get_unique_scoreboard_var("i")
+        count = namespace.get_unique_scoreboard_var("count")
+
+        main = namespace.create_function("main")
+        main.add_command(*conv.var_to_var(ConstInt(0), i), *conv.var_to_var(ConstInt(0), count))
+
+        with main.c_while(ScoreConditionMatches(i, f"..{iterations - 1}"), unroll=unroll,
+                          iterations_per_tick=iterations_per_tick) as loop:
+            loop.add_command(*conv.add_in_place(i, ConstInt(1)), *conv.add_in_place(count, ConstInt(1)))
+
+        main.add_command(*tools.print_("done ", i, " ", count))
+        main.end()
+
+    assert run(namespace, main, ticks=iterations + 1) == [f"done {iterations} {iterations}"]
+
+
+@pytest.mark.parametrize("iterations", [0, 1, 2, 5])
+def test_while_loop_that_returns(run, iterations):
+    with Namespace("test") as namespace:
+        i = namespace.get_unique_scoreboard_var("i")
+
+        function = namespace.create_function("function")
+        function.add_command(*conv.var_to_var(ConstInt(0), i))
+
+        with function.c_while(ScoreConditionMatches(i, "..9")) as loop:
+            with loop.c_if(ScoreConditionMatches(i, str(iterations))) as branch:
+                branch.return_()
+
+            loop.add_command(*conv.add_in_place(i, ConstInt(1)))
+
+        function.add_command(*tools.print_("after the loop"))
+        function.end()
+
+        main = namespace.create_function("main")
+        main.add_command(*tools.call_function(function), *tools.print_("returned at ", i))
+        main.end()
+
+    assert run(namespace, main) == [f"returned at {iterations}"]
+
+
+# constant ranges of more than max_unrolled = 4 iterations run a remainder of len(range) % unroll iterations first
+FOR_LOOPS = [range(0), range(3), range(4), range(8), range(37), range(5, 50, 3), range(10, -7, -3), range(3, -30, -1)]
+
+
+@pytest.mark.parametrize("range_", FOR_LOOPS, ids=map(repr, FOR_LOOPS))
+def test_constant_for_loop(run, range_):
+    with Namespace("test") as namespace:
+        i = namespace.get_unique_scoreboard_var("i")
+        total = namespace.get_unique_scoreboard_var("total")
+        count = namespace.get_unique_scoreboard_var("count")
+
+        main = namespace.create_function("main")
+        main.add_command(*conv.var_to_var(ConstInt(0), total), *conv.var_to_var(ConstInt(0), count))
+
+        with main.c_for(i, range_, unroll=4, max_unrolled=4) as loop:
+            loop.add_command(*conv.add_in_place(total, i), *conv.add_in_place(count, ConstInt(1)))
+
+        main.add_command(*tools.print_(i, " ", total, " ", count))
+        main.end()
+
+    after = range_.start + len(range_) * range_.step
+    assert run(namespace, main) == [f"{after} {sum(range_)} {len(range_)}"]
@@ -0,0 +1,127 @@
+"""The optimizer must not change what a datapack does, so these run each pack at every optimization level."""
+
+from mcutils_reborn.all import *
+from mcutils_reborn.command import ScheduleFunction
+
+
+def test_branch_that_returns(run):
+    with Namespace("test") as namespace:
+        x = namespace.get_unique_scoreboard_var("x")
+
+        function = namespace.create_function("function")
+        function.add_command(*tools.print_("before"))
+
+        with function.c_if(ScoreConditionMatches(x, "1")) as branch:
+            branch.add_command(*tools.print_("returning"))
+            branch.return_()
+
+        function.add_command(*tools.print_("after"))
+        function.end()
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(1), x),
+            *tools.call_function(function),
+            *tools.print_("returned"),
+            *conv.var_to_var(ConstInt(0), x),
+            *tools.call_function(function),
+            *tools.print_("returned"),
+        )
+        main.end()
+
+    assert run(namespace, main) == ["before", "returning", "returned", "before", "after", "returned"]
+
+
+def test_branch_that_changes_its_condition(run):
+    with Namespace("test") as namespace:
+        x = namespace.get_unique_scoreboard_var("x")
+
+        main = namespace.create_function("main")
+        main.add_command(*conv.var_to_var(ConstInt(1), x))
+
+        with main.c_if(ScoreConditionMatches(x, "1")) as branch:
+            branch.add_command(*conv.var_to_var(ConstInt(0), x), *tools.print_("if"))
+
+        with branch.c_else() as else_:
+            else_.add_command(*tools.print_("else"))
+
+        main.add_command(*tools.print_("x=", x))
+        main.end()
+
+    assert run(namespace, main) == ["if", "x=0"]
+
+
+def test_empty_continuation(run):
+    with Namespace("test") as namespace:
+        x = namespace.get_unique_scoreboard_var("x")
+
+        # nothing follows the if, and one branch is empty
+        function = namespace.create_function("function")
+        with function.c_if(ScoreConditionMatches(x, "1")) as branch:
+            branch.add_command(*tools.print_("one"))
+
+        with branch.c_else():
+            pass
+
+        function.end()
+
+        main = namespace.create_function("main")
+        for value in (1, 0, 1):
+            main.add_command(
+                *conv.var_to_var(ConstInt(value), x),
+                *tools.call_function(function),
+                *tools.print_("called with ", x),
+            )
+        main.end()
+
+    assert run(namespace, main) == ["one", "called with 1", "called with 0", "one", "called with 1"]
+
+
+def test_scheduled_target(run):
+    with Namespace("test") as namespace:
+        # a chain of empty mcfunctions, which calls skip
+        empty = namespace.create_mcfunction("empty")
+        target = namespace.create_mcfunction("target")
+        target.add_command(*tools.print_("scheduled"))
+        empty.continuation = target
+
+        main = namespace.create_function("main")
+        main.add_command(ScheduleFunction(empty), *tools.print_("main"))
+        main.end()
+
+    # the scheduled mcfunction runs in the next tick, not when it is scheduled
+    assert run(namespace, main) == ["main"]
+    assert run(namespace, main, ticks=1) == ["main", "scheduled"]
+
+
+def test_fetch_across_call(run):
+    with Namespace("test") as namespace:
+        first = namespace.get_unique_scoreboard_var("first")
+        second = namespace.get_unique_scoreboard_var("second")
+        value = namespace.get_unique_scoreboard_var("value")
+
+        with namespace.create_class("test_class", inherits_from=(std.std_object_object,)) as test_class:
+            with test_class.create_function("__init__"):
+                pass
+
+        # fetches the other object
+        read_second = namespace.create_function("read_second")
+        read_second.add_command(
+            *conv.var_to_var(ObjectAttributeVar[IntType](second, "x"), value),
+            *tools.print_("second ", value),
+        )
+        read_second.end()
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *tools.create_object(test_class, (), first, {"x": ConstInt(1)}),
+            *tools.create_object(test_class, (), second, {"x": ConstInt(2)}),
+            *conv.var_to_var(ObjectAttributeVar[IntType](first, "x"), value),
+            *tools.print_("first ", value),
+            *tools.call_function(read_second),
+            *conv.var_to_var(ObjectAttributeVar[IntType](first, "x"), value),
+            *tools.print_("first ", value),
+        )
+        main.end()
+
+    assert run(namespace, main) == ["first 1", "second 2", "first 1"]
@@ -0,0 +1,53 @@
+from mcutils_reborn.all import *
+
+
+def build_recursive_call(via_continuation: bool):
+    """main keeps a temp across a call of a function that calls itself and uses a temp of its own. Without the
+    conflict, both temps would get the first register."""
+
+    with Namespace("test") as namespace:
+        depth = namespace.get_unique_scoreboard_var("depth")
+        total = namespace.get_unique_scoreboard_var("total")
+        kept = namespace.get_unique_scoreboard_var("kept")
+
+        recursive = namespace.create_mcfunction("recursive")
+        recursive_temp = namespace.get_temp_scoreboard_var("recursive_temp")
+        recursive.add_command(
+            LiteralCommand("scoreboard players set %s %s 7", *recursive_temp),
+            LiteralCommand("scoreboard players operation %s %s += %s %s", *total, *recursive_temp),
+            LiteralCommand("scoreboard players remove %s %s 1", *depth),
+            ComposedCommand(LiteralCommand("execute if score %s %s matches 1.. run", *depth), FunctionCall(recursive)),
+        )
+
+        if via_continuation:
+            callee = namespace.create_mcfunction("callee")
+            callee.continuation = recursive
+        else:
+            callee = recursive
+
+        caller = namespace.create_mcfunction("caller")
+        caller_temp = namespace.get_temp_scoreboard_var("caller_temp")
+        caller.add_command(
+            LiteralCommand("scoreboard players set %s %s 5", *caller_temp),
+            FunctionCall(callee),
+            LiteralCommand("scoreboard players operation %s %s = %s %s", *kept, *caller_temp),
+        )
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(3), depth),
+            *conv.var_to_var(ConstInt(0), total),
+            FunctionCall(caller),
+            *tools.print_(kept, " ", total),
+        )
+        main.end()
+
+    return namespace, main
+
+
+def test_temp_live_across_recursive_call(run):
+    assert run(*build_recursive_call(via_continuation=False)) == ["5 21"]
+
+
+def test_temp_live_across_call_that_continues_recursively(run):
+    assert run(*build_recursive_call(via_continuation=True)) == ["5 21"]
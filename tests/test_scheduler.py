@@ -0,0 +1,130 @@
+from mcutils_reborn.all import *
+
+# large enough for the commands the jobs run between their yield points
+BUDGET = 1000
+
+
+def test_spawn(run):
+    with Namespace("test") as namespace:
+        job = namespace.create_function("job")
+        job.add_command(*tools.print_("job"))
+        job.end()
+
+        main = namespace.create_function("main")
+        main.add_command(*std.std_scheduler_spawn(job), *tools.print_("main"))
+        main.end()
+
+    # jobs start in the next tick
+    assert run(namespace, main) == ["main"]
+    assert run(namespace, main, ticks=1) == ["main", "job"]
+
+
+def test_budget_exhaustion_across_ticks(run):
+    with Namespace("test") as namespace:
+        tick = namespace.get_unique_scoreboard_var("tick")
+
+        counter = namespace.create_function("counter", tags={"minecraft:tick"})
+        counter.add_command(*conv.add_in_place(tick, ConstInt(1)))
+        counter.end()
+
+        job = namespace.create_function("job")
+        job.add_command(*tools.print_("a ", tick))
+        # each yield point uses up the budget of its tick
+        job.c_yield(cost=BUDGET)
+        job.add_command(*tools.print_("b ", tick))
+        job.c_yield(cost=BUDGET)
+        job.add_command(*tools.print_("c ", tick))
+        job.end()
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(0), tick),
+            *conv.var_to_var(ConstInt(BUDGET), std.STD_SCHEDULER_BUDGET),
+            *std.std_scheduler_spawn(job),
+        )
+        main.end()
+
+    assert run(namespace, main, ticks=10) == ["a 1", "b 2", "c 3"]
+
+
+def test_cheap_yields_continue_in_the_same_tick(run):
+    with Namespace("test") as namespace:
+        tick = namespace.get_unique_scoreboard_var("tick")
+
+        counter = namespace.create_function("counter", tags={"minecraft:tick"})
+        counter.add_command(*conv.add_in_place(tick, ConstInt(1)))
+        counter.end()
+
+        job = namespace.create_function("job")
+        job.add_command(*tools.print_("a ", tick))
+        job.c_yield(cost=1)
+        job.add_command(*tools.print_("b ", tick))
+        job.end()
+
+        main = namespace.create_function("main")
+        main.add_command(*conv.var_to_var(ConstInt(0), tick), *std.std_scheduler_spawn(job))
+        main.end()
+
+    assert run(namespace, main, ticks=10) == ["a 1", "b 1"]
+
+
+def test_yield_inside_loop(run):
+    with Namespace("test") as namespace:
+        i = namespace.get_unique_scoreboard_var("i")
+        total = namespace.get_unique_scoreboard_var("total")
+
+        job = namespace.create_function("job")
+        job.add_command(*conv.var_to_var(ConstInt(0), total))
+
+        with job.c_for(i, 0, 20) as loop:
+            loop.add_command(*conv.add_in_place(total, i))
+            # 5 iterations per tick
+            loop.c_yield(cost=BUDGET // 5)
+
+        job.add_command(*tools.print_("done ", total))
+        job.end()
+
+        main = namespace.create_function("main")
+        main.add_command(
+            *conv.var_to_var(ConstInt(BUDGET), std.STD_SCHEDULER_BUDGET),
+            *std.std_scheduler_spawn(job),
+        )
+        main.end()
+
+    # not done after the first 4 ticks of the job
+    assert run(namespace, main, ticks=4) == []
+    assert run(namespace, main, ticks=20) == [f"done {sum(range(20))}"]
+
+
+def test_jobs_of_other_datapacks(run):
+    """Packs that are built in the same process don't share their jobs."""
+
+    with Namespace("other") as other:
+        other_job = other.create_function("job")
+        other_job.add_command(*tools.print_("other job"))
+        other_job.c_yield()
+        other_job.end()
+
+        other_main = other.create_function("main")
+        other_main.add_command(*std.std_scheduler_spawn(other_job))
+        other_main.end()
+
+    run(other, other_main, ticks=1)
+
+    with Namespace("test") as namespace:
+        job = namespace.create_function("job")
+        job.add_command(*tools.print_("job"))
+        job.c_yield()
+        job.end()
+
+        main = namespace.create_function("main")
+        main.add_command(*std.std_scheduler_spawn(job))
+        main.end()
+
+    datapack = Datapack("test")
+    datapack.add(namespace, std.std_namespace)
+    dispatch = "\n".join(line for path, function in datapack.export().functions.items()
+                         if path.startswith("mcutils_reborn_std:scheduler/dispatch") for line in function.lines)
+
+    assert "other:" not in dispatch
+    assert run(namespace, main, ticks=1) == ["job"]